@@ -0,0 +1,115 @@
+"""Shared fixtures for the libmelee benchmark suite
+
+Run from the repository root with pytest-benchmark installed:
+
+    python3 -m pytest benchmarks --benchmark-json=bench.json
+
+and compare two runs with `pytest-benchmark compare`.
+"""
+
+import os
+import platform
+import threading
+
+import pytest
+import ubjson
+
+pytest.importorskip("pytest_benchmark")
+
+import melee
+from melee.slippstream import EventType
+from melee.slippstreamserver import split_events
+
+ARTIFACTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_artifacts")
+REPLAYS = {
+    "test_game_1": os.path.join(ARTIFACTS, "test_game_1.slp"),
+    "test_game_2": os.path.join(ARTIFACTS, "test_game_2.slp"),
+}
+
+# Events that carry the frame number at offset 0x1
+_FRAME_EVENTS = {
+    EventType.FRAME_START.value,
+    EventType.PRE_FRAME.value,
+    EventType.POST_FRAME.value,
+    EventType.ITEM_UPDATE.value,
+    EventType.FRAME_BOOKEND.value,
+    EventType.FOD_INFO.value,
+    EventType.DL_INFO.value,
+    EventType.PS_INFO.value,
+}
+
+def _shift_frame(event: bytes, offset: int) -> bytes:
+    event = bytearray(event)
+    frame = int.from_bytes(event[1:5], "big", signed=True)
+    event[1:5] = (frame + offset).to_bytes(4, "big", signed=True)
+    if event[0] == EventType.FRAME_BOOKEND.value and len(event) >= 9:
+        latest = int.from_bytes(event[5:9], "big", signed=True)
+        event[5:9] = (latest + offset).to_bytes(4, "big", signed=True)
+    return bytes(event)
+
+def synthesize_replay(src: str, dst: str, repeats: int):
+    """Write a long replay to `dst` by repeating the frames of `src`
+
+    Frame numbers of each copy are shifted so the result is one continuous game.
+    """
+    with open(src, "rb") as file:
+        full = ubjson.loadb(file.read())
+    events = split_events(full["raw"])
+
+    first = next(i for i, event in enumerate(events) if event[0] in _FRAME_EVENTS)
+    last = next((i for i, event in enumerate(events) if event[0] == EventType.GAME_END.value), len(events))
+    header, body, trailer = events[:first], events[first:last], events[last:]
+
+    frames = [int.from_bytes(event[1:5], "big", signed=True) for event in body if event[0] in _FRAME_EVENTS]
+    span = max(frames) - min(frames) + 1
+
+    raw = bytearray(b"".join(header))
+    for i in range(repeats):
+        for event in body:
+            raw += _shift_frame(event, i * span) if event[0] in _FRAME_EVENTS else event
+    raw += b"".join(trailer)
+
+    with open(dst, "wb") as file:
+        file.write(ubjson.dumpb({"raw": bytes(raw), "metadata": full.get("metadata", {})}))
+
+def record_frames(benchmark, frames: int):
+    """Add the frame count, and the frames per second if timings were taken, to the benchmark's extra info"""
+    benchmark.extra_info["frames"] = frames
+    # There are no stats with --benchmark-disable
+    if benchmark.stats is not None:
+        benchmark.extra_info["frames_per_second"] = frames / benchmark.stats.stats.mean
+
+@pytest.fixture(scope="session")
+def long_replay(tmp_path_factory):
+    """test_game_1 repeated 20 times, about 20000 frames"""
+    path = tmp_path_factory.mktemp("replays") / "long_game.slp"
+    synthesize_replay(REPLAYS["test_game_1"], str(path), repeats=20)
+    return str(path)
+
+@pytest.fixture
+def controller_pipe(tmp_path):
+    """A remote Console with a pipe controller on port 1, drained by a reader thread"""
+    if platform.system() == "Windows":
+        pytest.skip("Named pipe benchmark only runs on posix systems")
+
+    home = tmp_path / "User"
+    (home / "Config").mkdir(parents=True)
+    (home / "Config" / "Dolphin.ini").write_text("[Core]\n")
+
+    console = melee.Console(is_dolphin=True, is_remote=True,
+                            tmp_home_directory=False, dolphin_home_path=str(home))
+    controller = melee.Controller(console=console, port=1)
+
+    received = [0]
+    def drain():
+        with open(controller.pipe_path, "rb") as pipe:
+            while chunk := pipe.read(1 << 16):
+                received[0] += len(chunk)
+    reader = threading.Thread(target=drain, daemon=True)
+    reader.start()
+    controller.connect()
+
+    yield controller, received
+
+    controller.disconnect()
+    reader.join()
@@ -0,0 +1,24 @@
+"""Controller command emission rate against a local FIFO"""
+
+import melee
+from melee.enums import Button
+
+def test_controller_frame(benchmark, controller_pipe):
+    """A typical frame of inputs: stick, button, shoulder and a flush"""
+    controller, received = controller_pipe
+
+    def frame():
+        controller.tilt_analog(Button.BUTTON_MAIN, 0.25, 0.75)
+        controller.press_button(Button.BUTTON_A)
+        controller.press_shoulder(Button.BUTTON_L, 0.5)
+        controller.release_button(Button.BUTTON_A)
+        controller.flush()
+    benchmark(frame)
+
+def test_controller_release_all(benchmark, controller_pipe):
+    controller, received = controller_pipe
+
+    def frame():
+        controller.release_all()
+        controller.flush()
+    benchmark(frame)
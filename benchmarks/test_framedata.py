@@ -0,0 +1,38 @@
+"""FrameData load time and query rates"""
+
+import os
+
+import pytest
+
+import melee
+from melee.enums import Action, Character
+
+if not os.path.exists(os.path.join(os.path.dirname(melee.framedata.__file__), "framedata.csv")):
+    pytest.skip("framedata.csv is not available", allow_module_level=True)
+
+_QUERIES = [
+    (Character.FOX, Action.DAIR, 5),
+    (Character.FALCO, Action.FSMASH_MID, 12),
+    (Character.MARTH, Action.NEUTRAL_ATTACK_1, 3),
+    (Character.SHEIK, Action.UPSMASH, 8),
+]
+
+def test_framedata_load(benchmark):
+    benchmark(melee.FrameData)
+
+def test_framedata_attack_state(benchmark):
+    framedata = melee.FrameData()
+
+    def query():
+        for character, action, frame in _QUERIES:
+            framedata.attack_state(character, action, frame)
+    benchmark(query)
+
+def test_framedata_range(benchmark):
+    framedata = melee.FrameData()
+
+    def query():
+        for character, action, frame in _QUERIES:
+            framedata.range_forward(character, action, frame)
+            framedata.range_backward(character, action, frame)
+    benchmark(query)
@@ -0,0 +1,27 @@
+"""SLP parsing throughput through Console.step"""
+
+import pytest
+
+import melee
+
+from conftest import REPLAYS, record_frames
+
+def parse_replay(path: str, allow_old_version: bool) -> int:
+    console = melee.Console(is_dolphin=False, allow_old_version=allow_old_version, path=path)
+    console.connect()
+    frames = 0
+    while console.step() is not None:
+        frames += 1
+    return frames
+
+@pytest.mark.parametrize("name", sorted(REPLAYS))
+def test_parse_replay(benchmark, name):
+    frames = benchmark(parse_replay, REPLAYS[name], True)
+    record_frames(benchmark, frames)
+
+def test_parse_long_replay(benchmark, long_replay):
+    frames = benchmark.pedantic(parse_replay, args=(long_replay, False), rounds=3)
+    record_frames(benchmark, frames)
+
+def test_console_construction(benchmark):
+    benchmark(melee.Console, is_dolphin=False, path=REPLAYS["test_game_1"])
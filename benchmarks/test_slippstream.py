@@ -0,0 +1,32 @@
+"""Slippstream dispatch throughput against a local SlippstreamServer"""
+
+import melee
+from melee.slippstreamserver import SlippstreamServer, replay_messages
+
+from conftest import REPLAYS, record_frames
+
+def test_slippstream_dispatch(benchmark):
+    messages = len(replay_messages(REPLAYS["test_game_1"]))
+    state = {}
+
+    def setup():
+        server = SlippstreamServer([REPLAYS["test_game_1"]], port=0, fps=0)
+        server.start()
+        # Every message is then exactly one step, rollback frames included
+        console = melee.Console(is_dolphin=True, is_remote=True, slippi_port=server.port,
+                                skip_rollback_frames=False)
+        assert console.connect()
+        state["server"], state["console"] = server, console
+
+    def consume():
+        console = state["console"]
+        frames = 0
+        while frames < messages:
+            console.step()
+            frames += 1
+        console.stop()
+        state["server"].stop()
+        return frames
+
+    frames = benchmark.pedantic(consume, setup=setup, rounds=5)
+    record_frames(benchmark, frames)
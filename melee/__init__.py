@@ -1,14 +1,95 @@
 """Open API written in Python for making your own Smash Bros: Melee AI
 Python3 only
 Works on Linux/OSX/Windows
+
+Submodules are imported lazily (PEP 562), the first time one of their names
+is accessed, so `import melee` stays cheap for short-lived processes.
 """
-from melee.console import *
-from melee.logger import *
-from melee.gamestate import *
-from melee.enums import *
-from melee.controller import *
-from melee.framedata import *
-from melee.menuhelper import *
-from melee.stages import *
-from melee.version import *
-from melee import menuhelper, techskill, framedata, stages
+import importlib
+from typing import TYPE_CHECKING
+
+# Where each public name of the package lives
+_LAZY_ATTRS = {
+    **dict.fromkeys([
+        "Console", "DolphinBuild", "DolphinVersion", "DumpConfig", "FIELD_GROUPS", "FrameDesync",
+        "InvalidDolphinPath", "LockstepStats", "SlippiVersionTooLow", "default_dolphin_install_path", "get_dolphin_version",
+        "get_exe_path", "read_byte", "read_shift_jis"], "console"),
+    "Logger": "logger",
+    **dict.fromkeys([
+        "Cursor", "ECB", "FoDPlatforms", "GameInfo", "GameState", "LazyGameState", "LazyPlayerState",
+        "PlayerInfo", "PlayerState", "Position", "Projectile", "Speed", "StadiumTransformation",
+        "StadiumTransformationEvent", "StadiumTransformationType", "UnknownAnimation",
+        "UnknownProjectileType", "WhispyBlowDirection", "port_detector"], "gamestate"),
+    **dict.fromkeys([
+        "Action", "AttackState", "Button", "Character", "ControllerStatus", "ControllerType",
+        "GameEndMethod", "Menu", "ProjectileType", "Stage", "SubMenu", "from_internal", "to_internal",
+        "to_internal_stage"], "enums"),
+    **dict.fromkeys([
+        "ActionTable", "BUTTON_MASKS", "ButtonView", "Controller", "ControllerState",
+        "SaveStateHotkeys", "apply_actions", "fix_analog_stick", "fix_analog_trigger",
+        "pack_buttons", "unpack_buttons"], "controller"),
+    **dict.fromkeys(["FrameData", "load_characterdata", "load_zero_indices"], "framedata"),
+    "MenuHelper": "menuhelper",
+    **dict.fromkeys([
+        "BLASTZONES", "EDGE_GROUND_POSITION", "EDGE_POSITION", "RANDALL_INTERVAL",
+        "left_platform_position", "randall_position", "right_platform_position",
+        "side_platform_position", "top_platform_position"], "stages"),
+    **dict.fromkeys(["FrameProfile", "Histogram", "Phase", "Profiler"], "profiling"),
+    **dict.fromkeys(["EventType", "SlippstreamClient"], "slippstream"),
+    **dict.fromkeys(["RollbackStats", "SLPFileStreamer"], "slpfilestreamer"),
+    **dict.fromkeys(["ConsoleLease", "DolphinPool"], "pool"),
+    **dict.fromkeys(["LaunchResult", "allocate_ports", "launch", "release_ports"], "launcher"),
+    **dict.fromkeys([
+        "Placement", "apply_to_current_process", "format_cpu_list", "layout_instances",
+        "parse_cpu_list", "read_topology"], "affinity"),
+    **dict.fromkeys([
+        "ConsoleSupervisor", "FailureKind", "SupervisorEvent", "SupervisorStats"], "supervisor"),
+    **dict.fromkeys(["Game", "Session"], "session"),
+    **dict.fromkeys(["FrameHistory", "GameColumns", "PLAYER_COLUMNS"], "columns"),
+    **dict.fromkeys(["DEFAULT_SPEC", "FeatureExtractor"], "features"),
+    **dict.fromkeys(["GameStateDecoder", "GameStateEncoder"], "serialize"),
+    "ProjectileTracker": "projectiles",
+}
+
+_SUBMODULES = {
+    "affinity", "columns", "console", "controller", "enums", "features", "framedata", "gamestate", "launcher",
+    "logger", "menuhelper", "pool", "profiling", "projectiles", "serialize", "session", "slippstream",
+    "slippstreamserver", "slpfilestreamer", "stages", "supervisor", "techskill", "version",
+}
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        value = getattr(importlib.import_module("melee." + _LAZY_ATTRS[name]), name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module("melee." + name)
+    else:
+        raise AttributeError(f"module 'melee' has no attribute '{name}'")
+    # Cache it, so __getattr__ is only called once per name
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS) | _SUBMODULES)
+
+if TYPE_CHECKING:
+    from melee.console import *
+    from melee.logger import *
+    from melee.gamestate import *
+    from melee.enums import *
+    from melee.controller import *
+    from melee.framedata import *
+    from melee.menuhelper import *
+    from melee.stages import *
+    from melee.profiling import *
+    from melee.slippstream import EventType, SlippstreamClient
+    from melee.slpfilestreamer import RollbackStats, SLPFileStreamer
+    from melee.pool import *
+    from melee.launcher import *
+    from melee.affinity import *
+    from melee.supervisor import *
+    from melee.session import *
+    from melee.columns import *
+    from melee.features import DEFAULT_SPEC, FeatureExtractor
+    from melee.serialize import GameStateDecoder, GameStateEncoder
+    from melee.projectiles import ProjectileTracker
+    from melee import menuhelper, techskill, framedata, stages
@@ -0,0 +1,138 @@
+"""CPU placement for running many Dolphin instances on one host
+
+Left alone, the scheduler moves dozens of Dolphins and their Slippstream
+workers between cores, which makes emulation speed erratic. This module reads
+the host's NUMA and core topology (from /sys on Linux) and spreads instances
+over it so that each gets a physical core of its own for as long as there are
+enough of them. launcher.launch(pin_cpus=True) does this automatically.
+
+Usage:
+    for placement in melee.layout_instances(8):
+        console = melee.Console(..., worker_cpu_affinity=placement.cpus)
+        console.run(iso_path, cpu_affinity=placement.cpus)
+"""
+
+import dataclasses
+import glob
+import os
+import re
+from typing import Iterable, Optional
+
+_SYS_CPU = "/sys/devices/system/cpu"
+_SYS_NODE = "/sys/devices/system/node"
+
+def parse_cpu_list(text: str) -> list[int]:
+    """Parse a kernel cpu list such as "0-3,8,10-11" """
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+def format_cpu_list(cpus: Iterable[int]) -> str:
+    """Format cpus as a kernel cpu list, the inverse of parse_cpu_list"""
+    cpus = sorted(set(cpus))
+    ranges = []
+    for cpu in cpus:
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+def _read(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+def _usable_cpus() -> set[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return set(os.sched_getaffinity(0))
+    return set(range(os.cpu_count() or 1))
+
+def read_topology() -> dict[int, list[tuple[int, ...]]]:
+    """Return the cpus this process may use, grouped by NUMA node and physical core
+
+    Returns:
+        dict of NUMA node to a list of physical cores, each a tuple of its
+        logical cpus (hyperthread siblings). Without /sys (or on other
+        platforms), every cpu is treated as its own core on node 0.
+    """
+    usable = _usable_cpus()
+    nodes = {}
+    for node_path in glob.glob(os.path.join(_SYS_NODE, "node[0-9]*")):
+        node = int(re.search(r"node(\d+)$", node_path).group(1))
+        try:
+            nodes[node] = [cpu for cpu in parse_cpu_list(_read(os.path.join(node_path, "cpulist")))
+                           if cpu in usable]
+        except OSError:
+            continue
+    if not nodes:
+        nodes = {0: sorted(usable)}
+
+    topology = {}
+    for node, cpus in sorted(nodes.items()):
+        cores = []
+        seen = set()
+        for cpu in cpus:
+            if cpu in seen:
+                continue
+            try:
+                siblings = parse_cpu_list(_read(
+                    os.path.join(_SYS_CPU, f"cpu{cpu}", "topology", "thread_siblings_list")))
+            except OSError:
+                siblings = [cpu]
+            core = tuple(sibling for sibling in siblings if sibling in usable) or (cpu,)
+            seen.update(core)
+            cores.append(core)
+        if cores:
+            topology[node] = cores
+    return topology
+
+@dataclasses.dataclass(frozen=True)
+class Placement:
+    """Where one instance should run"""
+    node: int
+    """(int): NUMA node"""
+    cpus: frozenset[int]
+    """(frozenset of int): Logical cpus for Dolphin and its Slippstream worker"""
+
+def layout_instances(
+    count: int,
+    topology: Optional[dict[int, list[tuple[int, ...]]]] = None,
+) -> list[Placement]:
+    """Spread `count` instances over the NUMA nodes and physical cores of the host
+
+    Instances alternate between nodes and each one gets a whole physical core
+    (all of its hyperthreads). With more instances than cores, cores are shared
+    round-robin.
+
+    Args:
+        count (int): Number of instances
+        topology (dict): As returned by read_topology(). Read from the host if not given.
+    """
+    if topology is None:
+        topology = read_topology()
+    # Interleave the nodes: core 0 of each node, then core 1 of each node, ...
+    cores = []
+    depth = max(len(node_cores) for node_cores in topology.values())
+    for i in range(depth):
+        for node, node_cores in sorted(topology.items()):
+            if i < len(node_cores):
+                cores.append((node, node_cores[i]))
+    return [Placement(node, frozenset(core))
+            for node, core in (cores[i % len(cores)] for i in range(count))]
+
+def apply_to_current_process(
+    cpu_affinity: Optional[Iterable[int]] = None,
+    nice: Optional[int] = None,
+):
+    """Pin the calling process to some cpus and/or lower its priority"""
+    if cpu_affinity is not None:
+        os.sched_setaffinity(0, cpu_affinity)
+    if nice is not None:
+        os.nice(nice)
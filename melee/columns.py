@@ -0,0 +1,210 @@
+"""Column buffers that collect a game's gamestates into numpy arrays
+
+Building one Python object per frame and pulling values out of it afterwards is
+slow when processing thousands of games. A GameColumns instead copies the
+interesting values of each frame into preallocated numpy arrays as the frames
+come in, so a finished game is a handful of (frames, 4) arrays ready for
+aggregation or training.
+
+Usage:
+    columns = melee.GameColumns()
+    while (gamestate := console.step()) is not None:
+        columns.append(gamestate)
+    percents = columns["percent"]  # shape (frames, 4), indexed by port - 1
+
+FrameHistory keeps just the last few frames the same way, for bots that look back
+over recent frames as they play.
+"""
+
+from typing import Callable, Optional
+
+import numpy as np
+
+from melee.gamestate import GameState, PlayerState
+
+PLAYER_COLUMNS: dict[str, tuple[type, Callable[[PlayerState], object]]] = {
+    "character": (np.uint8, lambda player: player.character.value),
+    "x": (np.float32, lambda player: player.position.x),
+    "y": (np.float32, lambda player: player.position.y),
+    "percent": (np.float32, lambda player: player.percent),
+    "stock": (np.uint8, lambda player: player.stock),
+    "action": (np.uint16, lambda player: player.action.value),
+    "action_frame": (np.int16, lambda player: player.action_frame),
+    "facing": (np.bool_, lambda player: player.facing),
+    "on_ground": (np.bool_, lambda player: player.on_ground),
+    "shield_strength": (np.float32, lambda player: player.shield_strength),
+    "jumps_left": (np.int8, lambda player: player.jumps_left),
+    "invulnerable": (np.bool_, lambda player: player.invulnerable),
+    "hitlag_left": (np.int16, lambda player: player.hitlag_left),
+    "hitstun_frames_left": (np.int16, lambda player: player.hitstun_frames_left),
+    "buttons": (np.uint16, lambda player: player.controller_state.buttons),
+}
+"""Per-player columns collected by GameColumns: name to (dtype, getter)"""
+
+class GameColumns:
+    """A growable set of per-frame arrays for one game
+
+    Every player column has shape (frames, 4), with ports 1-4 at indices 0-3.
+    Ports without a player are zero, see `present`. Capacity doubles whenever it
+    runs out, so appending is amortized O(1).
+    """
+    def __init__(self, capacity: int = 4096):
+        """
+        Args:
+            capacity (int): Frames to allocate room for up front. A game at the
+                8 minute timer limit is 28800 frames.
+        """
+        self._size = 0
+        self._capacity = capacity
+        self._frame = np.zeros(capacity, np.int32)
+        self._present = np.zeros((capacity, 4), np.bool_)
+        self._columns = {name: np.zeros((capacity, 4), dtype)
+                         for name, (dtype, _) in PLAYER_COLUMNS.items()}
+
+    def _grow(self):
+        self._capacity *= 2
+        self._frame = np.resize(self._frame, self._capacity)
+        self._present = np.resize(self._present, (self._capacity, 4))
+        for name, column in self._columns.items():
+            self._columns[name] = np.resize(column, (self._capacity, 4))
+
+    def append(self, gamestate: GameState):
+        """Copy a frame's values into the next row"""
+        if self._size == self._capacity:
+            self._grow()
+        row = self._size
+        self._frame[row] = gamestate.frame
+        self._present[row] = False
+        for column in self._columns.values():
+            column[row] = 0
+        for port, player in gamestate.players.items():
+            index = port - 1
+            self._present[row, index] = True
+            for name, (_, getter) in PLAYER_COLUMNS.items():
+                self._columns[name][row, index] = getter(player)
+        self._size += 1
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def frame(self) -> np.ndarray:
+        """(np.ndarray): The frame number of each row, shape (frames,)"""
+        return self._frame[:self._size]
+
+    @property
+    def present(self) -> np.ndarray:
+        """(np.ndarray): Whether each port had a player on each frame, shape (frames, 4)"""
+        return self._present[:self._size]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """A player column, such as columns["percent"], shape (frames, 4). Also "frame" and "present"."""
+        if name == "frame":
+            return self.frame
+        if name == "present":
+            return self.present
+        return self._columns[name][:self._size]
+
+    def to_dict(self) -> dict[str, np.ndarray]:
+        """Copy all the columns out, trimmed to the number of frames"""
+        columns = {"frame": self.frame.copy(), "present": self.present.copy()}
+        for name in self._columns:
+            columns[name] = self[name].copy()
+        return columns
+
+# PLAYER_COLUMNS, with x and y together as "position", so its windows are (frames, 4, 2)
+_HISTORY_COLUMNS = {
+    "position": ((np.float32, (2,)), lambda player: (player.position.x, player.position.y)),
+    **{name: column for name, column in PLAYER_COLUMNS.items() if name not in ("x", "y")},
+}
+_POSITION_AXES = {"x": 0, "y": 1}
+
+class FrameHistory:
+    """The last few frames of per-player values, in a preallocated numpy ring buffer
+
+    Made by Console(history=N), which appends every gamestate step() returns and
+    starts over with each game. Each frame is a row of 4 records, one per port,
+    with a field for each of PLAYER_COLUMNS (x and y together as "position") and
+    "present". Every row is written twice, N rows apart, so the last k frames are
+    always one contiguous slice: window() returns views without copying, and
+    appending doesn't allocate.
+
+    Usage:
+        console = melee.Console(..., history=60)
+        gamestate = console.step()
+        positions = console.history.window("position", 30)  # shape (30, 4, 2)
+        last_percent = console.history[-2]["percent"]  # shape (4,), by port - 1
+    """
+    def __init__(self, length: int):
+        """
+        Args:
+            length (int): How many of the latest frames to keep
+        """
+        if length < 1:
+            raise ValueError("A frame history needs room for at least one frame")
+        self.length = length
+        self.dtype = np.dtype([("present", np.bool_)] + [
+            (name, dtype) for name, (dtype, _) in _HISTORY_COLUMNS.items()])
+        """(np.dtype): The record of one port on one frame"""
+        self._getters = [getter for _, getter in _HISTORY_COLUMNS.values()]
+        self._rows = np.zeros((2 * length, 4), self.dtype)
+        self._frame = np.zeros(2 * length, np.int32)
+        self._empty = np.zeros(4, self.dtype)
+        self._count = 0
+
+    def append(self, gamestate: GameState):
+        """Copy a frame's values in, over the oldest frame if it's full"""
+        slot = self._count % self.length
+        row = self._rows[slot]
+        row[:] = self._empty
+        for port, player in gamestate.players.items():
+            row[port - 1] = (True, *(getter(player) for getter in self._getters))
+        self._rows[slot + self.length] = row
+        self._frame[slot] = self._frame[slot + self.length] = gamestate.frame
+        self._count += 1
+
+    def clear(self):
+        """Forget every frame"""
+        self._count = 0
+
+    def __len__(self) -> int:
+        return min(self._count, self.length)
+
+    def _end(self) -> int:
+        """One past the row of the newest frame, in the second copy"""
+        return (self._count - 1) % self.length + self.length + 1
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        """A frame's 4 records, such as history[-1] for the newest. Shape (4,), indexed by port - 1."""
+        size = len(self)
+        if not -size <= index < size:
+            raise IndexError(f"Frame {index} isn't in a history of {size} frames")
+        if index < 0:
+            index += size
+        return self._rows[self._end() - size + index]
+
+    def window(self, name: str, frames: Optional[int] = None) -> np.ndarray:
+        """A view of one value over the latest frames, oldest first
+
+        Args:
+            name (str): A field of dtype, "x" or "y" for one axis of "position",
+                or "frame" for the frame numbers
+            frames (int): How many of the latest frames. All of them by default.
+
+        Returns:
+            A view into the buffer, shape (frames, 4) or (frames, 4, 2) for
+            position, (frames,) for frame. It's overwritten as frames come in,
+            so copy it to keep it.
+        """
+        size = len(self)
+        if frames is None:
+            frames = size
+        if not 0 <= frames <= size:
+            raise ValueError(f"Can't take {frames} frames from a history of {size}")
+        end = self._end() if size else 0
+        start = end - frames
+        if name == "frame":
+            return self._frame[start:end]
+        if name in _POSITION_AXES:
+            return self._rows["position"][start:end, :, _POSITION_AXES[name]]
+        return self._rows[name][start:end]
@@ -4,21 +4,22 @@ This can be Dolphin (Slippi's Ishiiruka) or an SLP file. The Console object
 is your method to start and stop Dolphin, set configs, and get the latest GameState.
 """
 
-from collections import defaultdict
+import collections
 import dataclasses
 import enum
-from typing import Optional
+from typing import Callable, Iterable, Optional
 from packaging import version
 
 import logging
 import time
 import os
+import pickle
 import stat
 import configparser
-import csv
+import hashlib
+import json
 import subprocess
 import platform
-import math
 import base64
 import numpy as np
 from pathlib import Path
@@ -28,10 +29,18 @@ import tempfile
 from melee import enums
 from melee.enums import Action
 import melee.gamestate as gamestate_lib
-from melee.gamestate import GameState, Projectile, PlayerState
-from melee.slippstream import SlippstreamClient, EventType
-from melee.slpfilestreamer import SLPFileStreamer
+from melee.gamestate import (
+    GameInfo, GameState, LazyGameState, LazyPlayerState, PlayerInfo, Projectile, PlayerState)
+from melee.slippstream import (
+    DECODED_GAMESTATE, DECODED_ROLLBACK, DECODED_STATE, EnetDisconnected, SlippstreamClient, EventType)
+from melee.slpfilestreamer import RollbackStats, SLPFileStreamer
+from melee.profiling import Histogram, Phase, Profiler
+from melee.columns import FrameHistory
+from melee.serialize import GameStateEncoder
+from melee.projectiles import ProjectileTracker, items_from_events, items_from_projectiles
 from melee import stages
+import melee.framedata as framedata_lib
+from melee import affinity
 
 
 class SlippiVersionTooLow(Exception):
@@ -44,6 +53,80 @@ class InvalidDolphinPath(Exception):
     def __init__(self, message):
         self.message = message
 
+FIELD_GROUPS = {
+    # Always decoded
+    **dict.fromkeys([
+        "frame", "stage", "menu_state", "players", "is_teams", "distance", "character",
+        "position", "action", "action_frame", "facing", "percent", "shield_strength", "stock",
+        "moonwalkwarning", "iasa", "costume", "cpu_level", "team_id", "nana", "info"], "core"),
+    **dict.fromkeys([
+        "is_powershield", "hitstun_frames_left", "on_ground", "jumps_left", "invulnerable",
+        "hitlag_left", "off_stage"], "flags"),
+    **dict.fromkeys([
+        "speed_air_x_self", "speed_y_self", "speed_x_attack", "speed_y_attack",
+        "speed_ground_x_self"], "speeds"),
+    **dict.fromkeys(["ecb", "ecb_top", "ecb_bottom", "ecb_left", "ecb_right"], "ecb"),
+    "controller_state": "controller",
+    "projectiles": "projectiles",
+    **dict.fromkeys(["fod_platforms", "whispy", "stadium_transformation"], "stage"),
+    **dict.fromkeys([
+        "submenu", "menu_selection", "ready_to_start", "cursor", "coin_down",
+        "controller_status", "character_selected", "is_holding_cpu_slider"], "menu"),
+}
+"""The decoding group each field projectable with Console(fields=...) belongs to"""
+
+_ALL_FIELD_GROUPS = frozenset(FIELD_GROUPS.values())
+
+# Slippi Online never rolls back further than this, so with save state hotkeys
+# connected a bigger jump back is a save state load
+_MAX_ROLLBACK_FRAMES = 7
+
+# Events that are never decoded, and the group that needs each of the others
+_UNDECODED_EVENTS = (EventType.GECKO_LIST, EventType.BONES)
+_EVENT_GROUPS = {
+    EventType.ITEM_UPDATE: "projectiles",
+    EventType.FOD_INFO: "stage",
+    EventType.DL_INFO: "stage",
+    EventType.PS_INFO: "stage",
+}
+
+def _field_groups(fields: Optional[Iterable[str]]) -> frozenset[str]:
+    """Compile a field projection into the set of groups to decode"""
+    if fields is None:
+        return _ALL_FIELD_GROUPS
+    fields = list(fields)
+    unknown = [field for field in fields if field not in FIELD_GROUPS]
+    if unknown:
+        raise ValueError(f"Can't project unknown fields {unknown}, see FIELD_GROUPS")
+    return frozenset(["core"] + [FIELD_GROUPS[field] for field in fields])
+
+def _skipped_events(groups: frozenset[str]) -> frozenset[int]:
+    """Event command bytes that are skipped over for a set of decoding groups"""
+    skipped = {event.value for event in _UNDECODED_EVENTS}
+    skipped.update(event.value for event, group in _EVENT_GROUPS.items() if group not in groups)
+    return frozenset(skipped)
+
+class FrameDesync(Exception):
+    """Raised in strict lockstep mode when a frame is dropped or repeated"""
+    def __init__(self, message):
+        self.message = message
+
+@dataclasses.dataclass
+class LockstepStats:
+    """Frame sequence and latency metrics for a Console in lockstep mode"""
+    frames: int = 0
+    """(int): Gamestates returned by step()"""
+    dropped: int = 0
+    """(int): In-game frames that were skipped over between two steps"""
+    duplicated: int = 0
+    """(int): In-game frames that were returned again, or out of order"""
+    rollbacks: int = 0
+    """(int): Rollback frames that were skipped (see skip_rollback_frames)"""
+    resyncs: int = 0
+    """(int): Times the frame sequence was restarted, at game start or after a menu"""
+    rtt: Histogram = dataclasses.field(default_factory=Histogram)
+    """(profiling.Histogram): Nanoseconds from flushing the inputs to receiving the next frame"""
+
 def _ignore_fifos(src, names):
     fifos = []
     for name in names:
@@ -55,6 +138,43 @@ def _ignore_fifos(src, names):
 def _copytree_safe(src, dst):
     shutil.copytree(src, dst, ignore=_ignore_fifos)
 
+# Prepared home directories, one per configuration, see Console(template_home=True)
+_TEMPLATE_ROOT = os.path.join(tempfile.gettempdir(), "libmelee_templates")
+# Directories of a home that dolphin only ever reads, so instances can share the files.
+# Dolphin writes in place into others, such as StateSaves, ScreenShots and Dump.
+_LINKED_HOME_DIRS = {"Load", "Sys"}
+# Directories that are per-instance scratch space
+_SKIPPED_HOME_DIRS = {"Cache", "Logs", "Pipes"}
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Different filesystem, or no hardlink support
+        shutil.copy2(src, dst)
+
+def _materialize_home(template, dst):
+    """Create a home directory from a template
+
+    The directories dolphin only reads, such as the textures in Load, are
+    hardlinked and shared between instances. Everything else is copied, since
+    dolphin would write through a hardlink into the template and every other
+    instance.
+    """
+    os.makedirs(dst)
+    for entry in os.scandir(template):
+        target = os.path.join(dst, entry.name)
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name in _SKIPPED_HOME_DIRS:
+                continue
+            if entry.name in _LINKED_HOME_DIRS:
+                shutil.copytree(entry.path, target, ignore=_ignore_fifos,
+                                copy_function=_link_or_copy)
+            else:
+                _copytree_safe(entry.path, target)
+        elif entry.is_file(follow_symlinks=False):
+            shutil.copy2(entry.path, target)
+
 def default_dolphin_install_path() -> str:
     os_name = platform.system()
     home = os.path.expanduser("~")
@@ -164,9 +284,71 @@ class DolphinVersion:
     version: str
     build: DolphinBuild
 
+# Dolphin versions by (executable path, mtime, size), see get_dolphin_version
+_VERSION_CACHE: dict[tuple[str, int, int], DolphinVersion] = {}
+_VERSION_CACHE_PATH = os.path.join(tempfile.gettempdir(), "libmelee_dolphin_versions.json")
+
+def _read_version_cache() -> dict:
+    try:
+        with open(_VERSION_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_version_cache(exe_path: str, key: str, dolphin_version: DolphinVersion):
+    # Drop stale entries for replaced or deleted executables
+    entries = {}
+    for other_key, entry in _read_version_cache().items():
+        other_path = other_key.rsplit("|", 2)[0]
+        if other_path != exe_path and os.path.exists(other_path):
+            entries[other_key] = entry
+    entries[key] = dict(
+        mainline=dolphin_version.mainline,
+        version=dolphin_version.version,
+        build=dolphin_version.build.name,
+    )
+    # Write to a temporary file and rename so concurrent readers never see half a file
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(_VERSION_CACHE_PATH))
+        with os.fdopen(fd, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, _VERSION_CACHE_PATH)
+    except OSError as e:
+        logging.debug("Could not write the dolphin version cache: %s", e)
+
 def get_dolphin_version(path: str) -> DolphinVersion:
-    exe_path = get_exe_path(path)
+    """Return the version of the given dolphin executable or install directory
 
+    Running dolphin with --version takes a while, so results are cached in
+    memory and on disk, keyed by the executable's path, modification time and
+    size. Replacing the executable invalidates its entry.
+    """
+    exe_path = os.path.realpath(get_exe_path(path))
+    try:
+        exe_stat = os.stat(exe_path)
+    except OSError:
+        return _probe_dolphin_version(exe_path)
+
+    key = (exe_path, exe_stat.st_mtime_ns, exe_stat.st_size)
+    if key in _VERSION_CACHE:
+        return _VERSION_CACHE[key]
+
+    disk_key = "|".join(map(str, key))
+    entry = _read_version_cache().get(disk_key)
+    if entry is not None:
+        dolphin_version = DolphinVersion(
+            mainline=entry["mainline"],
+            version=entry["version"],
+            build=DolphinBuild[entry["build"]],
+        )
+    else:
+        dolphin_version = _probe_dolphin_version(exe_path)
+        _write_version_cache(exe_path, disk_key, dolphin_version)
+
+    _VERSION_CACHE[key] = dolphin_version
+    return dolphin_version
+
+def _probe_dolphin_version(exe_path: str) -> DolphinVersion:
     result = subprocess.run(
         [exe_path, '--version'],
         capture_output=True, text=True)
@@ -260,6 +442,301 @@ class DumpConfig:
         gfx_ini.set(section, 'BitrateKbps', "3000")
         gfx_ini.set(section, 'InternalResolutionFrameDumps', "True")
 
+# Decoders for the groups of FIELD_GROUPS, shared by eager and lazy decoding
+
+def _decode_core(playerstate: PlayerState, event_bytes: bytes):
+    """Post-frame group: what the player is, where, and how hurt"""
+    playerstate.position.x = np.ndarray((1,), ">f", event_bytes, 0xa)[0]
+    playerstate.position.y = np.ndarray((1,), ">f", event_bytes, 0xe)[0]
+
+    playerstate.character = enums.Character(np.ndarray((1,), ">B", event_bytes, 0x7)[0])
+    action_value = np.ndarray((1,), ">H", event_bytes, 0x8)[0]
+    try:
+        playerstate.action = enums.Action(action_value)
+    except ValueError:
+        playerstate.action = gamestate_lib.UnknownAnimation(action_value)
+
+    # Melee stores this in a float for no good reason. So we have to convert
+    playerstate.facing = np.ndarray((1,), ">f", event_bytes, 0x12)[0] > 0
+
+    playerstate.percent = np.ndarray((1,), ">f", event_bytes, 0x16)[0]
+    playerstate.shield_strength = np.ndarray((1,), ">f", event_bytes, 0x1A)[0]
+    playerstate.stock = np.ndarray((1,), ">B", event_bytes, 0x21)[0]
+    playerstate.action_frame = int(np.ndarray((1,), ">f", event_bytes, 0x22)[0])
+
+def _decode_flags(playerstate: PlayerState, event_bytes: bytes, stage: enums.Stage):
+    """Post-frame group: state flags and counters"""
+    try:
+        sb4 = int(np.ndarray((1,), ">B", event_bytes, 0x29)[0])
+        playerstate.is_powershield = (sb4 & 0x20) == 0x20
+    except TypeError:
+        playerstate.is_powershield = False
+
+    try:
+        playerstate.hitstun_frames_left = int(np.ndarray((1,), ">f", event_bytes, 0x2B)[0])
+    except TypeError:
+        playerstate.hitstun_frames_left = 0
+    except ValueError:
+        playerstate.hitstun_frames_left = 0
+    try:
+        playerstate.on_ground = not bool(np.ndarray((1,), ">B", event_bytes, 0x2F)[0])
+    except TypeError:
+        playerstate.on_ground = True
+    try:
+        playerstate.jumps_left = np.ndarray((1,), ">B", event_bytes, 0x32)[0]
+    except TypeError:
+        playerstate.jumps_left = 1
+
+    try:
+        playerstate.invulnerable = int(np.ndarray((1,), ">B", event_bytes, 0x34)[0]) != 0
+    except TypeError:
+        playerstate.invulnerable = False
+
+    try:
+        playerstate.hitlag_left = int(np.ndarray((1,), ">f", event_bytes, 0x49)[0])
+    except TypeError:
+        playerstate.hitlag_left = 0
+
+    # "off_stage" helper
+    try:
+        if (abs(playerstate.position.x) > stages.EDGE_GROUND_POSITION[stage] or \
+                playerstate.position.y < -6) and not playerstate.on_ground:
+            playerstate.off_stage = True
+        else:
+            playerstate.off_stage = False
+    except KeyError:
+        playerstate.off_stage = False
+
+def _decode_speeds(playerstate: PlayerState, event_bytes: bytes, stage: enums.Stage):
+    """Post-frame group: self and attack induced speeds"""
+    del stage  # unused
+    try:
+        playerstate.speed_air_x_self = np.ndarray((1,), ">f", event_bytes, 0x35)[0]
+    except TypeError:
+        playerstate.speed_air_x_self = 0
+
+    try:
+        playerstate.speed_y_self = np.ndarray((1,), ">f", event_bytes, 0x39)[0]
+    except TypeError:
+        playerstate.speed_y_self = 0
+
+    try:
+        playerstate.speed_x_attack = np.ndarray((1,), ">f", event_bytes, 0x3D)[0]
+    except TypeError:
+        playerstate.speed_x_attack = 0
+
+    try:
+        playerstate.speed_y_attack = np.ndarray((1,), ">f", event_bytes, 0x41)[0]
+    except TypeError:
+        playerstate.speed_y_attack = 0
+
+    try:
+        playerstate.speed_ground_x_self = np.ndarray((1,), ">f", event_bytes, 0x45)[0]
+    except TypeError:
+        playerstate.speed_ground_x_self = 0
+
+def _decode_ecb(playerstate: PlayerState, event_bytes: bytes, stage: enums.Stage):
+    """Post-frame group: the environment collision box"""
+    del stage  # unused
+    # ECB top edge, x
+    ecb_top_x = 0
+    ecb_top_y = 0
+    try:
+        ecb_top_x = np.ndarray((1,), ">f", event_bytes, 0x4D)[0]
+    except TypeError:
+        ecb_top_x = 0
+    # ECB Top edge, y
+    try:
+        ecb_top_y = np.ndarray((1,), ">f", event_bytes, 0x51)[0]
+    except TypeError:
+        ecb_top_y = 0
+    playerstate.ecb.top.x = ecb_top_x
+    playerstate.ecb.top.y = ecb_top_y
+    playerstate.ecb_top = (ecb_top_x, ecb_top_y)
+
+    # ECB bottom edge, x coord
+    ecb_bot_x = 0
+    ecb_bot_y = 0
+    try:
+        ecb_bot_x = np.ndarray((1,), ">f", event_bytes, 0x55)[0]
+    except TypeError:
+        ecb_bot_x = 0
+    # ECB Bottom edge, y coord
+    try:
+        ecb_bot_y = np.ndarray((1,), ">f", event_bytes, 0x59)[0]
+    except TypeError:
+        ecb_bot_y = 0
+    playerstate.ecb.bottom.x = ecb_bot_x
+    playerstate.ecb.bottom.y = ecb_bot_y
+    playerstate.ecb_bottom = (ecb_bot_x, ecb_bot_y)
+
+    # ECB left edge, x coord
+    ecb_left_x = 0
+    ecb_left_y = 0
+    try:
+        ecb_left_x = np.ndarray((1,), ">f", event_bytes, 0x5D)[0]
+    except TypeError:
+        ecb_left_x = 0
+    # ECB left edge, y coord
+    try:
+        ecb_left_y = np.ndarray((1,), ">f", event_bytes, 0x61)[0]
+    except TypeError:
+        ecb_left_y = 0
+    playerstate.ecb.left.x = ecb_left_x
+    playerstate.ecb.left.y = ecb_left_y
+    playerstate.ecb_left = (ecb_left_x, ecb_left_y)
+
+    # ECB right edge, x coord
+    ecb_right_x = 0
+    ecb_right_y = 0
+    try:
+        ecb_right_x = np.ndarray((1,), ">f", event_bytes, 0x65)[0]
+    except TypeError:
+        ecb_right_x = 0
+    # ECB right edge, y coord
+    try:
+        ecb_right_y = np.ndarray((1,), ">f", event_bytes, 0x69)[0]
+    except TypeError:
+        ecb_right_y = 0
+    playerstate.ecb.right.x = ecb_right_x
+    playerstate.ecb.right.y = ecb_right_y
+    playerstate.ecb_right = (ecb_right_x, ecb_right_y)
+
+def _decode_controller(playerstate: PlayerState, event_bytes: bytes):
+    """Pre-frame group: the controller inputs"""
+    controller_state = playerstate.controller_state
+
+    main_x = (np.ndarray((1,), ">f", event_bytes, 0x19)[0] / 2) + 0.5
+    main_y = (np.ndarray((1,), ">f", event_bytes, 0x1D)[0] / 2) + 0.5
+    controller_state.main_stick = (main_x, main_y)
+
+    c_x = (np.ndarray((1,), ">f", event_bytes, 0x21)[0] / 2) + 0.5
+    c_y = (np.ndarray((1,), ">f", event_bytes, 0x25)[0] / 2) + 0.5
+    controller_state.c_stick = (c_x, c_y)
+
+    raw_main_x = 0  # Added in 1.2.0
+    raw_main_y = 0  # Added in 3.15.0
+    try:
+        raw_main_x = int(np.ndarray((1,), ">b", event_bytes, 0x3B)[0])
+    except TypeError:
+        pass
+    try:
+        raw_main_y = int(np.ndarray((1,), ">b", event_bytes, 0x40)[0])
+    except TypeError:
+        pass
+    controller_state.raw_main_stick = (raw_main_x, raw_main_y)
+
+    # The game interprets both shoulders together, so the processed value will always be the same
+    trigger = (np.ndarray((1,), ">f", event_bytes, 0x29)[0])
+    controller_state.l_shoulder = trigger
+    controller_state.r_shoulder = trigger
+
+    # Kept as bitmasks, controller_state.button and processed_button decode them on access
+    controller_state.buttons = int(np.ndarray((1,), ">H", event_bytes, 0x31)[0])
+    controller_state.processed_buttons = int(np.ndarray((1,), ">I", event_bytes, 0x2D)[0])
+
+def _decode_item(event_bytes: bytes, slp_version: tuple[int, int, int]) -> Projectile:
+    """An item update event, as a Projectile"""
+    projectile = Projectile()
+    projectile.position.x = np.ndarray((1,), ">f", event_bytes, 0x14)[0]
+    projectile.position.y = np.ndarray((1,), ">f", event_bytes, 0x18)[0]
+    projectile.speed.x = np.ndarray((1,), ">f", event_bytes, 0xc)[0]
+    projectile.speed.y = np.ndarray((1,), ">f", event_bytes, 0x10)[0]
+
+    raw_projectile_type = np.ndarray((1,), ">H", event_bytes, 0x5)[0]
+    try:
+        projectile.type = enums.ProjectileType(raw_projectile_type)
+    except ValueError:
+        projectile.type = gamestate_lib.UnknownProjectileType(raw_projectile_type)
+
+    projectile.expiration_frames = int(np.ndarray((1,), ">f", event_bytes, 0x1E)[0])
+
+    projectile.subtype = np.ndarray((1,), ">B", event_bytes, 0x7)[0]
+
+    # # Ignore exploded Samus bombs. They are subtype 3
+    # if projectile.type == enums.ProjectileType.SAMUS_BOMB and projectile.subtype == 3:
+    #     return
+    # # Ignore exploded Samus missles
+    # if projectile.type == enums.ProjectileType.SAMUS_MISSLE and projectile.subtype in [2, 3]:
+    #     return
+    # # Ignore Samus charge beam while charging (not firing)
+    # if projectile.type == enums.ProjectileType.SAMUS_CHARGE_BEAM and projectile.subtype == 0:
+    #     return
+
+    projectile.spawn_id = np.ndarray((1,), ">I", event_bytes, 0x22)[0]
+
+    if slp_version >= (3, 6, 0):
+        # 0-3 for the player that owns the item. -1 when not owned
+        projectile.owner = np.ndarray((1,), ">b", event_bytes, 0x2A)[0] + 1
+    return projectile
+
+# Decoders for LazyPlayerState and LazyGameState, in terms of the ones above
+
+def _decode_lazy_core(playerstate: LazyPlayerState):
+    event_bytes = playerstate._post
+    if event_bytes is None:
+        return
+    playerstate.position = gamestate_lib.Position()
+    _decode_core(playerstate, event_bytes)
+
+    # The moonwalk warning of Console.__post_frame
+    action = playerstate.action.value
+    playerstate.moonwalkwarning = action == Action.DASHING.value and playerstate._prev_action is not None \
+        and playerstate._prev_action not in (Action.DASHING.value, Action.TURNING.value)
+
+    # And the fixups Console.step() makes to the (non-Nana) players
+    if event_bytes[0x6] != 1:
+        if action in framedata_lib.load_zero_indices()[playerstate.character.value]:
+            playerstate.action_frame = playerstate.action_frame + 1
+        if action < Action.NEUTRAL_ATTACK_1.value or action > Action.DAIR.value:
+            playerstate.iasa = False
+
+def _decode_lazy_flags(playerstate: LazyPlayerState):
+    if playerstate._post is not None:
+        _decode_flags(playerstate, playerstate._post, playerstate._stage)
+
+def _decode_lazy_speeds(playerstate: LazyPlayerState):
+    if playerstate._post is not None:
+        _decode_speeds(playerstate, playerstate._post, playerstate._stage)
+
+def _decode_lazy_ecb(playerstate: LazyPlayerState):
+    if playerstate._post is not None:
+        playerstate.ecb = gamestate_lib.ECB()
+        _decode_ecb(playerstate, playerstate._post, playerstate._stage)
+
+def _decode_lazy_controller(playerstate: LazyPlayerState):
+    if playerstate._pre is not None:
+        from melee.controller import ControllerState  # avoid circular import
+        playerstate.controller_state = ControllerState()
+        _decode_controller(playerstate, playerstate._pre)
+
+_LAZY_PLAYER_GROUP_DECODERS = {
+    "core": _decode_lazy_core,
+    "flags": _decode_lazy_flags,
+    "speeds": _decode_lazy_speeds,
+    "ecb": _decode_lazy_ecb,
+    "controller": _decode_lazy_controller,
+}
+
+def _lazy_player_decoders(groups: frozenset[str]) -> dict:
+    """LazyPlayerState field to decoder, for a set of decoding groups"""
+    player_fields = {field.name for field in dataclasses.fields(PlayerState)}
+    return {field: _LAZY_PLAYER_GROUP_DECODERS[group] for field, group in FIELD_GROUPS.items()
+            if field in player_fields and group in groups and group in _LAZY_PLAYER_GROUP_DECODERS}
+
+def _decode_lazy_distance(gamestate: LazyGameState):
+    gamestate.distance = gamestate_lib._player_distance(gamestate.players)
+
+def _decode_lazy_projectiles(gamestate: LazyGameState):
+    if len(gamestate._items) > 15:
+        logging.error("More than 15 projectiles. Something is probably wrong.")
+    gamestate.projectiles = [_decode_item(event_bytes, gamestate._slp_version) for event_bytes in gamestate._items]
+
+_LAZY_GAME_DECODERS = {
+    "distance": _decode_lazy_distance,
+    "projectiles": _decode_lazy_projectiles,
+}
+
 # pylint: disable=too-many-instance-attributes
 class Console:
     """The console object that represents your Dolphin / Wii / SLP file
@@ -296,6 +773,21 @@ class Console:
                  enable_ffw=False,
                  dump_config: Optional[DumpConfig] = None,
                  debug: bool = False,
+                 compression_dict: Optional[str | bytes] = None,
+                 profiler: Optional[Profiler] = None,
+                 template_home: bool = False,
+                 connect_timeout: float = 10.,
+                 worker_cpu_affinity: Optional[Iterable[int]] = None,
+                 worker_nice: Optional[int] = None,
+                 lockstep: bool = False,
+                 lockstep_strict: bool = False,
+                 fields: Optional[Iterable[str]] = None,
+                 lazy: bool = False,
+                 latest_only: bool = False,
+                 decode_in_worker: bool = False,
+                 final_frames_only: bool = False,
+                 history: int = 0,
+                 track_projectiles: bool = False,
                 ):
         """Create a Console object
 
@@ -344,12 +836,64 @@ class Console:
             enable_ffw (bool): Enable fast-forward mode. Useful for bot training. Must
                 have use_exi_inputs=True.
             dump_config (DumpConfig): Settings for video dumps.
+            compression_dict (str or bytes): zstd dictionary used to compress the SLP
+                file, either raw or as a path. Only needed for dictionary-compressed files.
+                gzip, zstd and lz4 compressed files are otherwise detected automatically.
+            profiler (profiling.Profiler): Collects per-phase timings and counters for
+                each step(). None (the default) disables instrumentation.
+            template_home (bool): Build the temporary home directory from a template
+                shared by all consoles with the same configuration, instead of setting
+                it up from scratch. The template is made once under the system temp
+                directory, then instances hardlink its read-only directories (Load and
+                Sys) and get their own copies of the rest. Requires tmp_home_directory. Delete the
+                template directory to pick up changes to a copied home directory.
+            connect_timeout (float): Seconds connect() waits for the Slippstream server
+                to accept the connection.
+            worker_cpu_affinity (iterable of int): Logical cpus to pin the Slippstream
+                worker process to. Linux only.
+            worker_nice (int): Niceness increment for the Slippstream worker process.
+            lockstep (bool): Check that each step() returns exactly the in-game frame
+                after the previous one, and measure the round trip from sending inputs
+                to getting the next frame. Drops and repeats are counted in
+                `lockstep_stats`. Best used with blocking_input, and not with polling_mode.
+            lockstep_strict (bool): In lockstep mode, raise FrameDesync on a dropped
+                or repeated frame instead of just counting it.
+            fields (iterable of str): Only decode these GameState and PlayerState
+                fields, such as ["position", "action", "stock", "percent"]. See
+                FIELD_GROUPS for the choices. Fields that are always cheap to get
+                (the "core" group) are decoded regardless, the others keep their
+                default values. Events that are only needed for fields left out,
+                such as item updates, are skipped without being decoded. None
+                decodes everything.
+            lazy (bool): Return gamestate.LazyGameStates from step(), which keep the
+                raw frame events and decode each player field the first time it's
+                read. Much cheaper when only a few fields are looked at per frame.
+            latest_only (bool): When step() is called after falling behind a live
+                console, skip straight to the newest complete frame instead of
+                returning every buffered one. The skipped frames are counted in
+                frames_dropped. Only for Dolphin and remote consoles.
+            decode_in_worker (bool): Decode the game events in the Slippstream worker
+                process, which sends back each gamestate as a compact delta from the
+                last one (see serialize). This process then only applies the deltas,
+                leaving most of the GIL to the bot. GameState.custom isn't sent.
+                Only for Dolphin and remote consoles, and not with lazy.
+            final_frames_only (bool): For SLP files, find the frames that rollbacks
+                replaced before decoding anything, and return only the final version
+                of each frame. The replaced versions are stepped over without being
+                decoded. See rollback_stats.
+            history (int): Keep the per-player values of this many of the latest
+                frames in numpy arrays, see the history attribute. 0 for none.
+            track_projectiles (bool): Follow each projectile across frames by its
+                spawn ID, see projectile_tracker. For SLP files it also keeps their
+                trajectories. Needs SLP 3.6.0 or newer.
         """
         self.logger = logger
         self.is_dolphin = is_dolphin
         self.path = path
         self.dolphin_home_path = dolphin_home_path
         self.temp_dir = None
+        self.template_home_path: Optional[str] = None
+        """(str): The template the home directory was made from, if template_home is set"""
 
         self.processingtime = 0
         self._frametimestamp = time.time()
@@ -366,6 +910,8 @@ class Console:
         self.cursor = 0
         from melee.controller import Controller  # avoid circular import
         self.controllers: list[Controller] = []
+        # Called whenever the controllers are flushed, such as SaveStateHotkeys.flush
+        self._flush_hooks: list[Callable[[], None]] = []
         self._current_stage = enums.Stage.NO_STAGE
         self._frame = 0
         self._polling_mode = polling_mode
@@ -373,6 +919,14 @@ class Console:
         self.skip_rollback_frames = skip_rollback_frames
         self.slp_version_tuple: Optional[tuple[int, int, int]] = None
         """(str): The SLP version this stream/file currently is."""
+        self.games_started = 0
+        """(int): Number of GAME_START events seen so far"""
+        self.game_end_method: Optional[enums.GameEndMethod] = None
+        """(enums.GameEndMethod): How the current game ended. None until it has."""
+        self.lras_initiator: Optional[int] = None
+        """(int): Port of the player who quit the game with L+R+A+Start, if any"""
+        self.placements: Optional[dict[int, int]] = None
+        """(dict of int to int): Final placement (0 is first) by port. SLP 3.13.0+ only."""
         self._allow_old_version = allow_old_version
         self._use_manual_bookends = False
         self._costumes = {0:0, 1:0, 2:0, 3:0}
@@ -381,6 +935,7 @@ class Console:
         self._is_teams = False
         self._display_names: dict[int, str] = {}
         self._connect_codes: dict[int, str] = {}
+        self._game_info: Optional[GameInfo] = None
 
         # Stage-specific state tracking
         self._fod_platforms: Optional[gamestate_lib.FoDPlatforms] = None
@@ -407,6 +962,59 @@ class Console:
         self.enable_ffw = enable_ffw
         self.dump_config = dump_config
         self.debug = debug
+        self.profiler = profiler
+        """(profiling.Profiler): Instrumentation for step(), if enabled."""
+        fields = None if fields is None else list(fields)
+        self._field_groups = _field_groups(fields)
+        # The tracker needs the item events even when projectiles aren't decoded
+        self._skipped_events = _skipped_events(
+            self._field_groups | {"projectiles"} if track_projectiles else self._field_groups)
+        self._post_frame_decoders = [decoder for group, decoder in [
+            ("flags", _decode_flags),
+            ("speeds", _decode_speeds),
+            ("ecb", _decode_ecb),
+        ] if group in self._field_groups]
+        self._lazy = lazy
+        self._lazy_player_decoders = _lazy_player_decoders(self._field_groups)
+        self._lazy_game_decoders = _LAZY_GAME_DECODERS
+        # Raw action of each port on the last and the current frame, for lazy moonwalk warnings
+        self._prev_actions: dict[int, int] = {}
+        self._frame_actions: dict[int, int] = {}
+        if lockstep and polling_mode:
+            raise ValueError("lockstep mode can't be used with polling_mode")
+        if latest_only and not is_dolphin:
+            raise ValueError("latest_only mode is for live consoles, SLP files can't fall behind")
+        if latest_only and lockstep_strict:
+            raise ValueError("latest_only mode drops frames, which lockstep_strict mode raises on")
+        self._latest_only = latest_only
+        if decode_in_worker and not is_dolphin:
+            raise ValueError("decode_in_worker is for live consoles, SLP files are decoded in place")
+        if decode_in_worker and lazy:
+            raise ValueError("lazy gamestates can't be sent between processes")
+        self._decode_in_worker = decode_in_worker
+        if final_frames_only and is_dolphin:
+            raise ValueError("final_frames_only is for SLP files, a live stream can't know which frames are final")
+        # Messages read from the stream ahead of time in latest_only mode
+        self._pending_messages = collections.deque()
+        # Set by expect_state_load() until the jump shows up in the stream
+        self._state_load_pending = False
+        # Whether SaveStateHotkeys are connected, so that the game can jump to a save state any time
+        self._save_state_hotkeys = False
+        # Called for every rollback frame that's skipped, see _run_decoder()
+        self._on_rollback_frame: Optional[Callable[[], None]] = None
+        self.frames_dropped = 0
+        """(int): Frames skipped over by latest_only mode"""
+        self.lockstep_stats: Optional[LockstepStats] = LockstepStats() if lockstep else None
+        """(LockstepStats): Frame sequence metrics, if lockstep is set."""
+        self._lockstep_strict = lockstep_strict
+        self.history: Optional[FrameHistory] = FrameHistory(history) if history else None
+        """(columns.FrameHistory): The latest frames step() returned this game, if history is set."""
+        self.projectile_tracker: Optional[ProjectileTracker] = \
+            ProjectileTracker(trajectories=not is_dolphin) if track_projectiles else None
+        """(projectiles.ProjectileTracker): This game's projectiles by spawn ID, if track_projectiles is set."""
+        # Raw item events of the frame being read, for the projectile tracker
+        self._frame_items: list[bytes] = []
+        self._lockstep_expected: Optional[int] = None
 
         # Keep a running copy of the last gamestate produced
         self._prev_gamestate = GameState()
@@ -415,7 +1023,17 @@ class Console:
         self._process = None
 
         if self.is_dolphin:
-            self._slippstream = SlippstreamClient(self.slippi_address, self.slippi_port)
+            decode = None
+            if decode_in_worker:
+                if track_projectiles and fields is not None:
+                    # The tracker is fed from the decoded projectiles
+                    fields = fields + ["projectiles"]
+                decode = dict(fields=fields, skip_rollback_frames=skip_rollback_frames,
+                              allow_old_version=allow_old_version)
+            self._slippstream = SlippstreamClient(
+                self.slippi_address, self.slippi_port, profiler=profiler,
+                connect_timeout=connect_timeout, cpu_affinity=worker_cpu_affinity,
+                nice=worker_nice, decode=decode)
 
             if is_remote:
                 if path:
@@ -424,11 +1042,17 @@ class Console:
                 if not self.path:
                     self.path = default_dolphin_install_path()
 
+                if template_home and not tmp_home_directory:
+                    raise ValueError("template_home requires tmp_home_directory")
+
+                source_home = None
                 if tmp_home_directory:
                     self.temp_dir = tempfile.mkdtemp(prefix='libmelee_')
                     home_dir = os.path.join(self.temp_dir, "User")
                     if copy_home_directory:
-                        _copytree_safe(self._get_dolphin_home_path(), home_dir)
+                        source_home = self._get_dolphin_home_path()
+                        if not template_home:
+                            _copytree_safe(source_home, home_dir)
                     self.dolphin_home_path = home_dir
 
                 self.exe_path = get_exe_path(self.path)
@@ -453,31 +1077,61 @@ class Console:
                         'EXI inputs require a custom dolphin build. '
                         'See https://github.com/vladfi1/libmelee?tab=readme-ov-file#setup-instructions')
 
-                self._setup_home_directory()
+                if template_home:
+                    self._setup_home_from_template(source_home)
+                else:
+                    self._setup_home_directory()
         else:
-            self._slippstream = SLPFileStreamer(self.path)
-
-        # Prepare some structures for fixing melee data
-        path = os.path.dirname(os.path.realpath(__file__))
-        with open(path + "/actiondata.csv") as csvfile:
-            #A list of dicts containing the frame data
-            actiondata = list(csv.DictReader(csvfile))
-            #Dict of sets
-            self.zero_indices = defaultdict(set)
-            for line in actiondata:
-                if line["zeroindex"] == "True":
-                    self.zero_indices[int(line["character"])].add(int(line["action"]))
-
-        # Read the character data csv
-        self.characterdata = dict()
-        with open(path + "/characterdata.csv") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for line in reader:
-                del line["Character"]
-                #Convert all fields to numbers
-                for key, value in line.items():
-                    line[key] = float(value)
-                self.characterdata[enums.Character(line["CharacterIndex"])] = line
+            self._slippstream = SLPFileStreamer(
+                self.path, compression_dict, profiler=profiler,
+                skip_events=self._skipped_events, final_frames_only=final_frames_only)
+
+    @property
+    def rollback_stats(self) -> Optional[RollbackStats]:
+        """(slpfilestreamer.RollbackStats): How much the SLP file rolled back, with final_frames_only"""
+        if self.is_dolphin:
+            return None
+        return self._slippstream.rollback_stats
+
+    @property
+    def game_info(self) -> GameInfo:
+        """(gamestate.GameInfo): What's known about the current game, shared by all its gamestates
+
+        Built from GAME_START and the replay metadata the first time it's needed each game."""
+        if self._game_info is None:
+            metadata = {}
+            for i, names in self._slippstream.players.items():
+                metadata[int(i)] = names.get("names", {})
+            players = []
+            for i in range(4):
+                names = metadata.get(i, {})
+                players.append(PlayerInfo(
+                    costume=self._costumes[i],
+                    cpu_level=self._cpu_level[i],
+                    team_id=self._team_id[i],
+                    nickName=names.get("netplay", ""),
+                    connectCode=self._connect_codes.get(i, names.get("code", "")),
+                    displayName=self._display_names.get(i, "")))
+            self._game_info = GameInfo(
+                playedOn=self._slippstream.playedOn,
+                startAt=self._slippstream.timestamp,
+                consoleNick=self._slippstream.consoleNick,
+                players=tuple(players))
+        return self._game_info
+
+    @property
+    def zero_indices(self) -> dict[int, frozenset[int]]:
+        """(dict): Per character index, the actions whose frames Melee indexes from zero
+
+        Loaded from actiondata.csv on first use and shared across the process."""
+        return framedata_lib.load_zero_indices()
+
+    @property
+    def characterdata(self) -> dict[enums.Character, dict[str, float]]:
+        """(dict): Per character, physics attributes such as gravity and friction
+
+        Loaded from characterdata.csv on first use and shared across the process."""
+        return framedata_lib.load_characterdata()
 
     def connect(self):
         """ Connects to the Slippi server (dolphin or wii).
@@ -485,6 +1139,8 @@ class Console:
         Returns:
             True is successful, False otherwise
         """
+        # The replay's metadata is only read on connecting
+        self._game_info = None
         return self._slippstream.connect()
 
     def _get_dolphin_home_path(self):
@@ -503,18 +1159,25 @@ class Console:
     def get_dolphin_pipes_path(self, port):
         """Get the path of the named pipe input file for the given controller port
         """
+        return self._get_pipe_path(f"slippibot{port}")
+
+    def _get_pipe_path(self, name: str) -> str:
         if platform.system() == "Windows":
-            return '\\\\.\\pipe\\slippibot' + str(port)
+            return '\\\\.\\pipe\\' + name
         pipes_path = self._get_dolphin_home_path() + "/Pipes/"
         if not os.path.isdir(pipes_path):
             os.makedirs(pipes_path, exist_ok=True)
-        return pipes_path + f"slippibot{port}"
+        return pipes_path + name
 
     def run(self,
             iso_path: Optional[str] = None,
             dolphin_user_path: Optional[str] = None,
             environment_vars: Optional[dict] = None,
             platform: Optional[str] = None,
+            cpu_affinity: Optional[Iterable[int]] = None,
+            nice: Optional[int] = None,
+            ionice: Optional[int] = None,
+            cgroup: Optional[str] = None,
             ):
         """Run the Dolphin emulator.
 
@@ -531,6 +1194,13 @@ class Console:
               headless mode. Default is typically gui, depending on how
               dolphin was built. Only applies to mainline dolphin; Ishiiruka
               bakes the platform into the executable at compilation time.
+            cpu_affinity (iterable of int, optional): Logical cpus to pin dolphin to.
+              See affinity.layout_instances for spreading instances over the host. Linux only.
+            nice (int, optional): Niceness increment for the dolphin process
+            ionice (int, optional): Best-effort IO priority, 0 (highest) to 7 (lowest).
+              Needs the ionice command.
+            cgroup (str, optional): Path of a cgroup (v2) directory to move dolphin into.
+              The cgroup must exist and be writable by this user.
         """
         assert self.is_dolphin and self.path
 
@@ -554,7 +1224,37 @@ class Console:
         if environment_vars is not None:
             env.update(environment_vars)
 
-        self._process = subprocess.Popen(command, env=env)
+        # Scheduling settings are applied through wrapper commands where possible,
+        # so they are in place before dolphin starts its threads.
+        prefix = []
+        set_affinity_after = set_nice_after = False
+        if cpu_affinity is not None:
+            cpu_affinity = sorted(set(cpu_affinity))
+            if not hasattr(os, "sched_setaffinity"):
+                raise ValueError("cpu_affinity is only supported on Linux.")
+            if shutil.which("taskset"):
+                prefix += ["taskset", "-c", affinity.format_cpu_list(cpu_affinity)]
+            else:
+                set_affinity_after = True
+        if nice is not None:
+            if shutil.which("nice"):
+                prefix += ["nice", "-n", str(nice)]
+            else:
+                set_nice_after = True
+        if ionice is not None:
+            if not shutil.which("ionice"):
+                raise ValueError("ionice requires the ionice command.")
+            prefix += ["ionice", "-c", "2", "-n", str(ionice)]
+
+        self._process = subprocess.Popen(prefix + command, env=env)
+
+        if set_affinity_after:
+            os.sched_setaffinity(self._process.pid, cpu_affinity)
+        if set_nice_after:
+            os.setpriority(os.PRIO_PROCESS, self._process.pid, os.getpriority(os.PRIO_PROCESS, 0) + nice)
+        if cgroup is not None:
+            with open(os.path.join(cgroup, "cgroup.procs"), "w") as f:
+                f.write(str(self._process.pid))
 
     def stop(self):
         """ Stop the console.
@@ -562,15 +1262,14 @@ class Console:
         For Dolphin instances, this will kill the dolphin process.
         For Wiis and SLP files, it just shuts down our connection
          """
-        if self.path:
-            self.connected = False
-            self._slippstream.shutdown()
-            # If dolphin, kill the process
-            if self._process is not None:
-                # Sadly dolphin doesn't respect terminate
-                self._process.kill()
-                self._process.wait()
-                self._process = None
+        self.connected = False
+        self._slippstream.shutdown()
+        # If dolphin, kill the process
+        if self._process is not None:
+            # Sadly dolphin doesn't respect terminate
+            self._process.kill()
+            self._process.wait()
+            self._process = None
 
         if self.temp_dir:
             shutil.rmtree(self.temp_dir)
@@ -589,6 +1288,74 @@ class Console:
         if self.setup_gecko_codes:
             self._setup_gecko_codes()
 
+    def _template_key(self, source_home: Optional[str]) -> str:
+        """Hash of everything that goes into the home directory, except the port"""
+        libmelee_path = os.path.dirname(os.path.realpath(__file__))
+        with open(os.path.join(libmelee_path, "GALE01r2.ini"), "rb") as f:
+            gecko_hash = hashlib.sha256(f.read()).hexdigest()
+        settings = dict(
+            exe_path=os.path.realpath(self.exe_path),
+            dolphin_version=dataclasses.asdict(self.dolphin_version),
+            source_home=source_home and os.path.realpath(source_home),
+            gecko_hash=gecko_hash,
+            setup_gecko_codes=self.setup_gecko_codes,
+            online_delay=self.online_delay,
+            blocking_input=self.blocking_input,
+            fullscreen=self.fullscreen,
+            gfx_backend=self.gfx_backend,
+            disable_audio=self.disable_audio,
+            overclock=self.overclock,
+            emulation_speed=self.emulation_speed,
+            save_replays=self.save_replays,
+            replay_dir=self.replay_dir,
+            user_json_path=self.user_json_path and os.path.realpath(self.user_json_path),
+            log_level=self.log_level,
+            log_types=self.log_types,
+            infinite_time=self.infinite_time,
+            use_exi_inputs=self.use_exi_inputs,
+            enable_ffw=self.enable_ffw,
+            dump_config=self.dump_config and dataclasses.asdict(self.dump_config),
+        )
+        encoded = json.dumps(settings, sort_keys=True, default=str).encode()
+        return hashlib.sha256(encoded).hexdigest()[:16]
+
+    def _setup_home_from_template(self, source_home: Optional[str]):
+        """Materialize the home directory from the template for this configuration,
+        building the template first if it doesn't exist yet"""
+        template = os.path.join(_TEMPLATE_ROOT, self._template_key(source_home))
+        home_dir = self.dolphin_home_path
+        if not os.path.isdir(template):
+            os.makedirs(_TEMPLATE_ROOT, exist_ok=True)
+            staging = tempfile.mkdtemp(prefix="building_", dir=_TEMPLATE_ROOT)
+            try:
+                self.dolphin_home_path = os.path.join(staging, "User")
+                if source_home:
+                    _copytree_safe(source_home, self.dolphin_home_path)
+                self._setup_home_directory()
+                # Publish atomically. If another process got there first, use theirs.
+                try:
+                    os.rename(self.dolphin_home_path, template)
+                except OSError:
+                    if not os.path.isdir(template):
+                        raise
+            finally:
+                self.dolphin_home_path = home_dir
+                shutil.rmtree(staging, ignore_errors=True)
+
+        _materialize_home(template, home_dir)
+        self.template_home_path = template
+
+        # The only per-instance setting in the template is the port
+        dolphin_ini_path = os.path.join(self._get_dolphin_config_path(), "Dolphin.ini")
+        config = configparser.ConfigParser()
+        config.read(dolphin_ini_path)
+        if self.is_mainline:
+            config.set("Slippi", 'SpectatorLocalPort', str(self.slippi_port))
+        else:
+            config.set("Core", 'SlippiSpectatorLocalPort', str(self.slippi_port))
+        with open(dolphin_ini_path, 'w') as dolphinfile:
+            config.write(dolphinfile)
+
     def _setup_dolphin_ini(self):
         # Setup some dolphin config options
         config_path = self._get_dolphin_config_path()
@@ -768,45 +1535,159 @@ class Console:
         with open(dolphin_config_path, 'w') as dolphinfile:
             config.write(dolphinfile)
 
-    def step(self) -> Optional[GameState]:
+    def setup_dolphin_hotkeys(self, load_buttons: dict[int, str], save_buttons: dict[int, str]) -> str:
+        """Bind dolphin's save state hotkeys to buttons of the hotkey pipe
+
+        Args:
+            load_buttons (dict of int to str): Pipe button that loads each save state slot
+            save_buttons (dict of int to str): Pipe button that saves each save state slot
+
+        Returns:
+            The path of the hotkey pipe
+        """
+        pipe_path = self._get_pipe_path("slippihotkeys")
+        if platform.system() != "Windows" and not os.path.exists(pipe_path):
+            os.mkfifo(pipe_path)
+
+        hotkeys_config_path = os.path.join(self._get_dolphin_config_path(), "Hotkeys.ini")
+        config = configparser.ConfigParser()
+        # Keys look like "Load State/Load State Slot 1", so keep their case
+        config.optionxform = str
+        config.read(hotkeys_config_path)
+        if not config.has_section("Hotkeys"):
+            config.add_section("Hotkeys")
+        config.set("Hotkeys", "Device", "Pipe/0/slippihotkeys")
+        for slot, button in load_buttons.items():
+            config.set("Hotkeys", f"Load State/Load State Slot {slot}", f"Button {button}")
+        for slot, button in save_buttons.items():
+            config.set("Hotkeys", f"Save State/Save State Slot {slot}", f"Button {button}")
+        with open(hotkeys_config_path, "w") as f:
+            config.write(f)
+        return pipe_path
+
+    def install_state(self, path: str, slot: int):
+        """Copy a prepared dolphin save state into one of the save state slots
+
+        Args:
+            path (str): The save state file, as made by dolphin's "Save State"
+            slot (int): Slot to put it in, 1-10
+        """
+        states_path = os.path.join(self._get_dolphin_home_path(), "StateSaves")
+        os.makedirs(states_path, exist_ok=True)
+        # Replace rather than overwrite, so a running dolphin never sees a half written state
+        fd, tmp_path = tempfile.mkstemp(dir=states_path)
+        os.close(fd)
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, os.path.join(states_path, f"GALE01.s{slot:02d}"))
+
+    def step(self, actions: Optional[dict] = None) -> Optional[GameState]:
         """ 'step' to the next state of the game and flushes all controllers
 
+        Args:
+            actions (dict of int to controller.ControllerState): Inputs to set on the
+                controller in each port before flushing. Ports that are left out
+                keep whatever was pressed on them.
+
         Returns:
             GameState object that represents new current state of the game.
         """
         self.processingtime = time.time() - self._frametimestamp
 
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start_frame()
+            timestamp = time.perf_counter_ns()
+
+        if actions:
+            self._apply_actions(actions)
+
         # Flush the controllers
-        for controller in self.controllers:
-            controller.flush()
+        self._flush_controllers()
+
+        if self.lockstep_stats is not None:
+            sent_at = time.perf_counter_ns()
+
+        if profiler is not None:
+            now = time.perf_counter_ns()
+            profiler.add(Phase.FLUSH, now - timestamp)
+
+        if self._decode_in_worker:
+            while True:
+                received = self._slippstream.dispatch_decoded(
+                    self._polling_mode, timeout=self._polling_timeout, latest_only=self._latest_only)
+                if received is None:
+                    if profiler is not None:
+                        profiler.end_frame(None)
+                    return None
+                state, gamestate, skipped, rollbacks = received
+                if rollbacks:
+                    self.__worker_rollbacks(rollbacks)
+                if gamestate is not None:
+                    break
+            gamestate = self.__apply_worker_state(state, gamestate, skipped)
+            if self.history is not None:
+                self.history.append(gamestate)
+            if self.projectile_tracker is not None:
+                self.projectile_tracker.update(gamestate.frame, items_from_projectiles(gamestate.projectiles))
+            if profiler is not None:
+                profiler.end_frame(gamestate.frame)
+            if self.lockstep_stats is not None:
+                self.lockstep_stats.rtt.record(time.perf_counter_ns() - sent_at)
+                self._check_lockstep(gamestate)
+            self._frametimestamp = time.time()
+            return gamestate
 
         if self._temp_gamestate is None:
-            self._temp_gamestate = GameState()
+            self._temp_gamestate = self.__new_gamestate()
             self._events_this_frame = []
 
+        if self._latest_only:
+            self.__skip_to_latest_frame()
+
         frame_ended = False
         while not frame_ended:
-            message = self._slippstream.dispatch(
-                self._polling_mode, timeout=self._polling_timeout)
+            if self._pending_messages:
+                message = self._pending_messages.popleft()
+            else:
+                message = self._slippstream.dispatch(
+                    self._polling_mode, timeout=self._polling_timeout)
             if message is None:
+                if profiler is not None:
+                    profiler.end_frame(None)
                 return None
 
             if message["type"] == "connect_reply":
-                self.connected = True
-                self.nick = message["nick"]
-                self.version = message["version"]
-                self.cursor = message["cursor"]
+                self.__connect_reply(message)
 
             elif message["type"] == "game_event":
                 if len(message["payload"]) > 0:
                     if self.is_dolphin:
-                        frame_ended = self.__handle_slippstream_events(base64.b64decode(message["payload"]), self._temp_gamestate)
+                        if profiler is not None:
+                            timestamp = time.perf_counter_ns()
+                            event_bytes = base64.b64decode(message["payload"])
+                            profiler.add(Phase.DECODE, time.perf_counter_ns() - timestamp)
+                        else:
+                            event_bytes = base64.b64decode(message["payload"])
+                    else:
+                        event_bytes = message["payload"]
+                    if profiler is not None:
+                        timestamp = time.perf_counter_ns()
+                        frame_ended = self.__handle_slippstream_events(event_bytes, self._temp_gamestate)
+                        profiler.add(Phase.PARSE, time.perf_counter_ns() - timestamp)
                     else:
-                        frame_ended = self.__handle_slippstream_events(message["payload"], self._temp_gamestate)
+                        frame_ended = self.__handle_slippstream_events(event_bytes, self._temp_gamestate)
 
             elif message["type"] == "menu_event":
                 if len(message["payload"]) > 0:
-                    self.__handle_slippstream_menu_event(base64.b64decode(message["payload"]), self._temp_gamestate)
+                    if profiler is not None:
+                        timestamp = time.perf_counter_ns()
+                        event_bytes = base64.b64decode(message["payload"])
+                        now = time.perf_counter_ns()
+                        profiler.add(Phase.DECODE, now - timestamp)
+                        self.__handle_slippstream_menu_event(event_bytes, self._temp_gamestate)
+                        profiler.add(Phase.PARSE, time.perf_counter_ns() - now)
+                    else:
+                        self.__handle_slippstream_menu_event(base64.b64decode(message["payload"]), self._temp_gamestate)
                     frame_ended = True
 
             elif self._use_manual_bookends and message["type"] == "frame_end" and self._frame != -10000:
@@ -815,6 +1696,9 @@ class Console:
         gamestate = self._temp_gamestate
         self._temp_gamestate = None
 
+        if profiler is not None:
+            timestamp = time.perf_counter_ns()
+
         self.__fixframeindexing(gamestate)
         self.__fixiasa(gamestate)
 
@@ -827,41 +1711,246 @@ class Console:
         elif self._current_stage is enums.Stage.POKEMON_STADIUM:
             gamestate.stadium_transformation = self._stadium_transformation
 
-        # Insert some metadata into the gamestate
-        gamestate.playedOn = self._slippstream.playedOn
-        gamestate.startAt = self._slippstream.timestamp
-        gamestate.consoleNick = self._slippstream.consoleNick
-        for i, names in self._slippstream.players.items():
-            try:
-                gamestate.players[int(i)+1].nickName = names["names"]["netplay"]
-            except KeyError:
-                pass
-            try:
-                gamestate.players[int(i)+1].connectCode = names["names"]["code"]
-            except KeyError:
-                pass
+        # The metadata is shared, rather than copied into every frame
+        gamestate.info = self.game_info
+
+        if self.history is not None:
+            self.history.append(gamestate)
+        if self.projectile_tracker is not None:
+            self.projectile_tracker.update(gamestate.frame, items_from_events(
+                self._frame_items, self.eventsize[EventType.ITEM_UPDATE.value]))
+
+        if profiler is not None:
+            profiler.add(Phase.FIXUP, time.perf_counter_ns() - timestamp)
+            profiler.end_frame(gamestate.frame)
 
-        for port, player in gamestate.players.items():
-          i = port - 1
-          if i in self._display_names:
-            player.displayName = self._display_names[i]
-          if i in self._connect_codes:
-            player.connectCode = self._connect_codes[i]
+        if self.lockstep_stats is not None:
+            self.lockstep_stats.rtt.record(time.perf_counter_ns() - sent_at)
+            self._check_lockstep(gamestate)
 
         # Start the processing timer now that we're done reading messages
         self._frametimestamp = time.time()
         return gamestate
 
+    def _flush_controllers(self):
+        """Flush the controllers, and the flush hooks along with them"""
+        for controller in self.controllers:
+            controller.flush()
+        for hook in self._flush_hooks:
+            hook()
+
+    def _apply_actions(self, actions: dict):
+        by_port = {controller.port: controller for controller in self.controllers}
+        for port, state in actions.items():
+            if port not in by_port:
+                raise ValueError(f"No controller connected in port {port}")
+            by_port[port].set_state(state)
+
+    def _check_lockstep(self, gamestate: GameState):
+        """Count dropped and repeated frames against the frame we expected"""
+        stats = self.lockstep_stats
+        stats.frames += 1
+        if gamestate.menu_state not in [enums.Menu.IN_GAME, enums.Menu.SUDDEN_DEATH]:
+            self._lockstep_expected = None
+            return
+        expected = self._lockstep_expected
+        if expected is None:
+            self._lockstep_expected = gamestate.frame + 1
+            stats.resyncs += 1
+            return
+        self._lockstep_expected = max(gamestate.frame + 1, expected)
+        if gamestate.frame == expected:
+            return
+        if gamestate.frame > expected:
+            stats.dropped += gamestate.frame - expected
+            message = f"Dropped {gamestate.frame - expected} frame(s): expected {expected}, got {gamestate.frame}"
+        else:
+            stats.duplicated += 1
+            message = f"Repeated frame: expected {expected}, got {gamestate.frame}"
+        if self._lockstep_strict:
+            raise FrameDesync(message)
+        logging.warning(message)
+
+    def __apply_worker_state(self, state: dict, gamestate: GameState, skipped: int) -> GameState:
+        """Take on the state of the Console decoding in the worker process"""
+        games_started = self.games_started
+        for name, value in state.items():
+            setattr(self, name, value)
+        if self.games_started != games_started:
+            # Same as on GAME_START, the game needs input for its first frame
+            for controller in self.controllers:
+                controller.release_all()
+            self._flush_controllers()
+            if self.history is not None:
+                self.history.clear()
+            if self.projectile_tracker is not None:
+                self.projectile_tracker.clear()
+        if skipped:
+            self.frames_dropped += skipped
+            if self.profiler is not None:
+                self.profiler.increment("frames_dropped", skipped)
+        return gamestate
+
+    def __worker_rollbacks(self, count: int):
+        """Account for rollback frames the worker process skipped, as if they were skipped here"""
+        if self.profiler is not None:
+            self.profiler.increment("rollback_frames_skipped", count)
+        if self.lockstep_stats is not None:
+            self.lockstep_stats.rollbacks += count
+        # The game waits for input on them too
+        if self.blocking_input:
+            for _ in range(count):
+                self._flush_controllers()
+
+    def __connect_reply(self, message: dict):
+        self.connected = True
+        self.nick = message["nick"]
+        self.version = message["version"]
+        self.cursor = message["cursor"]
+
+    def __skip_to_latest_frame(self):
+        """Read everything buffered in the stream, and drop all but the newest complete frame
+
+        Frames are found by walking the event headers. The dropped frames only
+        update what's carried from one frame to the next.
+        """
+        pending = self._pending_messages
+        while (message := self._slippstream.dispatch(True)) is not None:
+            pending.append(message)
+
+        # Where each frame ends, and whether step() would return it
+        payloads = []
+        ends = []
+        last_frame = self._frame
+        for index, message in enumerate(pending):
+            event_bytes = b""
+            if message["type"] == "menu_event":
+                ends.append((index, True))
+            elif message["type"] == "game_event" and message["payload"]:
+                event_bytes = base64.b64decode(message["payload"])
+                game_started, frame = self.__scan_events(event_bytes)
+                if game_started:
+                    last_frame = -10000
+                if frame is not None:
+                    if self._is_state_jump(last_frame, frame):
+                        last_frame = -10000
+                    returned = frame > last_frame or not self.skip_rollback_frames
+                    if returned:
+                        last_frame = frame
+                    ends.append((index, returned))
+            payloads.append(event_bytes)
+
+        returned = [index for index, is_returned in ends if is_returned]
+        if not returned:
+            return
+        # The newest frame starts right after the frame before it ends
+        start = max((index for index, _ in ends if index < returned[-1]), default=-1) + 1
+        if start == 0:
+            return
+
+        if not self._lazy:
+            self._frame_actions = {port: player.action.value
+                                   for port, player in self._temp_gamestate.players.items()}
+        self._temp_gamestate = self.__new_gamestate()
+        self._events_this_frame = []
+        prev_actions = self._prev_actions
+        for i in range(start):
+            message = pending.popleft()
+            if message["type"] == "connect_reply":
+                self.__connect_reply(message)
+            elif payloads[i]:
+                self.__skim_events(payloads[i])
+
+        # Just enough of the last dropped frame for the moonwalk warning
+        if self._prev_actions is not prev_actions:
+            self._prev_gamestate = GameState()
+            for port, action in self._prev_actions.items():
+                playerstate = self._prev_gamestate.players[port] = PlayerState()
+                try:
+                    playerstate.action = enums.Action(action)
+                except ValueError:
+                    playerstate.action = gamestate_lib.UnknownAnimation(action)
+
+        dropped = len(returned) - 1
+        self.frames_dropped += dropped
+        if self.profiler is not None:
+            self.profiler.increment("frames_dropped", dropped)
+
+    def __scan_events(self, event_bytes: bytes) -> tuple[bool, Optional[int]]:
+        """Whether events start a game, and the frame they end, if any, without decoding them"""
+        game_started = False
+        while len(event_bytes) > 0:
+            command_byte = event_bytes[0]
+            if command_byte == EventType.PAYLOADS.value:
+                payload_size = event_bytes[1]
+                for cursor in range(0x2, payload_size, 3):
+                    self.eventsize[event_bytes[cursor]] = \
+                        int.from_bytes(event_bytes[cursor + 0x1:cursor + 0x3], "big") + 1
+                event_bytes = event_bytes[payload_size + 1:]
+                continue
+            if command_byte == EventType.GAME_START.value:
+                game_started = True
+            elif command_byte == EventType.FRAME_BOOKEND.value:
+                return game_started, int(np.ndarray((1,), ">i", event_bytes, 0x1)[0])
+            elif command_byte == EventType.MENU_EVENT.value or self.eventsize[command_byte] == 0:
+                break
+            event_bytes = event_bytes[self.eventsize[command_byte]:]
+        return game_started, None
+
+    def __skim_events(self, event_bytes: bytes):
+        """Update the state carried across frames from the events of a dropped frame"""
+        while len(event_bytes) > 0:
+            command_byte = event_bytes[0]
+            if command_byte == EventType.PAYLOADS.value:
+                # Already read by __scan_events
+                event_bytes = event_bytes[event_bytes[1] + 1:]
+                continue
+            event_size = self.eventsize[command_byte]
+            if command_byte == EventType.GAME_START.value:
+                self.__game_start(self._temp_gamestate, event_bytes)
+                for controller in self.controllers:
+                    controller.release_all()
+                self._flush_controllers()
+            elif command_byte == EventType.GAME_END.value:
+                self.__game_end(event_bytes)
+            elif command_byte == EventType.POST_FRAME.value:
+                # Nana's actions aren't compared across frames
+                if event_bytes[0x6] != 1:
+                    self._frame_actions[event_bytes[0x5] + 1] = int.from_bytes(event_bytes[0x8:0xA], "big")
+            elif command_byte == EventType.FRAME_BOOKEND.value:
+                self._prev_actions, self._frame_actions = self._frame_actions, {}
+                frame = int(np.ndarray((1,), ">i", event_bytes, 0x1)[0])
+                if self._is_state_jump(self._frame, frame):
+                    self.reset_state_tracking()
+                if frame > self._frame or not self.skip_rollback_frames:
+                    self._frame = frame
+            elif command_byte == EventType.FOD_INFO.value:
+                self.__fod_platforms(self._temp_gamestate, event_bytes)
+            elif command_byte == EventType.DL_INFO.value:
+                self.__whispy_blow(self._temp_gamestate, event_bytes)
+            elif command_byte == EventType.PS_INFO.value:
+                self.__stadium_transformation(self._temp_gamestate, event_bytes)
+            elif command_byte == EventType.MENU_EVENT.value or event_size == 0:
+                return
+            event_bytes = event_bytes[event_size:]
+
     def __handle_slippstream_events(self, event_bytes: bytes, gamestate: GameState):
         """ Handle a series of events, provided sequentially in a byte array """
         gamestate.menu_state = enums.Menu.IN_GAME
         while len(event_bytes) > 0:
             command_byte = event_bytes[0]
 
+            # Events nobody asked for are skipped over without decoding them
+            if command_byte in self._skipped_events:
+                event_bytes = event_bytes[self.eventsize[command_byte]:]
+                continue
+
             try:
                 event_type = EventType(command_byte)
             except ValueError:
                 logging.error("Got unknown event type: %s", command_byte)
+                if self.profiler is not None:
+                    self.profiler.increment("unknown_events")
                 if self.debug:
                     import ipdb; ipdb.set_trace()
 
@@ -904,9 +1993,10 @@ class Console:
                 #   Just give it empty input. Characters are not actionable anyway.
                 for controller in self.controllers:
                     controller.release_all()
-                    controller.flush()
+                self._flush_controllers()
 
             elif event_type == EventType.GAME_END:
+                self.__game_end(event_bytes)
                 return self._use_manual_bookends
 
             elif event_type == EventType.FRAME_START:
@@ -929,15 +2019,23 @@ class Console:
                 if len(event_bytes) > event_size:
                     logging.warning("Unprocessed data left after frame bookend.")
 
+                if self._is_state_jump(self._frame, gamestate.frame):
+                    self.reset_state_tracking()
+
                 # If this is an old frame, then don't return it.
                 if gamestate.frame <= self._frame and self.skip_rollback_frames:
+                    if self.profiler is not None:
+                        self.profiler.increment("rollback_frames_skipped")
+                    if self.lockstep_stats is not None:
+                        self.lockstep_stats.rollbacks += 1
                     # In blocking mode we still need to flush the controllers
                     # on rollback frames, otherwise the game will hang.
                     if self.blocking_input:
-                        for controller in self.controllers:
-                            controller.flush()
+                        self._flush_controllers()
+                    if self._on_rollback_frame is not None:
+                        self._on_rollback_frame()
 
-                    self._temp_gamestate = GameState()
+                    self._temp_gamestate = self.__new_gamestate()
                     self._events_this_frame = []
                     return False
                 self._frame = gamestate.frame
@@ -966,6 +2064,11 @@ class Console:
     def __game_start(self, gamestate: GameState, event_bytes: bytes):
         del gamestate  # unused
         self._frame = -10000
+        self._lockstep_expected = None
+        self.games_started += 1
+        self.game_end_method = None
+        self.lras_initiator = None
+        self.placements = None
         major = np.ndarray((1,), ">B", event_bytes, 0x1)[0]
         minor = np.ndarray((1,), ">B", event_bytes, 0x2)[0]
         version_num = np.ndarray((1,), ">B", event_bytes, 0x3)[0]
@@ -974,22 +2077,25 @@ class Console:
         self._use_manual_bookends = self._allow_old_version and major < 3
         if major < 3 and not self._allow_old_version:
             raise SlippiVersionTooLow(self.slp_version)
+        if self.projectile_tracker is not None and self.slp_version_tuple < (3, 6, 0):
+            # Item spawn IDs were added in 3.6.0
+            raise SlippiVersionTooLow(self.slp_version)
         try:
             self._current_stage = enums.to_internal_stage(
                 np.ndarray((1,), ">H", event_bytes, 0x13)[0])
         except ValueError:
             self._current_stage = enums.Stage.NO_STAGE
 
-        if self.slp_version_tuple >= (3, 18, 0):
-            if self._current_stage is enums.Stage.FOUNTAIN_OF_DREAMS:
-                self._fod_platforms = gamestate_lib.FoDPlatforms()
-            elif self._current_stage is enums.Stage.DREAMLAND:
-                self._whispy = gamestate_lib.WhispyBlowDirection.NONE
-            elif self._current_stage is enums.Stage.POKEMON_STADIUM:
-                self._stadium_transformation = gamestate_lib.StadiumTransformation()
+        self._reset_stage_trackers()
 
         self._is_teams = not (np.ndarray((1,), ">H", event_bytes, 0xD)[0] == 0)
 
+        # Rebuilt from what follows when it's next needed
+        self._game_info = None
+        if self.history is not None:
+            self.history.clear()
+        if self.projectile_tracker is not None:
+            self.projectile_tracker.clear()
         for i in range(4):
             self._costumes[i] = np.ndarray((1,), ">B", event_bytes, 0x68 + (0x24 * i))[0]
 
@@ -1015,12 +2121,97 @@ class Console:
                 connect_code = read_shift_jis(event_bytes, 0x221 + 0xA * i)
                 self._connect_codes[i] = connect_code.replace(shift_jis_hash, '#')
 
+    def __game_end(self, event_bytes: bytes):
+        try:
+            self.game_end_method = enums.GameEndMethod(event_bytes[0x1])
+        except ValueError:
+            self.game_end_method = enums.GameEndMethod.UNRESOLVED
+        if self.slp_version_tuple is None or self.slp_version_tuple < (2, 0, 0):
+            return
+        initiator = np.ndarray((1,), ">b", event_bytes, 0x2)[0]
+        self.lras_initiator = int(initiator) + 1 if initiator >= 0 else None
+        if self.slp_version_tuple >= (3, 13, 0):
+            self.placements = {}
+            for i in range(4):
+                placement = np.ndarray((1,), ">b", event_bytes, 0x3 + i)[0]
+                if placement >= 0:
+                    self.placements[i + 1] = int(placement)
+
+    def _reset_stage_trackers(self):
+        """Start tracking the current stage's hazards from scratch"""
+        if self.slp_version_tuple is None or self.slp_version_tuple < (3, 18, 0):
+            return
+        if self._current_stage is enums.Stage.FOUNTAIN_OF_DREAMS:
+            self._fod_platforms = gamestate_lib.FoDPlatforms()
+        elif self._current_stage is enums.Stage.DREAMLAND:
+            self._whispy = gamestate_lib.WhispyBlowDirection.NONE
+        elif self._current_stage is enums.Stage.POKEMON_STADIUM:
+            self._stadium_transformation = gamestate_lib.StadiumTransformation()
+
+    def reset_state_tracking(self):
+        """Forget everything carried over from previous frames
+
+        Call this when the game jumps to a different point in time, such as after
+        loading a save state. Otherwise the earlier frame numbers that follow would
+        be dropped as rollback frames, and stage hazards would be tracked wrong.
+        """
+        self._frame = -10000
+        self._prev_gamestate = GameState()
+        self._prev_actions = {}
+        self._frame_actions = {}
+        self._lockstep_expected = None
+        self._state_load_pending = False
+        self._reset_stage_trackers()
+
+    def expect_state_load(self):
+        """Get ready for the game to jump to a save state some frames from now
+
+        The frames of the old timeline keep coming until dolphin actually loads
+        the state, so nothing is reset yet. The first frame whose number isn't
+        one after the last frame's is taken to be the loaded state's, and frame
+        tracking is reset there (see reset_state_tracking).
+        """
+        self._state_load_pending = True
+
+    def _is_state_jump(self, last_frame: int, frame: int) -> bool:
+        """Whether going from last_frame to frame is a jump to another point in time, not a rollback"""
+        if last_frame == -10000 or not (self._state_load_pending or self._save_state_hotkeys):
+            return False
+        if frame < last_frame - _MAX_ROLLBACK_FRAMES:
+            return True
+        return self._state_load_pending and frame != last_frame + 1
+
+    def __new_gamestate(self) -> GameState:
+        self._frame_items = []
+        if not self._lazy:
+            return GameState()
+        gamestate = LazyGameState()
+        gamestate._decoders = self._lazy_game_decoders
+        gamestate._items = []
+        gamestate._slp_version = self.slp_version_tuple
+        return gamestate
+
+    def __new_lazy_player(self, controller_port: int) -> LazyPlayerState:
+        playerstate = LazyPlayerState.__new__(LazyPlayerState)
+        playerstate._decoders = self._lazy_player_decoders
+        playerstate._pre = None
+        playerstate._post = None
+        playerstate._stage = self._current_stage
+        playerstate._prev_action = None
+        playerstate.nana = None
+        playerstate.info = self.game_info.players[controller_port-1]
+        return playerstate
+
     def __pre_frame(self, gamestate: GameState, event_bytes):
         gamestate.frame = np.ndarray((1,), ">i", event_bytes, 0x1)[0]
 
         # Grab the physical controller state and put that into the controller state
         controller_port = np.ndarray((1,), ">B", event_bytes, 0x5)[0] + 1
 
+        if self._lazy:
+            self.__pre_frame_lazy(gamestate, controller_port, event_bytes)
+            return
+
         if controller_port not in gamestate.players:
             gamestate.players[controller_port] = PlayerState()
         playerstate = gamestate.players[controller_port]
@@ -1030,60 +2221,26 @@ class Console:
             playerstate.nana = PlayerState()
             playerstate = playerstate.nana
 
-        playerstate.costume = self._costumes[controller_port-1]
-        playerstate.cpu_level = self._cpu_level[controller_port-1]
-        playerstate.team_id = self._team_id[controller_port-1]
+        playerstate.info = self.game_info.players[controller_port-1]
+
+        if "controller" in self._field_groups:
+            _decode_controller(playerstate, event_bytes)
 
-        controller_state = playerstate.controller_state
+        if self._use_manual_bookends:
+            self._frame = gamestate.frame
 
-        main_x = (np.ndarray((1,), ">f", event_bytes, 0x19)[0] / 2) + 0.5
-        main_y = (np.ndarray((1,), ">f", event_bytes, 0x1D)[0] / 2) + 0.5
-        controller_state.main_stick = (main_x, main_y)
+    def __pre_frame_lazy(self, gamestate: GameState, controller_port: int, event_bytes: bytes):
+        playerstate = gamestate.players.get(controller_port)
+        if playerstate is None:
+            playerstate = gamestate.players[controller_port] = self.__new_lazy_player(controller_port)
 
-        c_x = (np.ndarray((1,), ">f", event_bytes, 0x21)[0] / 2) + 0.5
-        c_y = (np.ndarray((1,), ">f", event_bytes, 0x25)[0] / 2) + 0.5
-        controller_state.c_stick = (c_x, c_y)
+        # Is this Nana?
+        if event_bytes[0x6] == 1:
+            playerstate.nana = self.__new_lazy_player(controller_port)
+            playerstate = playerstate.nana
 
-        raw_main_x = 0  # Added in 1.2.0
-        raw_main_y = 0  # Added in 3.15.0
-        try:
-            raw_main_x = int(np.ndarray((1,), ">b", event_bytes, 0x3B)[0])
-        except TypeError:
-            pass
-        try:
-            raw_main_y = int(np.ndarray((1,), ">b", event_bytes, 0x40)[0])
-        except TypeError:
-            pass
-        controller_state.raw_main_stick = (raw_main_x, raw_main_y)
-
-        # The game interprets both shoulders together, so the processed value will always be the same
-        trigger = (np.ndarray((1,), ">f", event_bytes, 0x29)[0])
-        controller_state.l_shoulder = trigger
-        controller_state.r_shoulder = trigger
-
-        def parse_button_bits(button: dict, bits: int) -> int:
-            button[enums.Button.BUTTON_A] = bool(bits & 0x0100)
-            button[enums.Button.BUTTON_B] = bool(bits & 0x0200)
-            button[enums.Button.BUTTON_X] = bool(bits & 0x0400)
-            button[enums.Button.BUTTON_Y] = bool(bits & 0x0800)
-            button[enums.Button.BUTTON_START] = bool(bits & 0x1000)
-            button[enums.Button.BUTTON_Z] = bool(bits & 0x0010)
-            button[enums.Button.BUTTON_R] = bool(bits & 0x0020)
-            button[enums.Button.BUTTON_L] = bool(bits & 0x0040)
-            button[enums.Button.BUTTON_D_LEFT] = bool(bits & 0x0001)
-            button[enums.Button.BUTTON_D_RIGHT] = bool(bits & 0x0002)
-            button[enums.Button.BUTTON_D_DOWN] = bool(bits & 0x0004)
-            button[enums.Button.BUTTON_D_UP] = bool(bits & 0x0008)
-
-        # physical buttons
-        parse_button_bits(
-            controller_state.button,
-            int(np.ndarray((1,), ">H", event_bytes, 0x31)[0]))
-
-        # processed buttons
-        button_bits = int(np.ndarray((1,), ">I", event_bytes, 0x2D)[0])
-        parse_button_bits(controller_state.processed_button, button_bits)
-        # there are a few more things in the processed buttons
+        # Keep only this event, not whatever follows it in the buffer
+        playerstate._pre = event_bytes[:self.eventsize[EventType.PRE_FRAME.value]]
 
         if self._use_manual_bookends:
             self._frame = gamestate.frame
@@ -1094,88 +2251,22 @@ class Console:
         assert gamestate.frame == np.ndarray((1,), ">i", event_bytes, 0x1)[0]
         controller_port = np.ndarray((1,), ">B", event_bytes, 0x5)[0] + 1
 
+        if self._lazy:
+            self.__post_frame_lazy(gamestate, controller_port, event_bytes)
+            return
+
         if controller_port not in gamestate.players:
             gamestate.players[controller_port] = PlayerState()
         playerstate = gamestate.players[controller_port]
 
         # Is this Nana?
         if np.ndarray((1,), ">B", event_bytes, 0x6)[0] == 1:
-            playerstate.nana = PlayerState()
+            # Keep the inputs from the pre-frame event
+            if playerstate.nana is None:
+                playerstate.nana = PlayerState()
             playerstate = playerstate.nana
 
-        playerstate.position.x = np.ndarray((1,), ">f", event_bytes, 0xa)[0]
-        playerstate.position.y = np.ndarray((1,), ">f", event_bytes, 0xe)[0]
-
-        playerstate.character = enums.Character(np.ndarray((1,), ">B", event_bytes, 0x7)[0])
-        action_value = np.ndarray((1,), ">H", event_bytes, 0x8)[0]
-        try:
-            playerstate.action = enums.Action(action_value)
-        except ValueError:
-            playerstate.action = gamestate_lib.UnknownAnimation(action_value)
-
-        # Melee stores this in a float for no good reason. So we have to convert
-        playerstate.facing = np.ndarray((1,), ">f", event_bytes, 0x12)[0] > 0
-
-        playerstate.percent = np.ndarray((1,), ">f", event_bytes, 0x16)[0]
-        playerstate.shield_strength = np.ndarray((1,), ">f", event_bytes, 0x1A)[0]
-        playerstate.stock = np.ndarray((1,), ">B", event_bytes, 0x21)[0]
-        playerstate.action_frame = int(np.ndarray((1,), ">f", event_bytes, 0x22)[0])
-
-        try:
-            sb4 = int(np.ndarray((1,), ">B", event_bytes, 0x29)[0])
-            playerstate.is_powershield = (sb4 & 0x20) == 0x20
-        except TypeError:
-            playerstate.is_powershield = False
-
-        try:
-            playerstate.hitstun_frames_left = int(np.ndarray((1,), ">f", event_bytes, 0x2B)[0])
-        except TypeError:
-            playerstate.hitstun_frames_left = 0
-        except ValueError:
-            playerstate.hitstun_frames_left = 0
-        try:
-            playerstate.on_ground = not bool(np.ndarray((1,), ">B", event_bytes, 0x2F)[0])
-        except TypeError:
-            playerstate.on_ground = True
-        try:
-            playerstate.jumps_left = np.ndarray((1,), ">B", event_bytes, 0x32)[0]
-        except TypeError:
-            playerstate.jumps_left = 1
-
-        try:
-            playerstate.invulnerable = int(np.ndarray((1,), ">B", event_bytes, 0x34)[0]) != 0
-        except TypeError:
-            playerstate.invulnerable = False
-
-        try:
-            playerstate.speed_air_x_self = np.ndarray((1,), ">f", event_bytes, 0x35)[0]
-        except TypeError:
-            playerstate.speed_air_x_self = 0
-
-        try:
-            playerstate.speed_y_self = np.ndarray((1,), ">f", event_bytes, 0x39)[0]
-        except TypeError:
-            playerstate.speed_y_self = 0
-
-        try:
-            playerstate.speed_x_attack = np.ndarray((1,), ">f", event_bytes, 0x3D)[0]
-        except TypeError:
-            playerstate.speed_x_attack = 0
-
-        try:
-            playerstate.speed_y_attack = np.ndarray((1,), ">f", event_bytes, 0x41)[0]
-        except TypeError:
-            playerstate.speed_y_attack = 0
-
-        try:
-            playerstate.speed_ground_x_self = np.ndarray((1,), ">f", event_bytes, 0x45)[0]
-        except TypeError:
-            playerstate.speed_ground_x_self = 0
-
-        try:
-            playerstate.hitlag_left = int(np.ndarray((1,), ">f", event_bytes, 0x49)[0])
-        except TypeError:
-            playerstate.hitlag_left = 0
+        _decode_core(playerstate, event_bytes)
 
         # The pre-warning occurs when we first start a dash dance.
         if controller_port in self._prev_gamestate.players:
@@ -1187,138 +2278,67 @@ class Console:
         if playerstate.action != Action.DASHING:
             playerstate.moonwalkwarning = False
 
-        # "off_stage" helper
-        try:
-            if (abs(playerstate.position.x) > stages.EDGE_GROUND_POSITION[gamestate.stage] or \
-                    playerstate.position.y < -6) and not playerstate.on_ground:
-                playerstate.off_stage = True
-            else:
-                playerstate.off_stage = False
-        except KeyError:
-            playerstate.off_stage = False
+        for decode in self._post_frame_decoders:
+            decode(playerstate, event_bytes, gamestate.stage)
 
-        # ECB top edge, x
-        ecb_top_x = 0
-        ecb_top_y = 0
-        try:
-            ecb_top_x = np.ndarray((1,), ">f", event_bytes, 0x4D)[0]
-        except TypeError:
-            ecb_top_x = 0
-        # ECB Top edge, y
-        try:
-            ecb_top_y = np.ndarray((1,), ">f", event_bytes, 0x51)[0]
-        except TypeError:
-            ecb_top_y = 0
-        playerstate.ecb.top.x = ecb_top_x
-        playerstate.ecb.top.y = ecb_top_y
-        playerstate.ecb_top = (ecb_top_x, ecb_top_y)
+        if self._use_manual_bookends:
+            self._frame = gamestate.frame
 
-        # ECB bottom edge, x coord
-        ecb_bot_x = 0
-        ecb_bot_y = 0
-        try:
-            ecb_bot_x = np.ndarray((1,), ">f", event_bytes, 0x55)[0]
-        except TypeError:
-            ecb_bot_x = 0
-        # ECB Bottom edge, y coord
-        try:
-            ecb_bot_y = np.ndarray((1,), ">f", event_bytes, 0x59)[0]
-        except TypeError:
-            ecb_bot_y = 0
-        playerstate.ecb.bottom.x = ecb_bot_x
-        playerstate.ecb.bottom.y = ecb_bot_y
-        playerstate.ecb_bottom = (ecb_bot_x, ecb_bot_y)
+    def __post_frame_lazy(self, gamestate: GameState, controller_port: int, event_bytes: bytes):
+        playerstate = gamestate.players.get(controller_port)
+        if playerstate is None:
+            playerstate = gamestate.players[controller_port] = self.__new_lazy_player(controller_port)
 
-        # ECB left edge, x coord
-        ecb_left_x = 0
-        ecb_left_y = 0
-        try:
-            ecb_left_x = np.ndarray((1,), ">f", event_bytes, 0x5D)[0]
-        except TypeError:
-            ecb_left_x = 0
-        # ECB left edge, y coord
-        try:
-            ecb_left_y = np.ndarray((1,), ">f", event_bytes, 0x61)[0]
-        except TypeError:
-            ecb_left_y = 0
-        playerstate.ecb.left.x = ecb_left_x
-        playerstate.ecb.left.y = ecb_left_y
-        playerstate.ecb_left = (ecb_left_x, ecb_left_y)
+        # Is this Nana?
+        if event_bytes[0x6] == 1:
+            if playerstate.nana is None:
+                playerstate.nana = self.__new_lazy_player(controller_port)
+            playerstate = playerstate.nana
+        else:
+            self._frame_actions[controller_port] = int.from_bytes(event_bytes[0x8:0xA], "big")
+
+        playerstate._post = event_bytes[:self.eventsize[EventType.POST_FRAME.value]]
+        playerstate._stage = gamestate.stage
+        playerstate._prev_action = self._prev_actions.get(controller_port)
 
-        # ECB right edge, x coord
-        ecb_right_x = 0
-        ecb_right_y = 0
-        try:
-            ecb_right_x = np.ndarray((1,), ">f", event_bytes, 0x65)[0]
-        except TypeError:
-            ecb_right_x = 0
-        # ECB right edge, y coord
-        try:
-            ecb_right_y = np.ndarray((1,), ">f", event_bytes, 0x69)[0]
-        except TypeError:
-            ecb_right_y = 0
-        playerstate.ecb.right.x = ecb_right_x
-        playerstate.ecb.right.y = ecb_right_y
-        playerstate.ecb_right = (ecb_right_x, ecb_right_y)
         if self._use_manual_bookends:
             self._frame = gamestate.frame
 
     def __frame_bookend(self, gamestate: GameState, event_bytes: bytes):
         self._prev_gamestate = gamestate
+        if self._lazy:
+            self._prev_actions, self._frame_actions = self._frame_actions, {}
+            # Worked out from the players when read, see LazyGameState
+            del gamestate.distance
+            del gamestate.projectiles
+            return
         # Calculate helper distance variable
-        #   This is a bit kludgey.... :/
-        i = 0
-        player_one_x, player_one_y, player_two_x, player_two_y = 0, 0, 0, 0
-        for _, player_state in gamestate.players.items():
-            if i == 0:
-                player_one_x, player_one_y = player_state.position.x, player_state.position.y
-            if i == 1:
-                player_two_x, player_two_y = player_state.position.x, player_state.position.y
-            i += 1
-        xdist = player_one_x - player_two_x
-        ydist = player_one_y - player_two_y
-        gamestate.distance = math.sqrt((xdist**2) + (ydist**2))
+        gamestate.distance = gamestate_lib._player_distance(gamestate.players)
 
     def __item_update(self, gamestate: GameState, event_bytes: bytes):
         assert np.ndarray((1,), ">i", event_bytes, 0x1)[0] == gamestate.frame
 
-        projectile = Projectile()
-        projectile.position.x = np.ndarray((1,), ">f", event_bytes, 0x14)[0]
-        projectile.position.y = np.ndarray((1,), ">f", event_bytes, 0x18)[0]
-        projectile.speed.x = np.ndarray((1,), ">f", event_bytes, 0xc)[0]
-        projectile.speed.y = np.ndarray((1,), ">f", event_bytes, 0x10)[0]
-
-        raw_projectile_type = np.ndarray((1,), ">H", event_bytes, 0x5)[0]
-        try:
-            projectile.type = enums.ProjectileType(raw_projectile_type)
-        except ValueError:
-            projectile.type = gamestate_lib.UnknownProjectileType(raw_projectile_type)
-
-        projectile.expiration_frames = int(np.ndarray((1,), ">f", event_bytes, 0x1E)[0])
-
-        projectile.subtype = np.ndarray((1,), ">B", event_bytes, 0x7)[0]
+        if self.projectile_tracker is not None:
+            self._frame_items.append(event_bytes[:self.eventsize[EventType.ITEM_UPDATE.value]])
+            if "projectiles" not in self._field_groups:
+                return
 
-        # # Ignore exploded Samus bombs. They are subtype 3
-        # if projectile.type == enums.ProjectileType.SAMUS_BOMB and projectile.subtype == 3:
-        #     return
-        # # Ignore exploded Samus missles
-        # if projectile.type == enums.ProjectileType.SAMUS_MISSLE and projectile.subtype in [2, 3]:
-        #     return
-        # # Ignore Samus charge beam while charging (not firing)
-        # if projectile.type == enums.ProjectileType.SAMUS_CHARGE_BEAM and projectile.subtype == 0:
-        #     return
-
-        projectile.spawn_id = np.ndarray((1,), ">I", event_bytes, 0x22)[0]
-
-        if self.slp_version_tuple >= (3, 6, 0):
-            # 0-3 for the player that owns the item. -1 when not owned
-            projectile.owner = np.ndarray((1,), ">b", event_bytes, 0x2A)[0] + 1
+        if self._lazy:
+            gamestate._items.append(event_bytes[:self.eventsize[EventType.ITEM_UPDATE.value]])
+            return
 
         if len(gamestate.projectiles) >= 15:
             logging.error("More than 15 projectiles. Something is probably wrong.")
 
         # Add the projectile to the gamestate list
-        gamestate.projectiles.append(projectile)
+        gamestate.projectiles.append(_decode_item(event_bytes, self.slp_version_tuple))
+
+    def __menu_players(self, gamestate: GameState):
+        """All the controller ports are active on the screens that pick players"""
+        for i, info in enumerate(self.game_info.players):
+            # Only the names carry over from the last game
+            gamestate.players[i+1] = PlayerState(info=PlayerInfo(
+                nickName=info.nickName, connectCode=info.connectCode, displayName=info.displayName))
 
     def __handle_slippstream_menu_event(self, event_bytes, gamestate: GameState):
         """ Internal handler for slippstream menu events
@@ -1328,17 +2348,10 @@ class Console:
         scene = np.ndarray((1,), ">H", event_bytes, 0x1)[0]
         if scene == 0x02:
             gamestate.menu_state = enums.Menu.CHARACTER_SELECT
-            # All the controller ports are active on this screen
-            gamestate.players[1] = PlayerState()
-            gamestate.players[2] = PlayerState()
-            gamestate.players[3] = PlayerState()
-            gamestate.players[4] = PlayerState()
+            self.__menu_players(gamestate)
         elif scene in [0x0102, 0x0108]:
             gamestate.menu_state = enums.Menu.STAGE_SELECT
-            gamestate.players[1] = PlayerState()
-            gamestate.players[2] = PlayerState()
-            gamestate.players[3] = PlayerState()
-            gamestate.players[4] = PlayerState()
+            self.__menu_players(gamestate)
 
         elif scene == 0x0202:
             gamestate.menu_state = enums.Menu.IN_GAME
@@ -1346,15 +2359,16 @@ class Console:
             gamestate.menu_state = enums.Menu.MAIN_MENU
         elif scene == 0x0008:
             gamestate.menu_state = enums.Menu.SLIPPI_ONLINE_CSS
-            gamestate.players[1] = PlayerState()
-            gamestate.players[2] = PlayerState()
-            gamestate.players[3] = PlayerState()
-            gamestate.players[4] = PlayerState()
+            self.__menu_players(gamestate)
         elif scene == 0x0000:
             gamestate.menu_state = enums.Menu.PRESS_START
         else:
             gamestate.menu_state = enums.Menu.UNKNOWN_MENU
 
+        if "menu" not in self._field_groups:
+            gamestate.frame = np.ndarray((1,), ">i", event_bytes, 0x39)[0]
+            return
+
         # controller port statuses at CSS
         if gamestate.menu_state in [enums.Menu.CHARACTER_SELECT, enums.Menu.SLIPPI_ONLINE_CSS]:
             gamestate.players[1].controller_status = enums.ControllerStatus(np.ndarray((1,), ">B", event_bytes, 0x25)[0])
@@ -1525,8 +2539,11 @@ class Console:
     def __fixframeindexing(self, gamestate: GameState):
         """ Melee's indexing of action frames is wildly inconsistent.
             Here we adjust all of the frames to be indexed at 1 (so math is easier)"""
+        zero_indices = framedata_lib.load_zero_indices()
         for _, player in gamestate.players.items():
-            if player.action.value in self.zero_indices[player.character.value]:
+            if isinstance(player, LazyPlayerState):
+                continue  # Done when it's decoded
+            if player.action.value in zero_indices[player.character.value]:
                 player.action_frame = player.action_frame + 1
 
     def __fixiasa(self, gamestate: GameState):
@@ -1534,7 +2551,49 @@ class Console:
             So let's just set IASA to False for all non-A attacks.
         """
         for _, player in gamestate.players.items():
+            if isinstance(player, LazyPlayerState):
+                continue  # Done when it's decoded
             # Luckily for us, all the A-attacks are in a contiguous place in the enums!
             #   So we don't need to call them out one by one
             if player.action.value < Action.NEUTRAL_ATTACK_1.value or player.action.value > Action.DAIR.value:
                 player.iasa = False
+
+# Console attributes the worker process keeps up to date for decode_in_worker
+_WORKER_STATE = (
+    "connected", "nick", "version", "cursor", "slp_version", "slp_version_tuple", "games_started",
+    "game_end_method", "lras_initiator", "placements", "_current_stage", "_game_info")
+
+def _run_decoder(stream, connection, shutdown, console_kwargs: dict):
+    """Worker process side of decode_in_worker: step a Console, and send back what it returns
+
+    Gamestates are sent as deltas from the previous one (see serialize), and the
+    console attributes only when they change. Rollback frames that are skipped
+    are reported as soon as they are read, since in blocking input mode the
+    game waits for the controllers to be flushed for them.
+
+    Args:
+        stream (slippstream.SlippstreamWorker): The connected worker, to read messages from
+        connection (multiprocessing.connection.Connection): Where to send the gamestates
+        shutdown (multiprocessing.Event): Set when the worker should stop
+        console_kwargs (dict): Extra arguments for the decoding Console
+    """
+    console = Console(is_dolphin=True, is_remote=True, polling_mode=True, polling_timeout=0.5,
+                      **console_kwargs)
+    console._slippstream.shutdown()
+    console._slippstream = stream
+    console._on_rollback_frame = lambda: connection.send_bytes(DECODED_ROLLBACK)
+    encoder = GameStateEncoder()
+    sent_state = None
+    try:
+        while not shutdown.is_set():
+            gamestate = console.step()
+            if gamestate is None:
+                continue
+            state = pickle.dumps({name: getattr(console, name) for name in _WORKER_STATE},
+                                 protocol=pickle.HIGHEST_PROTOCOL)
+            if state != sent_state:
+                connection.send_bytes(DECODED_STATE + state)
+                sent_state = state
+            connection.send_bytes(DECODED_GAMESTATE + encoder.encode(gamestate))
+    except EnetDisconnected:
+        connection.close()
@@ -4,6 +4,10 @@ import dataclasses
 import platform
 import copy
 import time
+from collections.abc import MutableMapping
+from typing import Iterator, Mapping, Optional, Sequence
+
+import numpy as np
 try:
     import win32file
     import pywintypes
@@ -29,32 +33,83 @@ def fix_analog_trigger(x: float) -> float:
     fudged = raw + 0.1  # Go slightly above the threshold to avoid rounding issues
     return fudged / 255  # Desired input value in [0, 1]
 
-_POSSIBLE_BUTTONS = [
-    enums.Button.BUTTON_A,
-    enums.Button.BUTTON_B,
-    enums.Button.BUTTON_X,
-    enums.Button.BUTTON_Y,
-    enums.Button.BUTTON_Z,
-    enums.Button.BUTTON_L,
-    enums.Button.BUTTON_R,
-    enums.Button.BUTTON_START,
-    enums.Button.BUTTON_D_UP,
-    enums.Button.BUTTON_D_DOWN,
-    enums.Button.BUTTON_D_LEFT,
-    enums.Button.BUTTON_D_RIGHT,
-]
-
-_new_buttons = lambda: {b: False for b in _POSSIBLE_BUTTONS}
-_field = lambda f: dataclasses.field(default_factory=f)
+BUTTON_MASKS = {
+    enums.Button.BUTTON_A: 0x0100,
+    enums.Button.BUTTON_B: 0x0200,
+    enums.Button.BUTTON_X: 0x0400,
+    enums.Button.BUTTON_Y: 0x0800,
+    enums.Button.BUTTON_Z: 0x0010,
+    enums.Button.BUTTON_L: 0x0040,
+    enums.Button.BUTTON_R: 0x0020,
+    enums.Button.BUTTON_START: 0x1000,
+    enums.Button.BUTTON_D_UP: 0x0008,
+    enums.Button.BUTTON_D_DOWN: 0x0004,
+    enums.Button.BUTTON_D_LEFT: 0x0001,
+    enums.Button.BUTTON_D_RIGHT: 0x0002,
+}
+"""Bit of each digital button, in the layout of Slippi's pre-frame button fields"""
+
+_POSSIBLE_BUTTONS = list(BUTTON_MASKS)
+_MASK_ARRAY = np.array(list(BUTTON_MASKS.values()), np.uint32)
+_ALL_BUTTONS = sum(BUTTON_MASKS.values())
+
+def pack_buttons(pressed: Mapping[enums.Button, bool]) -> int:
+    """Turn a dict of button to pressed into a bitmask"""
+    bits = 0
+    for button, is_pressed in pressed.items():
+        if is_pressed:
+            bits |= BUTTON_MASKS[button]
+    return bits
+
+def unpack_buttons(bits) -> np.ndarray:
+    """Turn button bitmasks into booleans, vectorized
+
+    Args:
+        bits (int or np.ndarray): Bitmasks, such as ControllerState.buttons or a
+            whole column of them
+
+    Returns:
+        Boolean array of shape bits.shape + (12,), with the buttons in BUTTON_MASKS order
+    """
+    return (np.asarray(bits)[..., np.newaxis] & _MASK_ARRAY) != 0
+
+class ButtonView(MutableMapping):
+    """A dict of enums.Button to bool that reads and writes a ControllerState bitmask"""
+    __slots__ = ("_state", "_field")
+
+    def __init__(self, state: 'ControllerState', field: str):
+        self._state = state
+        self._field = field
+
+    def __getitem__(self, button: enums.Button) -> bool:
+        return bool(getattr(self._state, self._field) & BUTTON_MASKS[button])
+
+    def __setitem__(self, button: enums.Button, pressed: bool):
+        mask = BUTTON_MASKS[button]
+        bits = getattr(self._state, self._field)
+        setattr(self._state, self._field, bits | mask if pressed else bits & ~mask)
+
+    def __delitem__(self, button: enums.Button):
+        raise TypeError("Buttons can't be removed from a controller")
+
+    def __iter__(self) -> Iterator[enums.Button]:
+        return iter(BUTTON_MASKS)
+
+    def __len__(self) -> int:
+        return len(BUTTON_MASKS)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
 
 @dataclasses.dataclass(slots=True)
 class ControllerState:
     """A snapshot of the state of a virtual controller"""
 
-    #Boolean buttons
-    """(dict of enums.Button to bool): For the each Button as key, tells you if the button is pressed."""
-    button: dict[enums.Button, bool] = _field(_new_buttons)
-    processed_button: dict[enums.Button, bool] = _field(_new_buttons)
+    #Digital buttons, as bitmasks
+    buttons: int = 0
+    """(int): Bitmask of the pressed buttons. See BUTTON_MASKS and unpack_buttons."""
+    processed_buttons: int = 0
+    """(int): Bitmask of the buttons as the game sees them. Has more bits than BUTTON_MASKS covers."""
     #Analog sticks
     """(pair of floats): The main stick's x,y position. Ranges from 0->1, 0.5 is neutral"""
     main_stick: tuple[float, float] = (0.5, 0.5)
@@ -68,6 +123,24 @@ class ControllerState:
     r_shoulder: float = 0
     """(float): R shoulder analog press. Ranges from 0 (not pressed) to 1 (fully pressed)"""
 
+    @property
+    def button(self) -> ButtonView:
+        """(dict of enums.Button to bool): For the each Button as key, tells you if the button is pressed."""
+        return ButtonView(self, "buttons")
+
+    @button.setter
+    def button(self, pressed: Mapping[enums.Button, bool]):
+        self.buttons = pack_buttons(pressed)
+
+    @property
+    def processed_button(self) -> ButtonView:
+        """(dict of enums.Button to bool): The buttons as the game sees them"""
+        return ButtonView(self, "processed_buttons")
+
+    @processed_button.setter
+    def processed_button(self, pressed: Mapping[enums.Button, bool]):
+        self.processed_buttons = pack_buttons(pressed)
+
     def __str__(self):
         string = ""
         for val in self.button:
@@ -79,6 +152,89 @@ class ControllerState:
         string += "R_SHOULDER: " + str(self.r_shoulder) + "\n"
         return string
 
+def _accept_button_kwargs(init):
+    """Let ControllerState(...) still take `button` and `processed_button` dicts
+
+    They used to be the fields, before the buttons were stored as bitmasks.
+    Note that dataclasses.asdict() only has the bitmasks.
+    """
+    def __init__(self, *args, button=None, processed_button=None, **kwargs):
+        init(self, *args, **kwargs)
+        if button is not None:
+            self.buttons = pack_buttons(button)
+        if processed_button is not None:
+            self.processed_buttons = pack_buttons(processed_button)
+    __init__.__doc__ = init.__doc__
+    __init__.__qualname__ = init.__qualname__
+    return __init__
+
+ControllerState.__init__ = _accept_button_kwargs(ControllerState.__init__)
+
+def _compile_state(state: ControllerState, fix_analog_inputs: bool) -> tuple[str, ControllerState]:
+    """The pipe commands that set a controller to `state`, in one string
+
+    Also returns the ControllerState the controller is left in, which has the
+    sticks fixed the same way tilt_analog does.
+    """
+    main_stick = state.main_stick
+    c_stick = state.c_stick
+    l_shoulder, r_shoulder = state.l_shoulder, state.r_shoulder
+    if fix_analog_inputs:
+        main_stick = (fix_analog_stick(main_stick[0]), fix_analog_stick(main_stick[1]))
+        c_stick = (fix_analog_stick(c_stick[0]), fix_analog_stick(c_stick[1]))
+        l_shoulder, r_shoulder = fix_analog_trigger(l_shoulder), fix_analog_trigger(r_shoulder)
+
+    command = ""
+    for button, mask in BUTTON_MASKS.items():
+        command += ("PRESS " if state.buttons & mask else "RELEASE ") + str(button.value) + "\n"
+    command += "SET MAIN " + str(main_stick[0]) + " " + str(main_stick[1]) + "\n"
+    command += "SET C " + str(c_stick[0]) + " " + str(c_stick[1]) + "\n"
+    command += "SET L " + str(l_shoulder) + "\n"
+    command += "SET R " + str(r_shoulder) + "\n"
+
+    result = ControllerState(
+        buttons=state.buttons & _ALL_BUTTONS,
+        main_stick=main_stick,
+        c_stick=c_stick,
+        l_shoulder=state.l_shoulder,
+        r_shoulder=state.r_shoulder,
+    )
+    return command, result
+
+class ActionTable:
+    """A discrete action space, compiled ahead of time into controller pipe commands
+
+    Formatting the commands and fixing the analog values happens once, when the
+    table is made. Controller.apply_action then sets every input of the
+    controller with a single precomputed write.
+
+    Usage:
+        table = melee.ActionTable([neutral, jump, shield, ...])
+        controller = melee.Controller(console, port=1, action_table=table)
+        ...
+        controller.apply_action(2)
+    """
+    def __init__(self, states: Sequence[ControllerState]):
+        """
+        Args:
+            states (list of ControllerState): The actions, each as the complete
+                controller state to hold while it is applied. Sticks and shoulders
+                use the same [0, 1] ranges as tilt_analog and press_shoulder.
+        """
+        self.states = [copy.deepcopy(state) for state in states]
+        """(list of ControllerState): The actions, by index"""
+        self._compiled = {
+            fix: [_compile_state(state, fix) for state in self.states]
+            for fix in (True, False)
+        }
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def command(self, index: int, fix_analog_inputs: bool = True) -> str:
+        """The pipe commands for an action"""
+        return self._compiled[fix_analog_inputs][index][0]
+
 class Controller:
     """Manages virtual controller state and button presses
 
@@ -92,6 +248,7 @@ class Controller:
             port: int,
             type: enums.ControllerType = enums.ControllerType.STANDARD,
             fix_analog_inputs: bool = True,
+            action_table: Optional[ActionTable] = None,
             ):
         """Create a new virtual controller
 
@@ -104,6 +261,7 @@ class Controller:
               that the stick values from Console.step are consistent with the values
               you send as inputs, modulo the deadzone or sticks with magnitude > 80.
               Also adjusts the analog triggers in an analogous way.
+            action_table (ActionTable): Discrete actions for apply_action
         """
         self._is_dolphin = console.is_dolphin
         if self._is_dolphin:
@@ -117,6 +275,8 @@ class Controller:
         self._console = console
         self._type = type
         self._fix_analog_inputs = fix_analog_inputs
+        self.action_table = action_table
+        """(ActionTable): The actions apply_action chooses from"""
 
         # Configure our controller with the console
         self._console.setup_dolphin_controller(port, type)
@@ -307,6 +467,38 @@ class Controller:
         """
         self.tilt_analog(button, (x + 1) / 2, (y + 1) / 2)
 
+    def set_state(self, state: ControllerState):
+        """Set every button, stick and shoulder to match a ControllerState
+
+        Args:
+            state (ControllerState): The inputs to hold. Sticks and shoulders use the
+                same [0, 1] ranges as tilt_analog and press_shoulder.
+        """
+        self._set_compiled(*_compile_state(state, self._fix_analog_inputs))
+
+    def apply_action(self, index: int):
+        """Set the controller to an action of its action table, in one write
+
+        Args:
+            index (int): Which action of `action_table` to apply
+        """
+        if self.action_table is None:
+            raise ValueError("Controller has no action table")
+        self._set_compiled(*self.action_table._compiled[self._fix_analog_inputs][index])
+
+    def _set_compiled(self, command: str, state: ControllerState):
+        self.current.buttons = state.buttons
+        self.current.main_stick = state.main_stick
+        self.current.c_stick = state.c_stick
+        self.current.l_shoulder = state.l_shoulder
+        self.current.r_shoulder = state.r_shoulder
+        if self._is_dolphin:
+            if not self.pipe:
+                return
+            if self.logger:
+                self.logger.log("Buttons Pressed", command, concat=True)
+            self._write(command)
+
     # Left around for compat reasons. Might disappear at any time
     #   left undocumented. Just use release_all()
     def empty_input(self):
@@ -318,18 +510,7 @@ class Controller:
         All buttons are released, all sticks set to 0.5, all shoulders set to 0
         """
         #Set the internal state back to neutral
-        self.current.button[enums.Button.BUTTON_A] = False
-        self.current.button[enums.Button.BUTTON_B] = False
-        self.current.button[enums.Button.BUTTON_X] = False
-        self.current.button[enums.Button.BUTTON_Y] = False
-        self.current.button[enums.Button.BUTTON_Z] = False
-        self.current.button[enums.Button.BUTTON_L] = False
-        self.current.button[enums.Button.BUTTON_R] = False
-        self.current.button[enums.Button.BUTTON_START] = False
-        self.current.button[enums.Button.BUTTON_D_UP] = False
-        self.current.button[enums.Button.BUTTON_D_DOWN] = False
-        self.current.button[enums.Button.BUTTON_D_LEFT] = False
-        self.current.button[enums.Button.BUTTON_D_RIGHT] = False
+        self.current.buttons = 0
         self.current.main_stick = (.5, .5)
         self.current.c_stick = (.5, .5)
         self.current.l_shoulder = 0
@@ -384,3 +565,117 @@ class Controller:
                 if not self.pipe:
                     return
                 self.pipe.flush()
+
+def apply_actions(controllers: Sequence[Controller], indices: Sequence[int]):
+    """Apply one action to each of several controllers, possibly on different consoles
+
+    Args:
+        controllers (list of Controller): Controllers with an action table
+        indices: The action for each controller, such as a numpy array of a batched policy
+    """
+    if len(controllers) != len(indices):
+        raise ValueError("Need exactly one action per controller")
+    for controller, index in zip(controllers, indices):
+        controller.apply_action(int(index))
+
+class SaveStateHotkeys:
+    """Loads and saves dolphin save states by pressing hotkeys through a named pipe
+
+    This is a much faster way to reset an episode than going back through the
+    menus: prepare a save state at the point the episode should start, put it in
+    a slot with Console.install_state, and call load_state at every reset.
+
+    The hotkey pipe is flushed by Console.step along with the controllers, so
+    it works with blocking_input. Only supported on Linux and OSX.
+
+    Usage:
+        hotkeys = melee.SaveStateHotkeys(console)
+        console.install_state("episode_start.sav", slot=1)
+        console.run(...)
+        console.connect()
+        hotkeys.connect()
+        ...
+        hotkeys.load_state(1)
+    """
+    LOAD_BUTTONS = {1: "A", 2: "B", 3: "X", 4: "Y"}
+    """Pipe button bound to loading each save state slot"""
+    SAVE_BUTTONS = {1: "D_UP", 2: "D_DOWN", 3: "D_LEFT", 4: "D_RIGHT"}
+    """Pipe button bound to saving each save state slot"""
+
+    def __init__(self, console: Console, hold_frames: int = 2):
+        """Bind the hotkeys in the console's dolphin config
+
+        Args:
+            console (console.Console): The console to control. Must be set up
+                before dolphin is started.
+            hold_frames (int): How many steps to hold a hotkey down for, so that
+                dolphin's hotkey polling sees it even at high emulation speeds.
+        """
+        if platform.system() == "Windows":
+            raise NotImplementedError("Save state hotkeys are not supported on Windows")
+        self._console = console
+        self.pipe_path = console.setup_dolphin_hotkeys(self.LOAD_BUTTONS, self.SAVE_BUTTONS)
+        self.pipe = None
+        self.hold_frames = hold_frames
+        self._held: Optional[str] = None
+        self._frames_left = 0
+
+    def __del__(self):
+        self.disconnect()
+
+    def connect(self):
+        """Open the hotkey pipe
+
+            Note:
+                Blocks until dolphin has opened the other end
+        """
+        self.pipe = open(self.pipe_path, "w")
+        self._console._flush_hooks.append(self.flush)
+        self._console._save_state_hotkeys = True
+        return True
+
+    def disconnect(self):
+        """Close the hotkey pipe"""
+        if self.pipe:
+            if self.flush in self._console._flush_hooks:
+                self._console._flush_hooks.remove(self.flush)
+            self._console._save_state_hotkeys = False
+            try:
+                self.pipe.close()
+            except BrokenPipeError:
+                pass
+            self.pipe = None
+
+    def _press(self, button: str):
+        if self._held is not None:
+            self.pipe.write(f"RELEASE {self._held}\n")
+        self.pipe.write(f"PRESS {button}\n")
+        self._held = button
+        self._frames_left = self.hold_frames
+
+    def load_state(self, slot: int):
+        """Load the save state in the given slot, starting with the next step
+
+        Dolphin loads it a few frames later, once it has seen the hotkey held.
+        The console resets its frame tracking when the jump shows up in the
+        stream (see Console.expect_state_load), so that the loaded state's
+        earlier frame numbers aren't dropped as rollback frames.
+        """
+        self._press(self.LOAD_BUTTONS[slot])
+        self._console.expect_state_load()
+
+    def save_state(self, slot: int):
+        """Save the current game into the given slot, on the next step"""
+        self._press(self.SAVE_BUTTONS[slot])
+
+    def flush(self):
+        """Send pending hotkey presses to dolphin. Called by Console.step."""
+        if not self.pipe:
+            return
+        if self._held is not None and self._frames_left == 0:
+            self.pipe.write(f"RELEASE {self._held}\n")
+            self._held = None
+        self.pipe.write("FLUSH\n")
+        self.pipe.flush()
+        if self._held is not None:
+            self._frames_left -= 1
@@ -70,6 +70,19 @@ class ControllerStatus(Enum):
     CONTROLLER_CPU = 1
     CONTROLLER_UNPLUGGED = 3
 
+class GameEndMethod(Enum):
+    """How a game ended, as reported by the Slippi GAME_END event"""
+    UNRESOLVED = 0
+    """The game was cut off before a result (pre-2.0.0 replays)"""
+    TIME = 1
+    """The timer ran out"""
+    GAME = 2
+    """All but one player or team ran out of stocks"""
+    RESOLVED = 3
+    """The game ended with a result (pre-2.0.0 replays)"""
+    NO_CONTEST = 7
+    """Someone quit with L+R+A+Start"""
+
 class ControllerType(Enum):
     """Types a controller can be in the Dolphin config
 
@@ -0,0 +1,269 @@
+"""Turn gamestates into fixed-size feature vectors for machine learning
+
+A feature spec is a tuple of per-player features, such as a Scalar for a
+normalized position or a OneHot for the current action. A FeatureExtractor
+compiles a spec into numpy operations over the columns of columns.GameColumns,
+and runs them either on a single live GameState or on a whole game at once.
+Both modes share the same code path (the live one is a batch of one frame), so
+a model sees exactly the same numbers in training and in inference.
+
+Usage:
+    extractor = melee.FeatureExtractor(ports=(1, 2))
+    # Live: fills and returns the same preallocated array every call
+    observation = extractor.extract(gamestate)
+    # Offline: shape (frames, extractor.size)
+    observations = extractor.extract_batch(game.columns, game.stage)
+"""
+
+import dataclasses
+import functools
+from typing import Mapping, Optional
+
+import numpy as np
+
+from melee import enums, stages
+from melee.columns import PLAYER_COLUMNS
+from melee.gamestate import GameState
+import melee.framedata as framedata_lib
+
+CHARACTER_CLASSES = 0x22
+"""One-hot width for characters: every playable character, plus one for anything else"""
+ACTION_CLASSES = max(action.value for action in enums.Action) + 2
+"""One-hot width for actions: every known action, plus one for unknown animations"""
+
+class _Scratch:
+    """Temporary arrays for one batch size, so that features don't allocate"""
+    def __init__(self, frames: int):
+        self.rows = np.arange(frames)
+        self.ints = np.zeros((2, frames), np.int64)
+        self.states = np.zeros(frames, np.uint8)
+        self.floats = np.zeros(frames, np.float32)
+        self.edge = np.zeros(frames, np.float32)
+
+@dataclasses.dataclass(frozen=True)
+class Scalar:
+    """A player column, as (value - offset) * scale"""
+    column: str
+    scale: float = 1.
+    offset: float = 0.
+
+    size = 1
+
+    @property
+    def columns(self) -> tuple[str, ...]:
+        return (self.column,)
+
+    def names(self) -> list[str]:
+        return [self.column]
+
+    def compute(self, columns: Mapping[str, np.ndarray], index: int, scratch: _Scratch, out: np.ndarray):
+        out[:, 0] = columns[self.column][:, index]
+        if self.offset:
+            out[:, 0] -= self.offset
+        if self.scale != 1.:
+            out[:, 0] *= self.scale
+
+@dataclasses.dataclass(frozen=True)
+class OneHot:
+    """A categorical player column, such as "action" or "character"
+
+    Values past the last class are counted in the last class.
+    """
+    column: str
+    classes: int
+
+    @property
+    def size(self) -> int:
+        return self.classes
+
+    @property
+    def columns(self) -> tuple[str, ...]:
+        return (self.column,)
+
+    def names(self) -> list[str]:
+        return [f"{self.column}_{i}" for i in range(self.classes)]
+
+    def compute(self, columns: Mapping[str, np.ndarray], index: int, scratch: _Scratch, out: np.ndarray):
+        classes = scratch.ints[0]
+        np.minimum(columns[self.column][:, index], self.classes - 1, out=classes)
+        out[:] = 0
+        out[scratch.rows, classes] = 1
+
+@dataclasses.dataclass(frozen=True)
+class EdgeDistance:
+    """Horizontal distance from the player to the nearest ledge. Negative when off stage."""
+    scale: float = 1.
+
+    size = 1
+
+    @property
+    def columns(self) -> tuple[str, ...]:
+        return ("x",)
+
+    def names(self) -> list[str]:
+        return ["edge_distance"]
+
+    def compute(self, columns: Mapping[str, np.ndarray], index: int, scratch: _Scratch, out: np.ndarray):
+        np.abs(columns["x"][:, index], out=scratch.floats)
+        np.subtract(scratch.edge, scratch.floats, out=out[:, 0])
+        if self.scale != 1.:
+            out[:, 0] *= self.scale
+
+_ATTACK_FRAMES = 256
+
+@functools.cache
+def _attack_state_table() -> np.ndarray:
+    """enums.AttackState value for each (character, action, action frame), from framedata.csv"""
+    hitbox_frames = {}
+    for character, action, action_frame, frame in framedata_lib._framedata_rows():
+        if frame["hitbox_1_status"] or frame["hitbox_2_status"] or frame["hitbox_3_status"] or \
+                frame["hitbox_4_status"] or frame["projectile"]:
+            hitbox_frames.setdefault((character.value, action.value), []).append(action_frame)
+
+    table = np.full((CHARACTER_CLASSES, ACTION_CLASSES, _ATTACK_FRAMES),
+                    enums.AttackState.NOT_ATTACKING.value, np.uint8)
+    for (character, action), frames in hitbox_frames.items():
+        first, last = min(frames), max(frames)
+        states = table[character, action]
+        states[:] = enums.AttackState.ATTACKING.value
+        states[:max(first, 0)] = enums.AttackState.WINDUP.value
+        states[last + 1:] = enums.AttackState.COOLDOWN.value
+    return table.reshape(-1)
+
+@dataclasses.dataclass(frozen=True)
+class AttackState:
+    """One-hot enums.AttackState of the player's current action, as FrameData.attack_state computes it
+
+    Needs framedata.csv, which is read the first time an extractor using this is made.
+    """
+    size = len(enums.AttackState)
+
+    @property
+    def columns(self) -> tuple[str, ...]:
+        return ("character", "action", "action_frame")
+
+    def names(self) -> list[str]:
+        return [f"attack_state_{state.name.lower()}" for state in enums.AttackState]
+
+    def compute(self, columns: Mapping[str, np.ndarray], index: int, scratch: _Scratch, out: np.ndarray):
+        flat, tmp = scratch.ints
+        np.minimum(columns["character"][:, index], CHARACTER_CLASSES - 1, out=flat)
+        flat *= ACTION_CLASSES
+        np.minimum(columns["action"][:, index], ACTION_CLASSES - 1, out=tmp)
+        flat += tmp
+        flat *= _ATTACK_FRAMES
+        np.clip(columns["action_frame"][:, index], 0, _ATTACK_FRAMES - 1, out=tmp)
+        flat += tmp
+        np.take(_attack_state_table(), flat, out=scratch.states)
+        out[:] = 0
+        out[scratch.rows, scratch.states] = 1
+
+DEFAULT_SPEC = (
+    OneHot("character", CHARACTER_CLASSES),
+    OneHot("action", ACTION_CLASSES),
+    Scalar("x", scale=1/100),
+    Scalar("y", scale=1/100),
+    Scalar("percent", scale=1/100),
+    Scalar("stock", scale=1/4),
+    Scalar("facing"),
+    Scalar("on_ground"),
+    Scalar("shield_strength", scale=1/60),
+    Scalar("jumps_left"),
+    Scalar("invulnerable"),
+    Scalar("hitlag_left", scale=1/10),
+    Scalar("hitstun_frames_left", scale=1/100),
+    EdgeDistance(scale=1/100),
+)
+"""A reasonable starting point: who and what each player is, where, and how hurt"""
+
+class FeatureExtractor:
+    """A compiled feature spec, for a fixed set of ports
+
+    The output for each frame is the spec's features for the first port in
+    `ports`, then for the second port, and so on. Missing players give the same
+    values as their all-zero columns in columns.GameColumns.
+    """
+    def __init__(self, spec: tuple = DEFAULT_SPEC, ports: tuple[int, ...] = (1, 2), dtype=np.float32):
+        """
+        Args:
+            spec (tuple): The features to compute for each player, such as DEFAULT_SPEC
+            ports (tuple of int): The players to compute them for, in output order
+            dtype: Type of the output arrays
+        """
+        self.spec = tuple(spec)
+        self.ports = tuple(ports)
+        self.dtype = dtype
+        self._layout = []
+        offset = 0
+        for port in self.ports:
+            for feature in self.spec:
+                self._layout.append((port - 1, feature, offset))
+                offset += feature.size
+        self.size = offset
+        """(int): Length of a feature vector"""
+
+        needed = {column for feature in self.spec for column in feature.columns}
+        unknown = needed - set(PLAYER_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns in feature spec: {sorted(unknown)}")
+        self._getters = [(name, PLAYER_COLUMNS[name][1]) for name in PLAYER_COLUMNS if name in needed]
+        if any(isinstance(feature, AttackState) for feature in self.spec):
+            _attack_state_table()
+
+        # Everything extract() needs, allocated once
+        self._row = {name: np.zeros((1, 4), PLAYER_COLUMNS[name][0]) for name, _ in self._getters}
+        self._scratch = _Scratch(1)
+        self._out = np.zeros(self.size, dtype)
+
+    @property
+    def names(self) -> list[str]:
+        """(list of str): Name of each entry of a feature vector, such as "p1_percent" """
+        names = []
+        for port in self.ports:
+            for feature in self.spec:
+                names.extend(f"p{port}_{name}" for name in feature.names())
+        return names
+
+    def _fill(self, columns: Mapping[str, np.ndarray], scratch: _Scratch, out: np.ndarray):
+        for index, feature, offset in self._layout:
+            feature.compute(columns, index, scratch, out[:, offset:offset + feature.size])
+
+    def extract(self, gamestate: GameState, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Compute the feature vector of a single gamestate
+
+        Args:
+            gamestate (gamestate.GameState): The current gamestate
+            out (np.ndarray): Array of shape (size,) to write into. Defaults to an
+                array owned by the extractor, which is overwritten on every call.
+
+        Returns:
+            `out`, filled in
+        """
+        if out is None:
+            out = self._out
+        for name, getter in self._getters:
+            column = self._row[name]
+            for port in self.ports:
+                player = gamestate.players.get(port)
+                column[0, port - 1] = getter(player) if player is not None else 0
+        self._scratch.edge[0] = stages.EDGE_POSITION.get(gamestate.stage, 0)
+        self._fill(self._row, self._scratch, out[np.newaxis])
+        return out
+
+    def extract_batch(self, columns: Mapping[str, np.ndarray], stage: enums.Stage) -> np.ndarray:
+        """Compute the feature vectors of a whole game
+
+        Args:
+            columns (columns.GameColumns or dict): The game's columns, such as
+                session.Game.columns or GameColumns.to_dict()
+            stage (enums.Stage): The stage the game was played on
+
+        Returns:
+            Array of shape (frames, size)
+        """
+        frames = len(columns["frame"])
+        scratch = _Scratch(frames)
+        scratch.edge[:] = stages.EDGE_POSITION.get(stage, 0)
+        out = np.zeros((frames, self.size), self.dtype)
+        self._fill(columns, scratch, out)
+        return out
@@ -6,12 +6,87 @@ and state information that would be difficult to discover on your own.
 """
 
 import csv
+import functools
 import os
 import math
 from collections import defaultdict
 from melee.enums import Action, Character, AttackState
 from melee import stages
 
+_DATA_PATH = os.path.dirname(os.path.realpath(__file__))
+
+@functools.cache
+def _framedata_rows():
+    """Parse framedata.csv into (character, action, frame, data) tuples, once per process"""
+    rows = []
+    with open(_DATA_PATH + "/framedata.csv") as csvfile:
+        for frame in csv.DictReader(csvfile):
+            # Pull out the character, action, and frame
+            character = Character(int(frame["character"]))
+            action = Action(int(frame["action"]))
+            action_frame = int(frame["frame"])
+            rows.append((character, action, action_frame,
+                {"hitbox_1_status": frame["hitbox_1_status"] == "True", \
+                "hitbox_1_size": float(frame["hitbox_1_size"]), \
+                "hitbox_1_x": float(frame["hitbox_1_x"]), \
+                "hitbox_1_y": float(frame["hitbox_1_y"]), \
+                "hitbox_2_status": frame["hitbox_2_status"] == "True", \
+                "hitbox_2_size": float(frame["hitbox_2_size"]), \
+                "hitbox_2_x": float(frame["hitbox_2_x"]), \
+                "hitbox_2_y": float(frame["hitbox_2_y"]), \
+                "hitbox_3_status": frame["hitbox_3_status"] == "True", \
+                "hitbox_3_size": float(frame["hitbox_3_size"]), \
+                "hitbox_3_x": float(frame["hitbox_3_x"]), \
+                "hitbox_3_y": float(frame["hitbox_3_y"]), \
+                "hitbox_4_status": frame["hitbox_4_status"] == "True", \
+                "hitbox_4_size": float(frame["hitbox_4_size"]), \
+                "hitbox_4_x": float(frame["hitbox_4_x"]), \
+                "hitbox_4_y": float(frame["hitbox_4_y"]), \
+                "locomotion_x": float(frame["locomotion_x"]), \
+                "locomotion_y": float(frame["locomotion_y"]), \
+                "iasa": frame["iasa"] == "True", \
+                "facing_changed": frame["facing_changed"] == "True", \
+                "projectile": frame["projectile"] == "True"}))
+    return tuple(rows)
+
+@functools.cache
+def load_characterdata():
+    """Physics attributes of each character, read from characterdata.csv
+
+    The file is only read once per process, and the returned dict is shared,
+    so treat it as read-only.
+
+    Returns:
+        dict of enums.Character to a dict of attribute name to float
+    """
+    characterdata = dict()
+    with open(_DATA_PATH + "/characterdata.csv") as csvfile:
+        reader = csv.DictReader(csvfile)
+        for line in reader:
+            del line["Character"]
+            #Convert all fields to numbers
+            for key, value in line.items():
+                line[key] = float(value)
+            characterdata[Character(line["CharacterIndex"])] = line
+    return characterdata
+
+@functools.cache
+def load_zero_indices():
+    """Actions whose action frames are zero-indexed, read from actiondata.csv
+
+    The file is only read once per process, and the returned dict is shared,
+    so treat it as read-only.
+
+    Returns:
+        dict of character index (int) to a frozenset of action indices (int)
+    """
+    zero_indices = defaultdict(set)
+    with open(_DATA_PATH + "/actiondata.csv") as csvfile:
+        for line in csv.DictReader(csvfile):
+            if line["zeroindex"] == "True":
+                zero_indices[int(line["character"])].add(int(line["action"]))
+    return defaultdict(frozenset, {character: frozenset(actions) for character, actions in zero_indices.items()})
+
 class FrameData:
     """Set of helper functions and data structures for knowing Melee frame data
 
@@ -41,52 +116,12 @@ class FrameData:
             self.prevfacing = {}
             self.prevprojectilecount = {}
 
-        #Read the existing framedata
-        path = os.path.dirname(os.path.realpath(__file__))
+        # The parsed tables are shared by every FrameData in the process
         self.framedata = defaultdict(lambda: defaultdict(lambda: defaultdict(dict)))
-        with open(path + "/framedata.csv") as csvfile:
-            # A list of dicts containing the frame data
-            csvreader = list(csv.DictReader(csvfile))
-            # Build a series of nested dicts for faster read access
-            for frame in csvreader:
-                # Pull out the character, action, and frame
-                character = Character(int(frame["character"]))
-                action = Action(int(frame["action"]))
-                action_frame = int(frame["frame"])
-                self.framedata[character][action][action_frame] = \
-                    {"hitbox_1_status": frame["hitbox_1_status"] == "True", \
-                    "hitbox_1_size": float(frame["hitbox_1_size"]), \
-                    "hitbox_1_x": float(frame["hitbox_1_x"]), \
-                    "hitbox_1_y": float(frame["hitbox_1_y"]), \
-                    "hitbox_2_status": frame["hitbox_2_status"] == "True", \
-                    "hitbox_2_size": float(frame["hitbox_2_size"]), \
-                    "hitbox_2_x": float(frame["hitbox_2_x"]), \
-                    "hitbox_2_y": float(frame["hitbox_2_y"]), \
-                    "hitbox_3_status": frame["hitbox_3_status"] == "True", \
-                    "hitbox_3_size": float(frame["hitbox_3_size"]), \
-                    "hitbox_3_x": float(frame["hitbox_3_x"]), \
-                    "hitbox_3_y": float(frame["hitbox_3_y"]), \
-                    "hitbox_4_status": frame["hitbox_4_status"] == "True", \
-                    "hitbox_4_size": float(frame["hitbox_4_size"]), \
-                    "hitbox_4_x": float(frame["hitbox_4_x"]), \
-                    "hitbox_4_y": float(frame["hitbox_4_y"]), \
-                    "locomotion_x": float(frame["locomotion_x"]), \
-                    "locomotion_y": float(frame["locomotion_y"]), \
-                    "iasa": frame["iasa"] == "True", \
-                    "facing_changed": frame["facing_changed"] == "True", \
-                    "projectile": frame["projectile"] == "True"}
-
-        #read the character data csv
-        self.characterdata = dict()
-        path = os.path.dirname(os.path.realpath(__file__))
-        with open(path + "/characterdata.csv") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for line in reader:
-                del line["Character"]
-                #Convert all fields to numbers
-                for key, value in line.items():
-                    line[key] = float(value)
-                self.characterdata[Character(line["CharacterIndex"])] = line
+        for character, action, action_frame, frame in _framedata_rows():
+            self.framedata[character][action][action_frame] = frame
+
+        self.characterdata = load_characterdata()
 
     def is_grab(self, character, action):
         """For the given character, is the supplied action a grab?
@@ -1,7 +1,8 @@
 """ Gamestate is a single snapshot in time of the game that represents all necessary information
         to make gameplay decisions
 """
-from dataclasses import dataclass, field
+from dataclasses import MISSING, dataclass, field, fields, replace
+import math
 from enum import Enum
 from typing import Optional
 
@@ -64,6 +65,74 @@ class StadiumTransformation:
     event: StadiumTransformationEvent = StadiumTransformationEvent.FINISHED
     type: StadiumTransformationType = StadiumTransformationType.NORMAL
 
+def _info_property(name: str, doc: str) -> property:
+    """A property that reads `name` from self.info, and writes it by replacing self.info"""
+    def get(self):
+        return getattr(self.info, name)
+    def set(self, value):
+        if getattr(self.info, name) != value:
+            self.info = replace(self.info, **{name: value})
+    return property(get, set, doc=doc)
+
+def _accept_info_kwargs(cls, info_cls):
+    """Let cls(...) still take the fields of info_cls as keyword arguments, and put them in its info
+
+    They used to be fields of cls itself. Note that they're no longer in its
+    dataclasses.fields() or asdict(), other than under `info`.
+    """
+    init = cls.__init__
+    names = frozenset(info_field.name for info_field in fields(info_cls))
+    def __init__(self, *args, **kwargs):
+        if kwargs and not names.isdisjoint(kwargs):
+            info = {name: kwargs.pop(name) for name in names.intersection(kwargs)}
+            init(self, *args, **kwargs)
+            self.info = replace(self.info, **info)
+        else:
+            init(self, *args, **kwargs)
+    __init__.__doc__ = init.__doc__
+    __init__.__qualname__ = init.__qualname__
+    cls.__init__ = __init__
+    return cls
+
+@dataclass(frozen=True, slots=True)
+class PlayerInfo:
+    """What's known about a player for a whole game, shared by all of that game's PlayerStates"""
+    costume: int = 0
+    """(int): Index for which costume the player is wearing"""
+    cpu_level: int = 0
+    """(int): CPU level of player. 0 for a libmelee-controller bot or human player."""
+    team_id: int = 0
+    """(int): The team ID of the player. This is different than costume, and only relevant during teams."""
+    nickName: str = ""
+    """(string): The in-game nickname for the player. Might be blank."""
+    connectCode: str = ""
+    """(string): The rollback connect code for the player. Might be blank."""
+    displayName: str = ""
+    """(string): The Slippi Online display name for the play. Might be blank"""
+
+@dataclass(frozen=True, slots=True)
+class GameInfo:
+    """What's known about a game once it has started, shared by all of its GameStates
+
+    Console builds one per game, from GAME_START and the replay metadata, rather
+    than copying these values into every frame. It's frozen since every frame of
+    the game holds the same one. Assigning to one of its fields through a
+    GameState or PlayerState replaces that state's info instead.
+
+    GameState and PlayerState still take these fields as keyword arguments,
+    such as GameState(startAt=...) or PlayerState(costume=...). They are no
+    longer dataclass fields of their own though: dataclasses.fields() lists
+    only `info`, and asdict() has them nested under "info".
+    """
+    playedOn: str = ""
+    """(string): Platform the game was played on (values include dolphin, console, and network). Might be blank."""
+    startAt: str = ""
+    """(string): Timestamp string of when the game started. Such as '2018-06-22T07:52:59Z'"""
+    consoleNick: str = ""
+    """(string): The name of the console the replay was created on. Might be blank."""
+    players: tuple[PlayerInfo, ...] = (PlayerInfo(),) * 4
+    """(tuple of PlayerInfo): Info for each player, indexed by port - 1"""
+
 @dataclass(slots=True)
 class GameState:
     """Represents the state of a running game of Melee at a given moment in time"""
@@ -93,16 +162,30 @@ class GameState:
     """(float): Euclidian distance between the two players. (or just Popo for climbers)"""
     menu_selection: int = 0
     """(int): The index of the selected menu item for when in menus."""
-    startAt: str = ""
-    """(string): Timestamp string of when the game started. Such as '2018-06-22T07:52:59Z'"""
-    playedOn: str = ""
-    """(string): Platform the game was played on (values include dolphin, console, and network). Might be blank."""
-    consoleNick: str = ""
-    """(string): The name of the console the replay was created on. Might be blank."""
+    info: GameInfo = GameInfo()
+    """(GameInfo): What's known about the game as a whole, shared by all its frames"""
     _newframe: bool = True
     custom: dict = field(default_factory=dict)
     """(dict): Custom fields to be added by the user"""
 
+    startAt = _info_property(
+        "startAt", "(string): Timestamp string of when the game started. Such as '2018-06-22T07:52:59Z'")
+    playedOn = _info_property(
+        "playedOn", "(string): Platform the game was played on (values include dolphin, console, and network). Might be blank.")
+    consoleNick = _info_property(
+        "consoleNick", "(string): The name of the console the replay was created on. Might be blank.")
+
+    def to_bytes(self) -> bytes:
+        """This gamestate in a compact binary layout. See melee.serialize, which also has deltas."""
+        return melee.serialize.to_bytes(self)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, prev: Optional['GameState'] = None) -> 'GameState':
+        """Decode a gamestate from to_bytes(), or from serialize.delta() given the previous one"""
+        return melee.serialize.from_bytes(data, prev)
+
+_accept_info_kwargs(GameState, GameInfo)
+
 @dataclass(slots=True)
 class UnknownAnimation:
     value: int = -1
@@ -184,20 +267,21 @@ class PlayerState:
     """(float, float): Top edge of the ECB. (x, y) offset from player's center."""
     ecb_bottom: tuple = (0, 0)
     """(float, float): Bottom edge of the ECB. (x, y) offset from player's center."""
-    costume: int = 0
-    """(int): Index for which costume the player is wearing"""
-    cpu_level: int = 0
-    """(int): CPU level of player. 0 for a libmelee-controller bot or human player."""
     is_holding_cpu_slider: bool = False
     """(bool): Is the player holding the CPU slider in the character select screen?"""
-    nickName: str = ""
-    """(string): The in-game nickname for the player. Might be blank."""
-    connectCode: str = ""
-    """(string): The rollback connect code for the player. Might be blank."""
-    displayName: str = ""
-    """(string): The Slippi Online display name for the play. Might be blank"""
-    team_id: int = 0
-    """(int): The team ID of the player. This is different than costume, and only relevant during teams."""
+    info: PlayerInfo = PlayerInfo()
+    """(PlayerInfo): What's known about the player for the whole game, shared by all its frames"""
+
+    costume = _info_property("costume", "(int): Index for which costume the player is wearing")
+    cpu_level = _info_property(
+        "cpu_level", "(int): CPU level of player. 0 for a libmelee-controller bot or human player.")
+    nickName = _info_property("nickName", "(string): The in-game nickname for the player. Might be blank.")
+    connectCode = _info_property("connectCode", "(string): The rollback connect code for the player. Might be blank.")
+    displayName = _info_property("displayName", "(string): The Slippi Online display name for the play. Might be blank")
+    team_id = _info_property(
+        "team_id", "(int): The team ID of the player. This is different than costume, and only relevant during teams.")
+
+_accept_info_kwargs(PlayerState, PlayerInfo)
 
 @dataclass(slots=True)
 class UnknownProjectileType:
@@ -222,6 +306,76 @@ class Projectile:
     """(int): The subtype of the item. Many projectiles have 'subtypes' that make them different. They're all different, so it's not an enum"""
     spawn_id: np.uint32 = np.uint32(0)
 
+def _field_defaults(cls) -> dict:
+    """Field name to a function making its default value, for a dataclass"""
+    defaults = {}
+    for class_field in fields(cls):
+        if class_field.default_factory is not MISSING:
+            defaults[class_field.name] = class_field.default_factory
+        else:
+            defaults[class_field.name] = (lambda value: lambda: value)(class_field.default)
+    return defaults
+
+class _Lazy:
+    """Fills in the fields of a dataclass the first time they're read
+
+    A field that hasn't been set yet is decoded by `self._decoders[name](self)`,
+    which sets it, and usually the other fields that come from the same bytes.
+    Fields without a decoder, or that the decoder leaves unset, get their default.
+    """
+    __slots__ = ()
+    _defaults: dict = {}
+
+    def __getattr__(self, name):
+        # Only called for attributes that aren't set
+        defaults = type(self)._defaults
+        if name not in defaults:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        decode = self._decoders.get(name)
+        if decode is not None:
+            decode(self)
+            try:
+                return object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+        value = defaults[name]()
+        setattr(self, name, value)
+        return value
+
+class LazyPlayerState(_Lazy, PlayerState):
+    """A PlayerState that decodes its fields from the frame's raw events as they're read
+
+    Made by Console.step() with `lazy=True`. Reading a field decodes the group of
+    fields it belongs to (see console.FIELD_GROUPS) and caches them, so fields
+    that are never read cost nothing. Otherwise it behaves like a PlayerState,
+    except that it never compares equal to one. Compare dataclasses.asdict() instead.
+    """
+    __slots__ = ("_decoders", "_pre", "_post", "_stage", "_prev_action")
+    _defaults = _field_defaults(PlayerState)
+
+def _player_distance(players: dict) -> float:
+    """Euclidian distance between the first two players"""
+    i = 0
+    player_one_x, player_one_y, player_two_x, player_two_y = 0, 0, 0, 0
+    for _, player_state in players.items():
+        if i == 0:
+            player_one_x, player_one_y = player_state.position.x, player_state.position.y
+        if i == 1:
+            player_two_x, player_two_y = player_state.position.x, player_state.position.y
+        i += 1
+    xdist = player_one_x - player_two_x
+    ydist = player_one_y - player_two_y
+    return math.sqrt((xdist**2) + (ydist**2))
+
+class LazyGameState(_Lazy, GameState):
+    """A GameState whose players are LazyPlayerStates
+
+    Made by Console.step() with `lazy=True`. `distance` and `projectiles` are
+    also only worked out when they're first read.
+    """
+    __slots__ = ("_decoders", "_items", "_slp_version")
+    _defaults = _field_defaults(GameState)
+
 def port_detector(gamestate, character, costume):
     """Autodiscover what port the given character is on
 
@@ -0,0 +1,269 @@
+"""Bring up many Dolphin instances on one host at once
+
+Each instance needs its own Slippstream (spectator) port. Two instances on the
+same port show up as a Slippstream connection timeout, so allocate_ports hands
+out ports that are free on this host and not already given to another console
+in this process.
+
+launch() then constructs and runs all the instances in parallel, so that one
+instance's Dolphin boot overlaps with the others' setup, and connects to them
+as they come up. The whole host is ready after roughly one boot time.
+"""
+
+import concurrent.futures
+import dataclasses
+import logging
+import socket
+import threading
+import time
+from typing import Callable, Optional
+
+from melee import affinity, enums
+from melee.console import Console
+from melee.controller import Controller
+
+# Ports handed out by allocate_ports that haven't been released yet
+_allocated_ports: set[int] = set()
+_allocation_lock = threading.Lock()
+
+def _is_port_free(address: str, port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        try:
+            sock.bind((address, port))
+        except OSError:
+            return False
+    return True
+
+def allocate_ports(
+    count: int,
+    address: str = "127.0.0.1",
+    start: int = 51441,
+    end: int = 65535,
+) -> list[int]:
+    """Find `count` UDP ports that are free, starting the search at `start`
+
+    Ports stay reserved for this process until given back with release_ports,
+    so concurrent callers never get the same port. A port can still be taken
+    by another process between allocation and Dolphin binding it.
+
+    Raises:
+        RuntimeError: If there aren't enough free ports in [start, end]
+    """
+    ports = []
+    with _allocation_lock:
+        for port in range(start, end + 1):
+            if len(ports) == count:
+                break
+            if port in _allocated_ports or not _is_port_free(address, port):
+                continue
+            ports.append(port)
+        if len(ports) < count:
+            raise RuntimeError(f"Only found {len(ports)} of {count} free ports in [{start}, {end}]")
+        _allocated_ports.update(ports)
+    return ports
+
+def release_ports(ports: list[int]):
+    """Give ports from allocate_ports back, once their consoles have stopped"""
+    with _allocation_lock:
+        _allocated_ports.difference_update(ports)
+
+@dataclasses.dataclass
+class LaunchResult:
+    """What happened to one instance started by launch()"""
+    index: int
+    """(int): Position of the instance in the launch"""
+    port: int
+    """(int): The Slippstream port of the instance"""
+    console: Optional[Console] = None
+    """(console.Console): The connected console. None if the launch failed."""
+    controllers: dict[int, Controller] = dataclasses.field(default_factory=dict)
+    """(dict of int to controller.Controller): Connected controllers, by port"""
+    error: Optional[BaseException] = None
+    """(Exception): Why the instance failed to come up, if it did"""
+    setup_time: float = 0.
+    """(float): Seconds spent constructing the Console and its controllers"""
+    boot_time: float = 0.
+    """(float): Seconds from running Dolphin until Slippstream and the controllers connected"""
+    owns_port: bool = False
+    """(bool): Whether launch() allocated the port, so that stop() gives it back"""
+
+    @property
+    def ready(self) -> bool:
+        """(bool): Whether the instance is up and connected"""
+        return self.error is None and self.console is not None
+
+    def stop(self):
+        """Stop the instance, and release its port if launch() allocated it"""
+        _stop_instance(self.console, self.controllers)
+        self.console = None
+        self.controllers = {}
+        if self.owns_port:
+            release_ports([self.port])
+            self.owns_port = False
+
+def _stop_instance(console: Optional[Console], controllers: dict[int, Controller]):
+    for controller in controllers.values():
+        controller.disconnect()
+    if console is not None:
+        console.stop()
+
+def _run_one(
+    index: int,
+    port: int,
+    iso_path: str,
+    console_kwargs: dict,
+    run_kwargs: dict,
+    ports: tuple[int, ...],
+    controller_type: enums.ControllerType,
+) -> tuple[LaunchResult, Optional[Console], dict[int, Controller], float]:
+    """Construct an instance and run its Dolphin, without connecting to it
+
+    This part doesn't start any processes other than Dolphin, so it's safe to
+    do from several threads at once.
+
+    Returns:
+        The result so far, the console and its controllers (None and empty if
+        it failed), and the time Dolphin was started at
+    """
+    result = LaunchResult(index, port)
+    console = None
+    controllers = {}
+    try:
+        start = time.perf_counter()
+        console = Console(**dict(console_kwargs, slippi_port=port))
+        controllers = {
+            controller_port: Controller(console=console, port=controller_port, type=controller_type)
+            for controller_port in ports
+        }
+        started = time.perf_counter()
+        result.setup_time = started - start
+        console.run(iso_path=iso_path, **run_kwargs)
+    except Exception as e:
+        logging.error("Dolphin instance %d (port %d) failed to launch: %s", index, port, e)
+        result.error = e
+        _stop_instance(console, controllers)
+        return result, None, {}, 0.
+    return result, console, controllers, started
+
+def _connect_one(result: LaunchResult, console: Console, controllers: dict[int, Controller], started: float):
+    """Connect to a running instance's Slippstream and controller pipes
+
+    Connecting forks the Slippstream worker process, so only do it from the
+    thread that called launch(). Forking while other threads run can deadlock.
+    """
+    try:
+        if not console.connect():
+            raise RuntimeError(f"Could not connect to Slippstream on port {result.port}")
+        for controller in controllers.values():
+            controller.connect()
+    except Exception as e:
+        logging.error("Dolphin instance %d (port %d) failed to launch: %s", result.index, result.port, e)
+        result.error = e
+        _stop_instance(console, controllers)
+        return
+    result.boot_time = time.perf_counter() - started
+    result.console = console
+    result.controllers = controllers
+
+def _launch_one(
+    index: int,
+    port: int,
+    iso_path: str,
+    console_kwargs: dict,
+    run_kwargs: dict,
+    ports: tuple[int, ...],
+    controller_type: enums.ControllerType,
+) -> LaunchResult:
+    result, console, controllers, started = _run_one(
+        index, port, iso_path, console_kwargs, run_kwargs, ports, controller_type)
+    if console is not None:
+        _connect_one(result, console, controllers, started)
+    return result
+
+def launch(
+    count: int,
+    iso_path: str,
+    console_kwargs: Optional[dict] = None,
+    run_kwargs: Optional[dict] = None,
+    ports: tuple[int, ...] = (1, 2),
+    controller_type: enums.ControllerType = enums.ControllerType.STANDARD,
+    slippi_ports: Optional[list[int]] = None,
+    max_workers: Optional[int] = None,
+    on_ready: Optional[Callable[[LaunchResult], None]] = None,
+    pin_cpus: bool = False,
+) -> list[LaunchResult]:
+    """Start `count` Dolphin instances in parallel and wait for all of them
+
+    Instances that fail to come up don't stop the others. Check `ready` and
+    `error` on each result. Dolphin is run from a pool of threads, but the
+    instances are connected to from the calling thread, one after the other,
+    since connecting forks the Slippstream worker process.
+
+    Ports allocated here belong to the results. Call `stop()` on each ready
+    result when done with it, which also releases its port, or release them
+    yourself with release_ports. Ports of failed instances are released already.
+
+    Args:
+        count (int): Number of instances
+        iso_path (str): Path to the Melee ISO
+        console_kwargs (dict): Arguments for each Console, such as `path`
+        run_kwargs (dict): Extra arguments for Console.run, such as `platform`
+        ports (tuple of int): Controller ports to plug a controller into
+        controller_type (enums.ControllerType): Type of those controllers
+        slippi_ports (list of int): Slippstream ports to use. Allocated with
+            allocate_ports if not given.
+        max_workers (int): Instances to bring up at the same time. Defaults to all of them.
+        on_ready (callable): Called with each LaunchResult as soon as it is done,
+            whether it succeeded or not. Failures to run Dolphin are reported
+            first, then the rest in launch order.
+        pin_cpus (bool): Pin each Dolphin and its Slippstream worker to its own
+            physical core, spread over the NUMA nodes with affinity.layout_instances
+
+    Returns:
+        A list of LaunchResult, in launch order. `owns_port` is set on the ready
+        ones if the ports were allocated here.
+    """
+    console_kwargs = dict(console_kwargs or {})
+    run_kwargs = dict(run_kwargs or {})
+    allocated = slippi_ports is None
+    if slippi_ports is None:
+        slippi_ports = allocate_ports(count, console_kwargs.get("slippi_address", "127.0.0.1"))
+    elif len(slippi_ports) != count:
+        raise ValueError("Need exactly one slippi port per instance")
+
+    instance_kwargs = [(console_kwargs, run_kwargs)] * count
+    if pin_cpus:
+        instance_kwargs = [
+            (dict(console_kwargs, worker_cpu_affinity=placement.cpus),
+             dict(run_kwargs, cpu_affinity=placement.cpus))
+            for placement in affinity.layout_instances(count)
+        ]
+
+    running = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or count) as executor:
+        futures = [
+            executor.submit(
+                _run_one, index, port, iso_path, *instance_kwargs[index],
+                tuple(ports), controller_type)
+            for index, port in enumerate(slippi_ports)
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            result, console, controllers, started = future.result()
+            if console is None:
+                if on_ready is not None:
+                    on_ready(result)
+            else:
+                running.append((result, console, controllers, started))
+
+    # The instances boot in parallel meanwhile, so connecting in order doesn't add up their boot times
+    for result, console, controllers, started in sorted(running, key=lambda instance: instance[0].index):
+        _connect_one(result, console, controllers, started)
+        if on_ready is not None:
+            on_ready(result)
+
+    results = [future.result()[0] for future in futures]
+    if allocated:
+        release_ports([result.port for result in results if not result.ready])
+        for result in results:
+            result.owns_port = result.ready
+    return results
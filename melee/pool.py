@@ -0,0 +1,287 @@
+"""A pool of running Dolphin instances that are reused across games
+
+Starting Dolphin means making a home directory, probing the dolphin version,
+writing config files, launching the process and waiting for Slippstream and
+the controller pipes to connect. That takes seconds, which dominates short
+episodes. A DolphinPool does all of that once per instance, then hands the
+instances out as leases and brings them back to the character select screen
+through the menus between games.
+
+Usage:
+    pool = melee.DolphinPool(2, iso_path, console_kwargs=dict(path=dolphin_path))
+    with pool.lease() as lease:
+        gamestate = lease.console.step()
+        ...
+    pool.close()
+"""
+
+import contextlib
+import dataclasses
+import logging
+import queue
+import threading
+from typing import Iterator, Optional, Union
+
+from melee import enums, launcher
+from melee.console import Console
+from melee.controller import Controller
+from melee.gamestate import GameState
+from melee.menuhelper import MenuHelper
+
+@dataclasses.dataclass
+class ConsoleLease:
+    """A running Console from a DolphinPool, with its controllers connected"""
+    index: int
+    """(int): Which instance of the pool this is"""
+    console: Console
+    """(console.Console): The console, already running and connected"""
+    controllers: dict[int, Controller]
+    """(dict of int to controller.Controller): Connected controllers, by port"""
+    games: int = 0
+    """(int): Number of times this instance has been handed out since it was started"""
+
+@dataclasses.dataclass
+class _DeadSlot:
+    """An instance that couldn't be restarted, waiting in the idle queue to be tried again"""
+    index: int
+    error: BaseException
+
+class DolphinPool:
+    """Keeps a number of Dolphin instances running and hands them out on request
+
+    Instances are reset to the character select screen when they are released:
+    games in progress are quit with L+R+A+Start, the postgame screens (and any
+    other unknown menu) are skipped with Start and the stage select and main
+    menus are backed out of. An instance that
+    doesn't get there within `reset_frame_limit` frames, or whose process has
+    died, is restarted from scratch instead. If the restart fails too, the
+    instance is tried again by the next acquire() that gets to it.
+    """
+    def __init__(
+        self,
+        size: int,
+        iso_path: str,
+        console_kwargs: Optional[dict] = None,
+        run_kwargs: Optional[dict] = None,
+        ports: tuple[int, ...] = (1, 2),
+        controller_type: enums.ControllerType = enums.ControllerType.STANDARD,
+        slippi_ports: Optional[list[int]] = None,
+        reset_frame_limit: int = 60 * 30,
+    ):
+        """Start `size` Dolphin instances
+
+        Args:
+            size (int): Number of Dolphin instances to keep running
+            iso_path (str): Path to the Melee ISO
+            console_kwargs (dict): Arguments for each Console, such as `path`.
+                `slippi_port` is assigned per instance.
+            run_kwargs (dict): Extra arguments for Console.run, such as `platform`
+            ports (tuple of int): Controller ports to plug a controller into
+            controller_type (enums.ControllerType): Type of those controllers
+            slippi_ports (list of int): Slippstream port of each instance. Free
+                ports are allocated with launcher.allocate_ports if not given.
+            reset_frame_limit (int): Frames to spend getting back to the character
+                select screen before restarting the instance instead
+        """
+        if size < 1:
+            raise ValueError("A pool needs at least one instance")
+        if not ports:
+            raise ValueError("A pool needs at least one controller port")
+        self.iso_path = iso_path
+        self.console_kwargs = dict(console_kwargs or {})
+        self.run_kwargs = dict(run_kwargs or {})
+        self.ports = tuple(ports)
+        self.controller_type = controller_type
+        self._owns_ports = slippi_ports is None
+        if slippi_ports is None:
+            slippi_ports = launcher.allocate_ports(
+                size, self.console_kwargs.get("slippi_address", "127.0.0.1"))
+        elif len(slippi_ports) != size:
+            raise ValueError("Need exactly one slippi port per instance")
+        self.slippi_ports = list(slippi_ports)
+        """(list of int): The Slippstream port of each instance"""
+        self.reset_frame_limit = reset_frame_limit
+
+        self.restarts = 0
+        """(int): How many times an instance had to be restarted"""
+        self.restart_failures = 0
+        """(int): How many times restarting an instance failed"""
+        self._idle: queue.Queue[Union[ConsoleLease, _DeadSlot]] = queue.Queue()
+        # None for instances that are down
+        self._leases: list[Optional[ConsoleLease]] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Boot all the instances in parallel
+        results = launcher.launch(
+            size, iso_path, self.console_kwargs, self.run_kwargs, self.ports,
+            controller_type, slippi_ports=self.slippi_ports)
+        self._leases = [ConsoleLease(r.index, r.console, r.controllers) for r in results if r.ready]
+        failed = [r for r in results if not r.ready]
+        if failed:
+            self.close()
+            raise RuntimeError(
+                f"{len(failed)} of {size} Dolphin instances failed to launch") from failed[0].error
+        for lease in self._leases:
+            self._idle.put(lease)
+
+    def _start(self, index: int) -> ConsoleLease:
+        """Launch and connect a fresh instance"""
+        result = launcher._launch_one(
+            index, self.slippi_ports[index], self.iso_path, self.console_kwargs,
+            self.run_kwargs, self.ports, self.controller_type)
+        if not result.ready:
+            raise RuntimeError(f"Failed to restart Dolphin instance {index}") from result.error
+        return ConsoleLease(index, result.console, result.controllers)
+
+    @staticmethod
+    def _stop(lease: ConsoleLease):
+        for controller in lease.controllers.values():
+            controller.disconnect()
+        lease.console.stop()
+
+    def _restart(self, lease: ConsoleLease) -> Union[ConsoleLease, _DeadSlot]:
+        logging.warning("Restarting Dolphin instance %d", lease.index)
+        self._stop(lease)
+        self.restarts += 1
+        return self._try_start(lease.index)
+
+    def _try_start(self, index: int) -> Union[ConsoleLease, _DeadSlot]:
+        """Launch a fresh instance, or mark it as down if it doesn't come up"""
+        try:
+            new_lease = self._start(index)
+        except RuntimeError as error:
+            logging.error("%s", error)
+            self.restart_failures += 1
+            with self._lock:
+                self._leases[index] = None
+            return _DeadSlot(index, error)
+        with self._lock:
+            self._leases[index] = new_lease
+        return new_lease
+
+    @staticmethod
+    def _is_alive(lease: ConsoleLease) -> bool:
+        process = lease.console._process
+        return process is None or process.poll() is None
+
+    def _reset_step(self, gamestate: GameState, lease: ConsoleLease, menu_helper: MenuHelper):
+        """Press whatever gets us one frame closer to the character select screen"""
+        controller, *others = lease.controllers.values()
+        for other in others:
+            other.release_all()
+
+        if gamestate.menu_state in [enums.Menu.IN_GAME, enums.Menu.SUDDEN_DEATH]:
+            # Hold L+R+A and keep tapping Start to pause and quit
+            controller.press_shoulder(enums.Button.BUTTON_L, 1)
+            controller.press_shoulder(enums.Button.BUTTON_R, 1)
+            controller.press_button(enums.Button.BUTTON_L)
+            controller.press_button(enums.Button.BUTTON_R)
+            controller.press_button(enums.Button.BUTTON_A)
+            if controller.prev.button[enums.Button.BUTTON_START]:
+                controller.release_button(enums.Button.BUTTON_START)
+            else:
+                controller.press_button(enums.Button.BUTTON_START)
+        elif gamestate.menu_state in [enums.Menu.POSTGAME_SCORES, enums.Menu.UNKNOWN_MENU,
+                                      enums.Menu.PRESS_START]:
+            # The console reports the postgame screens as UNKNOWN_MENU. Start skips
+            # through them, and past the title screen.
+            menu_helper.skip_postgame(controller)
+        elif gamestate.menu_state == enums.Menu.STAGE_SELECT:
+            # Back out to the character select screen
+            if controller.prev.button[enums.Button.BUTTON_B]:
+                controller.release_button(enums.Button.BUTTON_B)
+            else:
+                controller.press_button(enums.Button.BUTTON_B)
+        elif gamestate.menu_state == enums.Menu.MAIN_MENU:
+            MenuHelper.choose_versus_mode(gamestate, controller)
+        else:
+            controller.release_all()
+
+    def reset(self, lease: ConsoleLease) -> bool:
+        """Navigate an instance back to the character select screen
+
+        Returns:
+            True if the character select screen was reached, False if the
+            process died or the frame limit ran out
+        """
+        menu_helper = MenuHelper()
+        for _ in range(self.reset_frame_limit):
+            if not self._is_alive(lease):
+                return False
+            gamestate = lease.console.step()
+            if gamestate is None:
+                continue
+            if gamestate.menu_state == enums.Menu.CHARACTER_SELECT:
+                for controller in lease.controllers.values():
+                    controller.release_all()
+                return True
+            self._reset_step(gamestate, lease, menu_helper)
+        return False
+
+    def acquire(self, timeout: Optional[float] = None) -> ConsoleLease:
+        """Take an idle instance out of the pool, waiting for one if needed
+
+        Args:
+            timeout (float): Seconds to wait. None waits forever.
+
+        Raises:
+            queue.Empty: If no instance became available in time
+            RuntimeError: If the instance taken had failed to restart, and still
+                doesn't come up. It stays in the pool to be tried again.
+        """
+        if self._closed:
+            raise RuntimeError("DolphinPool is closed")
+        lease = self._idle.get(timeout=timeout)
+        if isinstance(lease, _DeadSlot):
+            lease = self._try_start(lease.index)
+            if isinstance(lease, _DeadSlot):
+                self._idle.put(lease)
+                raise RuntimeError(f"Dolphin instance {lease.index} is down") from lease.error
+        lease.games += 1
+        return lease
+
+    def release(self, lease: ConsoleLease, reset: bool = True):
+        """Return an instance to the pool
+
+        Args:
+            lease (ConsoleLease): The instance returned by acquire()
+            reset (bool): Navigate back to the character select screen first.
+                Only skip this if the instance is already there.
+        """
+        if self._closed:
+            return
+        try:
+            healthy = self._is_alive(lease) and (not reset or self.reset(lease))
+        except (BrokenPipeError, OSError) as error:
+            logging.warning("Dolphin instance %d failed to reset: %s", lease.index, error)
+            healthy = False
+        self._idle.put(lease if healthy else self._restart(lease))
+
+    @contextlib.contextmanager
+    def lease(self, timeout: Optional[float] = None) -> Iterator[ConsoleLease]:
+        """Context manager that acquires an instance and releases it afterwards"""
+        lease = self.acquire(timeout)
+        try:
+            yield lease
+        finally:
+            self.release(lease)
+
+    def close(self):
+        """Stop every instance, including the ones that are leased out"""
+        self._closed = True
+        with self._lock:
+            leases = list(self._leases)
+        for lease in leases:
+            if lease is not None:
+                self._stop(lease)
+        self._leases = []
+        if self._owns_ports:
+            launcher.release_ports(self.slippi_ports)
+            self._owns_ports = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,202 @@
+"""Opt-in instrumentation for Console.step
+
+Attach a Profiler to a Console to find out where the time goes each frame:
+waiting on the stream, decoding messages, parsing game events, post-processing
+the gamestate or flushing controllers. When no profiler is attached the
+Console only pays for a few `is None` checks per frame.
+"""
+
+import dataclasses
+import enum
+import time
+from typing import Callable, Optional
+
+class Phase(enum.Enum):
+    """The parts of Console.step that are timed separately"""
+    FLUSH = "flush"
+    """Flushing controller inputs to dolphin"""
+    RECV = "recv"
+    """Waiting for the next message from the pipe, or reading it off the SLP file"""
+    DECODE = "decode"
+    """JSON and base64 decoding of Slippstream messages"""
+    PARSE = "parse"
+    """Parsing the binary game and menu events into the GameState"""
+    FIXUP = "fixup"
+    """Post-processing such as action frame re-indexing"""
+    FRAME = "frame"
+    """The whole step() call"""
+
+class Histogram:
+    """Log-linear latency histogram in the style of HdrHistogram
+
+    Values are bucketed with a constant relative precision of 2 ** -sub_bucket_bits,
+    so memory stays small no matter how large the recorded values get.
+    """
+    def __init__(self, sub_bucket_bits: int = 5):
+        self._sub_bucket_bits = sub_bucket_bits
+        self._sub_bucket_count = 1 << sub_bucket_bits
+        self._half_count = self._sub_bucket_count >> 1
+        # Enough buckets for 64-bit values
+        self._counts = [0] * ((64 - sub_bucket_bits + 2) * self._half_count)
+        self.count = 0
+        """(int): Number of recorded values"""
+        self.total = 0
+        """(int): Sum of all recorded values"""
+        self.min = 0
+        """(int): Smallest recorded value"""
+        self.max = 0
+        """(int): Largest recorded value"""
+
+    def _index(self, value: int) -> int:
+        if value < self._sub_bucket_count:
+            return value
+        shift = value.bit_length() - self._sub_bucket_bits
+        return shift * self._half_count + (value >> shift)
+
+    def _lowest_value(self, index: int) -> int:
+        if index < self._sub_bucket_count:
+            return index
+        shift = index // self._half_count - 1
+        return (index - shift * self._half_count) << shift
+
+    def record(self, value: int):
+        """Record a single (non-negative integer) value"""
+        value = max(int(value), 0)
+        self._counts[self._index(value)] += 1
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    @property
+    def mean(self) -> float:
+        """(float): Mean of all recorded values"""
+        return self.total / self.count if self.count else 0.
+
+    def percentile(self, percentile: float) -> int:
+        """Return the value below which the given percentage of values fall
+
+        Args:
+            percentile (float): Between 0 and 100
+        """
+        if self.count == 0:
+            return 0
+        threshold = max(1, round(self.count * percentile / 100))
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= threshold:
+                return min(self._lowest_value(index), self.max)
+        return self.max
+
+    def merge(self, other: 'Histogram'):
+        """Add the values recorded by another histogram with the same precision"""
+        if other._sub_bucket_bits != self._sub_bucket_bits:
+            raise ValueError("Can only merge histograms with the same precision")
+        for index, count in enumerate(other._counts):
+            self._counts[index] += count
+        if other.count:
+            self.min = other.min if self.count == 0 else min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    def reset(self):
+        """Forget all recorded values"""
+        self._counts = [0] * len(self._counts)
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def summary(self) -> dict:
+        """Return the usual summary statistics as a dict"""
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9),
+            "max": self.max,
+        }
+
+@dataclasses.dataclass(slots=True)
+class FrameProfile:
+    """Timings for a single call to Console.step"""
+    frame: Optional[int]
+    """(int): The frame of the returned gamestate. None if step() returned None"""
+    timings: dict[Phase, int]
+    """(dict of Phase to int): Nanoseconds spent in each phase"""
+
+class Profiler:
+    """Collects per-phase timings and counters from a Console
+
+    Usage:
+        profiler = melee.Profiler()
+        console = melee.Console(..., profiler=profiler)
+        ...
+        print(profiler.summary())
+
+    Callbacks registered with add_callback are called with a FrameProfile
+    at the end of each step, which is the hook for exporting to other systems.
+    """
+    def __init__(self, callbacks: Optional[list[Callable[[FrameProfile], None]]] = None):
+        self.histograms = {phase: Histogram() for phase in Phase}
+        """(dict of Phase to Histogram): Latency histograms, in nanoseconds"""
+        self.counters: dict[str, int] = {}
+        """(dict of str to int): Event counters, such as 'rollback_frames_skipped'"""
+        self._callbacks = list(callbacks or [])
+        self._timings = {phase: 0 for phase in Phase}
+        self._frame_start = 0
+
+    def add_callback(self, callback: Callable[[FrameProfile], None]):
+        """Register a function to be called with the FrameProfile of every step"""
+        self._callbacks.append(callback)
+
+    def start_frame(self):
+        """Mark the beginning of a step"""
+        for phase in self._timings:
+            self._timings[phase] = 0
+        self._frame_start = time.perf_counter_ns()
+
+    def add(self, phase: Phase, nanoseconds: int):
+        """Attribute some time to the given phase of the current step"""
+        self._timings[phase] += nanoseconds
+
+    def increment(self, counter: str, amount: int = 1):
+        """Increment a named counter"""
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def end_frame(self, frame: Optional[int]):
+        """Mark the end of a step, recording the timings and notifying callbacks
+
+        Args:
+            frame (int): The frame number of the returned gamestate, or None
+        """
+        self._timings[Phase.FRAME] = time.perf_counter_ns() - self._frame_start
+        for phase, nanoseconds in self._timings.items():
+            self.histograms[phase].record(nanoseconds)
+        if frame is None:
+            self.increment("empty_steps")
+        if self._callbacks:
+            profile = FrameProfile(
+                None if frame is None else int(frame), dict(self._timings))
+            for callback in self._callbacks:
+                callback(profile)
+
+    def reset(self):
+        """Clear all histograms and counters"""
+        for histogram in self.histograms.values():
+            histogram.reset()
+        self.counters = {}
+
+    def summary(self) -> dict:
+        """Return histogram summaries (in nanoseconds) and counters as a JSON-friendly dict"""
+        return {
+            "phases": {phase.value: histogram.summary() for phase, histogram in self.histograms.items()},
+            "counters": dict(self.counters),
+        }
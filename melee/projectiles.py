@@ -0,0 +1,235 @@
+"""Projectiles followed across frames by their spawn ID
+
+gamestate.projectiles is a fresh list of Projectile objects every frame, with
+nothing linking a projectile on one frame to the same one on the next. A
+ProjectileTracker instead keeps one record per projectile, keyed by the spawn ID
+Slippi gives every item, with its owner and the frames it spawned and despawned
+on. The positions and speeds of the live projectiles are numpy arrays that are
+updated in place. With trajectories=True it also keeps every frame of every
+projectile, as one table.
+
+Usage:
+    console = melee.Console(..., track_projectiles=True)
+    while (gamestate := console.step()) is not None:
+        tracker = console.projectile_tracker
+        positions = tracker.positions  # shape (live projectiles, 2)
+"""
+
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+from melee.gamestate import Projectile
+
+ITEM_DTYPE = np.dtype([
+    ("spawn_id", np.uint32), ("type", np.uint16), ("subtype", np.uint8), ("owner", np.int8),
+    ("position", np.float32, (2,)), ("speed", np.float32, (2,))])
+"""One projectile on one frame, as ProjectileTracker.update() takes them. Owner is a port, like Projectile.owner."""
+
+RECORD_DTYPE = np.dtype([
+    ("spawn_id", np.uint32), ("type", np.uint16), ("subtype", np.uint8), ("owner", np.int8),
+    ("spawn_frame", np.int32), ("despawn_frame", np.int32)])
+"""One projectile over its life. despawn_frame is the first frame it's gone, or -1 while it's live."""
+
+SAMPLE_DTYPE = np.dtype([
+    ("record", np.int32), ("frame", np.int32), ("position", np.float32, (2,)), ("speed", np.float32, (2,))])
+"""One projectile on one frame of a trajectory table. record is its index in ProjectileTracker.records."""
+
+@lru_cache
+def _event_dtype(event_size: int) -> np.dtype:
+    """Where the values of ITEM_DTYPE are in raw ITEM_UPDATE events, SLP 3.6.0 and up"""
+    return np.dtype({
+        "names": ["type", "subtype", "speed_x", "speed_y", "x", "y", "spawn_id", "owner"],
+        "formats": [">u2", "u1", ">f4", ">f4", ">f4", ">f4", ">u4", "i1"],
+        "offsets": [0x5, 0x7, 0xc, 0x10, 0x14, 0x18, 0x22, 0x2A],
+        "itemsize": event_size})
+
+def items_from_events(events: list[bytes], event_size: int) -> np.ndarray:
+    """Decode a frame's raw ITEM_UPDATE events all at once, without making Projectiles
+
+    Args:
+        events (list of bytes): The events, each cut to event_size
+        event_size (int): Size of an ITEM_UPDATE event, including its command byte
+
+    Returns:
+        An array of ITEM_DTYPE
+    """
+    if not events:
+        return np.empty(0, ITEM_DTYPE)
+    raw = np.frombuffer(b"".join(events), _event_dtype(event_size))
+    items = np.empty(len(raw), ITEM_DTYPE)
+    for name in ("spawn_id", "type", "subtype"):
+        items[name] = raw[name]
+    # 0-3 for the player that owns the item, -1 when not owned
+    items["owner"] = raw["owner"] + 1
+    items["position"][:, 0] = raw["x"]
+    items["position"][:, 1] = raw["y"]
+    items["speed"][:, 0] = raw["speed_x"]
+    items["speed"][:, 1] = raw["speed_y"]
+    return items
+
+def items_from_projectiles(projectiles: list[Projectile]) -> np.ndarray:
+    """Convert gamestate.projectiles to an array of ITEM_DTYPE"""
+    return np.array([
+        (projectile.spawn_id, projectile.type.value, projectile.subtype, projectile.owner,
+         (projectile.position.x, projectile.position.y), (projectile.speed.x, projectile.speed.y))
+        for projectile in projectiles], ITEM_DTYPE)
+
+def _grown(array: np.ndarray) -> np.ndarray:
+    """A copy of array with twice the rows"""
+    grown = np.zeros((2 * len(array),) + array.shape[1:], array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+class ProjectileTracker:
+    """Keeps a record of each projectile across frames, by spawn ID
+
+    Console(track_projectiles=True) makes one and updates it with every frame
+    step() returns, straight from the raw item events. It starts over with each
+    game. Or update() one yourself, such as with items_from_projectiles().
+    """
+    def __init__(self, trajectories: bool = False):
+        """
+        Args:
+            trajectories (bool): Also keep the position and speed of every
+                projectile on every frame, see the trajectories attribute
+        """
+        self._trajectories = trajectories
+        self.clear()
+
+    def clear(self):
+        """Forget every projectile"""
+        self._frame: Optional[int] = None
+        # Spawn ID to slot in the live arrays, which are kept packed at the front
+        self._slots: dict[int, int] = {}
+        self._live = 0
+        self._live_ids = np.zeros(16, np.uint32)
+        self._live_records = np.zeros(16, np.intp)
+        self._positions = np.zeros((16, 2), np.float32)
+        self._speeds = np.zeros((16, 2), np.float32)
+        self._records = np.zeros(64, RECORD_DTYPE)
+        self._record_count = 0
+        self._samples = np.zeros(1024, SAMPLE_DTYPE) if self._trajectories else None
+        self._sample_count = 0
+
+    def update(self, frame: int, items: np.ndarray):
+        """Take in a frame's projectiles
+
+        Projectiles that weren't live yet spawn on this frame, and ones that are
+        missing despawn on it. Frames that aren't after the last one, such as
+        rollbacks, are ignored.
+
+        Args:
+            frame (int): The frame number
+            items (np.ndarray): The frame's projectiles, of ITEM_DTYPE
+        """
+        if self._frame is not None and frame <= self._frame:
+            return
+        self._frame = frame
+        spawn_ids = items["spawn_id"].tolist()
+        for spawn_id in self._slots.keys() - set(spawn_ids):
+            self._despawn(spawn_id, frame)
+
+        slots = np.empty(len(spawn_ids), np.intp)
+        for i, spawn_id in enumerate(spawn_ids):
+            slot = self._slots.get(spawn_id)
+            if slot is None:
+                slot = self._spawn(items[i], frame)
+            slots[i] = slot
+        self._positions[slots] = items["position"]
+        self._speeds[slots] = items["speed"]
+
+        if self._samples is not None and len(items):
+            end = self._sample_count + len(items)
+            while end > len(self._samples):
+                self._samples = _grown(self._samples)
+            samples = self._samples[self._sample_count:end]
+            samples["record"] = self._live_records[slots]
+            samples["frame"] = frame
+            samples["position"] = items["position"]
+            samples["speed"] = items["speed"]
+            self._sample_count = end
+
+    def _spawn(self, item: np.void, frame: int) -> int:
+        if self._record_count == len(self._records):
+            self._records = _grown(self._records)
+        record = self._record_count
+        self._records[record] = (item["spawn_id"], item["type"], item["subtype"], item["owner"], frame, -1)
+        self._record_count += 1
+
+        if self._live == len(self._live_ids):
+            self._live_ids = _grown(self._live_ids)
+            self._live_records = _grown(self._live_records)
+            self._positions = _grown(self._positions)
+            self._speeds = _grown(self._speeds)
+        slot = self._live
+        self._live_ids[slot] = item["spawn_id"]
+        self._live_records[slot] = record
+        self._slots[int(item["spawn_id"])] = slot
+        self._live += 1
+        return slot
+
+    def _despawn(self, spawn_id: int, frame: int):
+        slot = self._slots.pop(spawn_id)
+        self._records["despawn_frame"][self._live_records[slot]] = frame
+        # Move the last live projectile into the gap
+        last = self._live - 1
+        if slot != last:
+            self._live_ids[slot] = self._live_ids[last]
+            self._live_records[slot] = self._live_records[last]
+            self._positions[slot] = self._positions[last]
+            self._speeds[slot] = self._speeds[last]
+            self._slots[int(self._live_ids[slot])] = slot
+        self._live = last
+
+    def __len__(self) -> int:
+        """The number of live projectiles"""
+        return self._live
+
+    @property
+    def spawn_ids(self) -> np.ndarray:
+        """(np.ndarray): Spawn IDs of the live projectiles, shape (live,)"""
+        return self._live_ids[:self._live]
+
+    @property
+    def positions(self) -> np.ndarray:
+        """(np.ndarray): x, y positions of the live projectiles, shape (live, 2), in the order of spawn_ids"""
+        return self._positions[:self._live]
+
+    @property
+    def speeds(self) -> np.ndarray:
+        """(np.ndarray): x, y speeds of the live projectiles, shape (live, 2), in the order of spawn_ids"""
+        return self._speeds[:self._live]
+
+    @property
+    def live_records(self) -> np.ndarray:
+        """(np.ndarray): Index in records of each live projectile, in the order of spawn_ids"""
+        return self._live_records[:self._live]
+
+    @property
+    def records(self) -> np.ndarray:
+        """(np.ndarray): Every projectile seen so far, in the order they spawned, of RECORD_DTYPE"""
+        return self._records[:self._record_count]
+
+    @property
+    def trajectories(self) -> Optional[np.ndarray]:
+        """(np.ndarray): Every projectile on every frame, of SAMPLE_DTYPE, if trajectories is set"""
+        if self._samples is None:
+            return None
+        return self._samples[:self._sample_count]
+
+    def trajectory(self, spawn_id: int) -> np.ndarray:
+        """Every frame of the latest projectile with a spawn ID, of SAMPLE_DTYPE
+
+        Raises:
+            ValueError: If trajectories isn't set
+            KeyError: If there hasn't been a projectile with that spawn ID
+        """
+        if self._samples is None:
+            raise ValueError("Trajectories are only kept with trajectories=True")
+        records = np.flatnonzero(self.records["spawn_id"] == spawn_id)
+        if not len(records):
+            raise KeyError(spawn_id)
+        samples = self.trajectories
+        return samples[samples["record"] == records[-1]]
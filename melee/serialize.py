@@ -0,0 +1,498 @@
+"""Compact binary serialization of gamestates, whole or as deltas
+
+Pickling a GameState is slow and bulky, since every enum, numpy scalar and
+nested dataclass goes into the pickle along with its class. to_bytes() instead
+packs the values into a fixed, versioned layout. delta() packs only the fields
+that changed since the previous gamestate, and most of them don't change from
+one frame to the next.
+
+Usage:
+    encoder = melee.GameStateEncoder()
+    while (gamestate := console.step()) is not None:
+        connection.send_bytes(encoder.encode(gamestate))
+
+    decoder = melee.GameStateDecoder()
+    gamestate = decoder.decode(connection.recv_bytes())
+
+A decoded gamestate has the same values as the one that was encoded, but as
+plain Python numbers rather than numpy scalars. GameState.custom isn't
+serialized, and the ecb_top/bottom/left/right tuples are rebuilt from ecb.
+
+Layout, all little-endian:
+    header: format version (u8), keyframe or delta (u8)
+    game fields: all of them, or a u64 bitmask of the changed ones then those
+    game info flag (u8), then the GameInfo if it's a keyframe or it changed
+    stage-specific state: which are present (u8), then those
+    players: count (u8), then for each its port (u8), flags (u8), its fields
+        whole or as a delta like the game's, its own PlayerInfo when it isn't
+        the game's, and Nana the same way
+    projectiles: count (u16), then each one whole
+"""
+
+import struct
+from typing import Callable, Optional
+
+from melee import enums
+from melee.gamestate import (
+    FoDPlatforms, GameInfo, GameState, PlayerInfo, PlayerState, Projectile,
+    StadiumTransformation, StadiumTransformationEvent, StadiumTransformationType,
+    UnknownAnimation, UnknownProjectileType, WhispyBlowDirection)
+
+FORMAT_VERSION = 1
+"""Version of the layout, the first byte of every encoded gamestate"""
+
+_KEYFRAME = 0
+_DELTA = 1
+
+_HEADER = struct.Struct("<BB")
+_MASK = struct.Struct("<Q")
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+
+class _Record:
+    """A fixed list of scalar fields, packed whole or as a bitmask of the ones that changed"""
+    def __init__(self, fields: list[tuple[str, str, str]]):
+        """
+        Args:
+            fields (list): For each field, its struct format code, an expression
+                getting its value from `obj`, and a statement setting it on `obj`
+                with {} in place of the value. They're compiled into a single
+                function for getting all of them and one for setting them, which
+                is several times faster than calling a function per field.
+        """
+        assert len(fields) <= 64, "Changed fields are a u64 bitmask"
+        self._codes = [code for code, _, _ in fields]
+        self._whole = struct.Struct("<" + "".join(self._codes))
+        # Changed fields mask to their indices and struct, see unpack_delta
+        self._delta_layouts: dict[int, tuple[list[int], struct.Struct]] = {}
+        source = "def values(obj):\n    return (" + "".join(f"{getter}, " for _, getter, _ in fields) + ")\n"
+        source += "def apply(obj, values):\n" + "".join(
+            "    " + setter.format(f"values[{i}]") + "\n" for i, (_, _, setter) in enumerate(fields))
+        compiled = {}
+        exec(source, globals(), compiled)
+        self.values: Callable[[object], tuple] = compiled["values"]
+        self.apply: Callable[[object, tuple], None] = compiled["apply"]
+
+    def pack(self, values: tuple, out: bytearray):
+        out += self._whole.pack(*values)
+
+    def pack_delta(self, prev_values: tuple, values: tuple, out: bytearray):
+        mask = 0
+        codes = "<"
+        changed = []
+        for i, (prev, value) in enumerate(zip(prev_values, values)):
+            # NaN is never equal to itself, so it's always sent. That's fine.
+            if prev != value:
+                mask |= 1 << i
+                codes += self._codes[i]
+                changed.append(value)
+        out += _MASK.pack(mask)
+        if changed:
+            out += struct.pack(codes, *changed)
+
+    def unpack(self, data: bytes, offset: int) -> tuple[tuple, int]:
+        return self._whole.unpack_from(data, offset), offset + self._whole.size
+
+    def unpack_delta(self, prev_values: tuple, data: bytes, offset: int) -> tuple[tuple, int]:
+        mask, = _MASK.unpack_from(data, offset)
+        offset += _MASK.size
+        if not mask:
+            return prev_values, offset
+        layout = self._delta_layouts.get(mask)
+        if layout is None:
+            indices = [i for i in range(len(self._codes)) if mask & (1 << i)]
+            layout = indices, struct.Struct("<" + "".join(self._codes[i] for i in indices))
+            # The same few fields change frame after frame, so there are only so many masks
+            self._delta_layouts[mask] = layout
+        indices, changed_struct = layout
+        values = list(prev_values)
+        for i, value in zip(indices, changed_struct.unpack_from(data, offset)):
+            values[i] = value
+        return tuple(values), offset + changed_struct.size
+
+def _action(value: int) -> enums.Action | UnknownAnimation:
+    try:
+        return enums.Action(value)
+    except ValueError:
+        return UnknownAnimation(value)
+
+def _projectile_type(value: int) -> enums.ProjectileType | UnknownProjectileType:
+    try:
+        return enums.ProjectileType(value)
+    except ValueError:
+        return UnknownProjectileType(value)
+
+def _field(code: str, name: str) -> tuple[str, str, str]:
+    return code, f"obj.{name}", f"obj.{name} = {{}}"
+
+def _enum_field(code: str, name: str, convert: str) -> tuple[str, str, str]:
+    """An enum, packed as its value and converted back by the function named `convert`"""
+    return code, f"obj.{name}.value", f"obj.{name} = {convert}({{}})"
+
+def _int_field(name: str) -> tuple[str, str, str]:
+    """An int that Melee stores as a float, so packs losslessly as one"""
+    return "f", f"obj.{name}", f"obj.{name} = int({{}})"
+
+def _position_fields(name: str) -> list[tuple[str, str, str]]:
+    return [_field("f", f"{name}.x"), _field("f", f"{name}.y")]
+
+def _ecb_fields(edge: str) -> list[tuple[str, str, str]]:
+    return _position_fields(f"ecb.{edge}")
+
+def _controller_field(code: str, name: str) -> tuple[str, str, str]:
+    return _field(code, f"controller_state.{name}")
+
+def _stick_fields(code: str, name: str) -> list[tuple[str, str, str]]:
+    stick = f"obj.controller_state.{name}"
+    return [
+        (code, f"{stick}[0]", f"{stick} = ({{}}, {stick}[1])"),
+        (code, f"{stick}[1]", f"{stick} = ({stick}[0], {{}})"),
+    ]
+
+_GAME = _Record([
+    _field("i", "frame"),
+    _enum_field("B", "stage", "enums.Stage"),
+    _enum_field("B", "menu_state", "enums.Menu"),
+    _enum_field("B", "submenu", "enums.SubMenu"),
+    _field("?", "ready_to_start"),
+    _field("?", "is_teams"),
+    _field("d", "distance"),
+    _field("i", "menu_selection"),
+])
+
+_PLAYER = _Record([
+    _enum_field("B", "character", "enums.Character"),
+    _enum_field("B", "character_selected", "enums.Character"),
+    *_position_fields("position"),
+    _field("f", "percent"),
+    _field("f", "shield_strength"),
+    _field("?", "is_powershield"),
+    _field("B", "stock"),
+    _field("?", "facing"),
+    _enum_field("H", "action", "_action"),
+    _int_field("action_frame"),
+    _field("?", "invulnerable"),
+    _field("i", "invulnerability_left"),
+    _int_field("hitlag_left"),
+    _int_field("hitstun_frames_left"),
+    _field("B", "jumps_left"),
+    _field("?", "on_ground"),
+    _field("f", "speed_air_x_self"),
+    _field("f", "speed_y_self"),
+    _field("f", "speed_x_attack"),
+    _field("f", "speed_y_attack"),
+    _field("f", "speed_ground_x_self"),
+    *_position_fields("cursor"),
+    _field("?", "coin_down"),
+    _enum_field("B", "controller_status", "enums.ControllerStatus"),
+    _field("?", "off_stage"),
+    _field("?", "iasa"),
+    _field("?", "moonwalkwarning"),
+    _field("?", "is_holding_cpu_slider"),
+    _controller_field("H", "buttons"),
+    _controller_field("I", "processed_buttons"),
+    *_stick_fields("f", "main_stick"),
+    *_stick_fields("f", "c_stick"),
+    *_stick_fields("b", "raw_main_stick"),
+    _controller_field("f", "l_shoulder"),
+    _controller_field("f", "r_shoulder"),
+    *_ecb_fields("top"),
+    *_ecb_fields("bottom"),
+    *_ecb_fields("left"),
+    *_ecb_fields("right"),
+])
+
+_PROJECTILE = struct.Struct("<ffffbHfBI")
+_PLAYER_INFO = struct.Struct("<BBB")
+_FOD = struct.Struct("<ff")
+_STADIUM = struct.Struct("<BB")
+
+# Player flags
+_WHOLE = 1
+_HAS_NANA = 2
+_OWN_INFO = 4
+
+# Stage-specific state that's present
+_HAS_FOD = 1
+_HAS_WHISPY = 2
+_HAS_STADIUM = 4
+
+def _pack_str(value: str, out: bytearray):
+    encoded = value.encode()
+    out += _U16.pack(len(encoded))
+    out += encoded
+
+def _unpack_str(data: bytes, offset: int) -> tuple[str, int]:
+    length, = _U16.unpack_from(data, offset)
+    offset += _U16.size
+    return bytes(data[offset:offset+length]).decode(), offset + length
+
+def _pack_player_info(info: PlayerInfo, out: bytearray):
+    out += _PLAYER_INFO.pack(info.costume, info.cpu_level, info.team_id)
+    _pack_str(info.nickName, out)
+    _pack_str(info.connectCode, out)
+    _pack_str(info.displayName, out)
+
+def _unpack_player_info(data: bytes, offset: int) -> tuple[PlayerInfo, int]:
+    costume, cpu_level, team_id = _PLAYER_INFO.unpack_from(data, offset)
+    offset += _PLAYER_INFO.size
+    nick_name, offset = _unpack_str(data, offset)
+    connect_code, offset = _unpack_str(data, offset)
+    display_name, offset = _unpack_str(data, offset)
+    return PlayerInfo(costume, cpu_level, team_id, nick_name, connect_code, display_name), offset
+
+def _pack_game_info(info: GameInfo, out: bytearray):
+    _pack_str(info.playedOn, out)
+    _pack_str(info.startAt, out)
+    _pack_str(info.consoleNick, out)
+    for player_info in info.players:
+        _pack_player_info(player_info, out)
+
+def _unpack_game_info(data: bytes, offset: int) -> tuple[GameInfo, int]:
+    played_on, offset = _unpack_str(data, offset)
+    start_at, offset = _unpack_str(data, offset)
+    console_nick, offset = _unpack_str(data, offset)
+    players = []
+    for _ in range(4):
+        player_info, offset = _unpack_player_info(data, offset)
+        players.append(player_info)
+    return GameInfo(played_on, start_at, console_nick, tuple(players)), offset
+
+def _pack_player(player: PlayerState, prev: Optional[PlayerState], shared_info: PlayerInfo, out: bytearray):
+    flags = 0
+    if prev is None:
+        flags |= _WHOLE
+    if player.nana is not None:
+        flags |= _HAS_NANA
+    if player.info is not shared_info and player.info != shared_info:
+        flags |= _OWN_INFO
+    out += _U8.pack(flags)
+    values = _PLAYER.values(player)
+    if prev is None:
+        _PLAYER.pack(values, out)
+    else:
+        _PLAYER.pack_delta(_PLAYER.values(prev), values, out)
+    if flags & _OWN_INFO:
+        _pack_player_info(player.info, out)
+    if player.nana is not None:
+        _pack_player(player.nana, prev.nana if prev is not None else None, shared_info, out)
+
+def _unpack_player(data: bytes, offset: int, prev: Optional[PlayerState],
+                   shared_info: PlayerInfo) -> tuple[PlayerState, int]:
+    flags = data[offset]
+    offset += 1
+    if flags & _WHOLE:
+        values, offset = _PLAYER.unpack(data, offset)
+    else:
+        if prev is None:
+            raise ValueError("Gamestate delta for a player that isn't in the previous gamestate")
+        values, offset = _PLAYER.unpack_delta(_PLAYER.values(prev), data, offset)
+    player = PlayerState()
+    _PLAYER.apply(player, values)
+    ecb = player.ecb
+    player.ecb_top = (ecb.top.x, ecb.top.y)
+    player.ecb_bottom = (ecb.bottom.x, ecb.bottom.y)
+    player.ecb_left = (ecb.left.x, ecb.left.y)
+    player.ecb_right = (ecb.right.x, ecb.right.y)
+    if flags & _OWN_INFO:
+        player.info, offset = _unpack_player_info(data, offset)
+    else:
+        player.info = shared_info
+    if flags & _HAS_NANA:
+        player.nana, offset = _unpack_player(
+            data, offset, prev.nana if prev is not None else None, shared_info)
+    return player, offset
+
+def _pack_stage(gamestate: GameState, out: bytearray):
+    present = 0
+    if gamestate.fod_platforms is not None:
+        present |= _HAS_FOD
+    if gamestate.whispy is not None:
+        present |= _HAS_WHISPY
+    if gamestate.stadium_transformation is not None:
+        present |= _HAS_STADIUM
+    out += _U8.pack(present)
+    if present & _HAS_FOD:
+        out += _FOD.pack(gamestate.fod_platforms.left, gamestate.fod_platforms.right)
+    if present & _HAS_WHISPY:
+        out += _U8.pack(gamestate.whispy.value)
+    if present & _HAS_STADIUM:
+        transformation = gamestate.stadium_transformation
+        out += _STADIUM.pack(transformation.event.value, transformation.type.value)
+
+def _unpack_stage(gamestate: GameState, data: bytes, offset: int) -> int:
+    present = data[offset]
+    offset += 1
+    if present & _HAS_FOD:
+        gamestate.fod_platforms = FoDPlatforms(*_FOD.unpack_from(data, offset))
+        offset += _FOD.size
+    if present & _HAS_WHISPY:
+        gamestate.whispy = WhispyBlowDirection(data[offset])
+        offset += 1
+    if present & _HAS_STADIUM:
+        event, kind = _STADIUM.unpack_from(data, offset)
+        gamestate.stadium_transformation = StadiumTransformation(
+            StadiumTransformationEvent(event), StadiumTransformationType(kind))
+        offset += _STADIUM.size
+    return offset
+
+def _pack_projectiles(projectiles: list[Projectile], out: bytearray):
+    out += _U16.pack(len(projectiles))
+    for projectile in projectiles:
+        out += _PROJECTILE.pack(
+            projectile.position.x, projectile.position.y, projectile.speed.x, projectile.speed.y,
+            projectile.owner, projectile.type.value, projectile.expiration_frames, projectile.subtype,
+            projectile.spawn_id)
+
+def _unpack_projectiles(data: bytes, offset: int) -> tuple[list[Projectile], int]:
+    count, = _U16.unpack_from(data, offset)
+    offset += _U16.size
+    projectiles = []
+    for _ in range(count):
+        x, y, speed_x, speed_y, owner, kind, expiration, subtype, spawn_id = \
+            _PROJECTILE.unpack_from(data, offset)
+        offset += _PROJECTILE.size
+        projectile = Projectile(owner=owner, type=_projectile_type(kind),
+                                expiration_frames=int(expiration), subtype=subtype, spawn_id=spawn_id)
+        projectile.position.x, projectile.position.y = x, y
+        projectile.speed.x, projectile.speed.y = speed_x, speed_y
+        projectiles.append(projectile)
+    return projectiles, offset
+
+def _pack(gamestate: GameState, prev: Optional[GameState]) -> bytes:
+    out = bytearray(_HEADER.pack(FORMAT_VERSION, _KEYFRAME if prev is None else _DELTA))
+    values = _GAME.values(gamestate)
+    if prev is None:
+        _GAME.pack(values, out)
+    else:
+        _GAME.pack_delta(_GAME.values(prev), values, out)
+
+    info = gamestate.info
+    if prev is None or (info is not prev.info and info != prev.info):
+        out += _U8.pack(1)
+        _pack_game_info(info, out)
+    else:
+        out += _U8.pack(0)
+
+    _pack_stage(gamestate, out)
+
+    out += _U8.pack(len(gamestate.players))
+    for port, player in gamestate.players.items():
+        out += _U8.pack(port)
+        _pack_player(player, prev.players.get(port) if prev is not None else None,
+                     info.players[port-1], out)
+
+    _pack_projectiles(gamestate.projectiles, out)
+    return bytes(out)
+
+def to_bytes(gamestate: GameState) -> bytes:
+    """A whole gamestate, as a keyframe that decodes on its own
+
+    Args:
+        gamestate (gamestate.GameState): The gamestate to encode
+    """
+    return _pack(gamestate, None)
+
+def delta(prev: GameState, cur: GameState) -> bytes:
+    """Just what changed from one gamestate to the next
+
+    Decode it with from_bytes(data, prev), where prev is the decoded previous gamestate.
+
+    Args:
+        prev (gamestate.GameState): The previous gamestate, that the receiver already has
+        cur (gamestate.GameState): The gamestate to encode
+    """
+    return _pack(cur, prev)
+
+def is_keyframe(data: bytes) -> bool:
+    """Whether encoded data decodes without a previous gamestate, from to_bytes() rather than delta()"""
+    return data[1] == _KEYFRAME
+
+def from_bytes(data: bytes, prev: Optional[GameState] = None) -> GameState:
+    """Decode a gamestate from to_bytes() or delta()
+
+    Args:
+        data (bytes): The encoded gamestate
+        prev (gamestate.GameState): The previous decoded gamestate. Needed for deltas.
+
+    Raises:
+        ValueError: If the data is from another format version, or is a delta without prev
+    """
+    version, kind = _HEADER.unpack_from(data, 0)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Can't decode gamestate format version {version}, only {FORMAT_VERSION}")
+    if kind == _DELTA and prev is None:
+        raise ValueError("A gamestate delta needs the previous gamestate to apply to")
+    if kind == _KEYFRAME:
+        prev = None
+    offset = _HEADER.size
+
+    gamestate = GameState()
+    if prev is None:
+        values, offset = _GAME.unpack(data, offset)
+    else:
+        values, offset = _GAME.unpack_delta(_GAME.values(prev), data, offset)
+    _GAME.apply(gamestate, values)
+
+    has_info = data[offset]
+    offset += 1
+    if has_info:
+        gamestate.info, offset = _unpack_game_info(data, offset)
+    else:
+        gamestate.info = prev.info
+
+    offset = _unpack_stage(gamestate, data, offset)
+
+    count = data[offset]
+    offset += 1
+    for _ in range(count):
+        port = data[offset]
+        offset += 1
+        gamestate.players[port], offset = _unpack_player(
+            data, offset, prev.players.get(port) if prev is not None else None,
+            gamestate.info.players[port-1])
+
+    gamestate.projectiles, offset = _unpack_projectiles(data, offset)
+    return gamestate
+
+class GameStateEncoder:
+    """Encodes a stream of gamestates as occasional keyframes, and deltas in between"""
+    def __init__(self, keyframe_interval: int = 600):
+        """
+        Args:
+            keyframe_interval (int): Send a whole gamestate every this many, so a
+                receiver that joins late or misses one catches up. 0 for only the first.
+        """
+        self.keyframe_interval = keyframe_interval
+        self._prev: Optional[GameState] = None
+        self._since_keyframe = 0
+
+    def encode(self, gamestate: GameState) -> bytes:
+        """The next gamestate of the stream, as a keyframe or a delta from the last one"""
+        if self._prev is None or (self.keyframe_interval and self._since_keyframe >= self.keyframe_interval):
+            data = to_bytes(gamestate)
+            self._since_keyframe = 0
+        else:
+            data = delta(self._prev, gamestate)
+        self._since_keyframe += 1
+        self._prev = gamestate
+        return data
+
+    def reset(self):
+        """Make the next gamestate a keyframe, such as when a new receiver connects"""
+        self._prev = None
+
+class GameStateDecoder:
+    """Decodes a stream from GameStateEncoder back into whole gamestates"""
+    def __init__(self):
+        self._prev: Optional[GameState] = None
+
+    def decode(self, data: bytes) -> GameState:
+        """The next gamestate of the stream
+
+        Raises:
+            ValueError: If it's a delta and there hasn't been a keyframe yet
+        """
+        gamestate = from_bytes(data, self._prev)
+        self._prev = gamestate
+        return gamestate
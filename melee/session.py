@@ -0,0 +1,191 @@
+"""Split the stream of a Console into games
+
+A live Console sees many games back to back. A Session steps the console,
+notices each GAME_START and GAME_END, and produces one Game per game with its
+players, final stocks and result, so that callers don't have to track menu
+changes frame by frame.
+
+Usage:
+    session = melee.Session(console, columns=True)
+    for game in session:
+        print(game.stage, game.end_method, game.winner, len(game.columns))
+"""
+
+import dataclasses
+import time
+from typing import Iterator, Optional
+
+from melee import enums
+from melee.columns import GameColumns
+from melee.console import Console
+from melee.gamestate import GameState
+
+_IN_GAME = (enums.Menu.IN_GAME, enums.Menu.SUDDEN_DEATH)
+
+@dataclasses.dataclass
+class Game:
+    """One game of a Session"""
+    index: int
+    """(int): Position of the game in the session, starting at 0"""
+    slp_version: Optional[tuple[int, int, int]]
+    """(tuple of int): SLP version the game was recorded or streamed with"""
+    stage: enums.Stage
+    """(enums.Stage): The stage the game is played on"""
+    start_time: float
+    """(float): time.time() when the game started"""
+    end_time: Optional[float] = None
+    """(float): time.time() when the game ended. None while it is in progress."""
+    start_at: str = ""
+    """(str): Start timestamp from the replay metadata. Might be blank."""
+    players: dict[int, enums.Character] = dataclasses.field(default_factory=dict)
+    """(dict of int to enums.Character): Character in each port, on the first frame"""
+    frames: int = 0
+    """(int): Number of in-game frames seen"""
+    last_frame: Optional[int] = None
+    """(int): The last frame number seen"""
+    final_stocks: dict[int, int] = dataclasses.field(default_factory=dict)
+    """(dict of int to int): Stocks of each port on the last frame"""
+    final_percent: dict[int, float] = dataclasses.field(default_factory=dict)
+    """(dict of int to float): Damage of each port on the last frame"""
+    end_method: Optional[enums.GameEndMethod] = None
+    """(enums.GameEndMethod): How the game ended. None if the stream was cut off."""
+    lras_initiator: Optional[int] = None
+    """(int): Port that quit with L+R+A+Start, if any"""
+    placements: Optional[dict[int, int]] = None
+    """(dict of int to int): Final placement (0 is first) by port. SLP 3.13.0+ only."""
+    columns: Optional[GameColumns] = None
+    """(columns.GameColumns): Per-frame arrays, if the session collects them"""
+
+    @property
+    def finished(self) -> bool:
+        """(bool): Whether the game is over"""
+        return self.end_time is not None
+
+    @property
+    def duration(self) -> Optional[float]:
+        """(float): Wall clock seconds the game took, once it is finished"""
+        if self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    @property
+    def winner(self) -> Optional[int]:
+        """(int): Port of the winner of a singles game. None for no contests, ties and unfinished games."""
+        if self.placements:
+            first = [port for port, placement in self.placements.items() if placement == 0]
+            return first[0] if len(first) == 1 else None
+        if self.end_method == enums.GameEndMethod.GAME:
+            alive = [port for port, stock in self.final_stocks.items() if stock > 0]
+            return alive[0] if len(alive) == 1 else None
+        if self.end_method == enums.GameEndMethod.TIME and self.final_stocks:
+            ranking = sorted(self.final_stocks,
+                             key=lambda port: (-self.final_stocks[port], self.final_percent[port]))
+            best = ranking[0]
+            if len(ranking) > 1 and (self.final_stocks[ranking[1]], self.final_percent[ranking[1]]) == \
+                    (self.final_stocks[best], self.final_percent[best]):
+                return None
+            return best
+        return None
+
+class Session:
+    """Steps a Console and keeps track of where its games start and end"""
+    def __init__(self, console: Console, columns: bool = False, columns_capacity: int = 4096):
+        """
+        Args:
+            console (console.Console): A connected console
+            columns (bool): Collect each game's frames into a columns.GameColumns
+            columns_capacity (int): Frames to preallocate per game for the columns
+        """
+        self.console = console
+        self._collect_columns = columns
+        self._columns_capacity = columns_capacity
+        self._games_started = console.games_started
+        self._count = 0
+        self.current: Optional[Game] = None
+        """(Game): The game in progress, or the last one if it has finished"""
+        self.games: list[Game] = []
+        """(list of Game): Games finished since the last pop_games()"""
+
+    def _start(self, gamestate: Optional[GameState]):
+        console = self.console
+        self.current = Game(
+            index=self._count,
+            slp_version=console.slp_version_tuple,
+            stage=console._current_stage,
+            start_time=time.time(),
+            start_at=gamestate.startAt if gamestate is not None else "",
+            columns=GameColumns(self._columns_capacity) if self._collect_columns else None,
+        )
+        self._count += 1
+
+    def _finish(self):
+        game = self.current
+        game.end_time = time.time()
+        if self.console.games_started == self._games_started:
+            game.end_method = self.console.game_end_method
+            game.lras_initiator = self.console.lras_initiator
+            if self.console.placements is not None:
+                game.placements = dict(self.console.placements)
+        self.games.append(game)
+
+    @staticmethod
+    def _update(game: Game, gamestate: GameState):
+        if not game.players:
+            game.players = {int(port): player.character for port, player in gamestate.players.items()}
+        game.frames += 1
+        game.last_frame = int(gamestate.frame)
+        game.final_stocks = {int(port): int(player.stock) for port, player in gamestate.players.items()}
+        game.final_percent = {int(port): float(player.percent) for port, player in gamestate.players.items()}
+        if game.columns is not None:
+            game.columns.append(gamestate)
+
+    def step(self) -> Optional[GameState]:
+        """Step the console, updating the current game
+
+        Returns:
+            The gamestate from Console.step()
+        """
+        gamestate = self.console.step()
+
+        if self.console.games_started != self._games_started:
+            # A new game started before the last one ended (such as a replay cut
+            # off without a GAME_END), so finish it without a result
+            if self.current is not None and not self.current.finished:
+                self._finish()
+            self._games_started = self.console.games_started
+            self._start(gamestate)
+
+        game = self.current
+        if game is None or game.finished:
+            return gamestate
+        if gamestate is None:
+            if self.console.game_end_method is not None:
+                self._finish()
+            return gamestate
+        if gamestate.menu_state in _IN_GAME:
+            self._update(game, gamestate)
+        if self.console.game_end_method is not None or gamestate.menu_state not in _IN_GAME:
+            self._finish()
+        return gamestate
+
+    def pop_games(self) -> list[Game]:
+        """Return the games finished since the last call, and forget them"""
+        games, self.games = self.games, []
+        return games
+
+    def close(self):
+        """Finish the game in progress, if any, without a result"""
+        if self.current is not None and not self.current.finished:
+            self._finish()
+
+    def __iter__(self) -> Iterator[Game]:
+        """Step the console until it returns None, yielding each game as it finishes
+
+        The last game is finished at that point even if it didn't end. This suits
+        SLP files and remote streams. For polling consoles, where step() returns
+        None between frames, call step() and pop_games() instead.
+        """
+        while self.step() is not None:
+            yield from self.pop_games()
+        self.close()
+        yield from self.pop_games()
@@ -12,8 +12,14 @@ import json
 import multiprocessing as mp
 from multiprocessing.connection import Connection
 from multiprocessing.synchronize import Event
+import pickle
+import time
+from typing import Iterable, Optional
 
+from melee import affinity
 from melee.enums import Stage
+from melee.profiling import Phase, Profiler
+from melee.serialize import GameStateDecoder
 
 # pylint: disable=too-few-public-methods
 class EventType(Enum):
@@ -47,6 +53,14 @@ class CommType(Enum):
     MENU = 0x04
 
 
+# What the messages of a decoding worker hold, by their first byte. See dispatch_decoded().
+DECODED_GAMESTATE = b"G"
+"""A gamestate, encoded with serialize.GameStateEncoder"""
+DECODED_STATE = b"S"
+"""The pickled console attributes, sent whenever they change"""
+DECODED_ROLLBACK = b"R"
+"""A rollback frame was skipped"""
+
 class SlippstreamWorker:
     def __init__(
         self,
@@ -54,11 +68,21 @@ class SlippstreamWorker:
         port: int,
         buffer: Connection,
         shutdown: Event,
+        connect_timeout: float = 10.,
+        decode: Optional[dict] = None,
     ):
         self.address = address
         self.port = port
+        self.connect_timeout = connect_timeout
         self._buffer = buffer
         self._shutdown = shutdown
+        self._decode = decode
+
+        # Replay metadata, which Console reads from its stream. Not yet supported.
+        self.playedOn = "dolphin"
+        self.timestamp = ""
+        self.consoleNick = ""
+        self.players = {}
 
         self._host = enet.Host(None, 1, 0, 0)
         self._peer = None
@@ -84,8 +108,12 @@ class SlippstreamWorker:
             logging.error(e)
             return False
         try:
-            for _ in range(10):
-                event = self._host.service(1000)
+            deadline = time.perf_counter() + self.connect_timeout
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                event = self._host.service(max(1, min(1000, int(remaining * 1000))))
                 if event.type == enet.EVENT_TYPE_CONNECT:
                     self._send_handshake()
                     return True
@@ -93,16 +121,42 @@ class SlippstreamWorker:
                 'Could not receive CONNECT event at address '
                 f'{self.address}:{self.port}.')
             return False
-        except OSError:
+        except OSError as e:
             logging.error(e)
             return False
 
+    def dispatch(self, polling_mode: bool, timeout: float = 0):
+        """Receive the next message, for a Console decoding inside the worker
+
+        Returns None when polling and nothing arrives within `timeout` seconds,
+        or when the worker is shut down.
+        """
+        while not self._shutdown.is_set():
+            event = self._host.service(int(timeout * 1000) if polling_mode else 1000)
+
+            if event.type == enet.EVENT_TYPE_NONE:
+                if polling_mode:
+                    return None
+            elif event.type == enet.EVENT_TYPE_RECEIVE:
+                if len(event.packet.data) > 0:
+                    return json.loads(event.packet.data)
+            elif event.type == enet.EVENT_TYPE_CONNECT:
+                self._send_handshake()
+            elif event.type == enet.EVENT_TYPE_DISCONNECT:
+                raise EnetDisconnected()
+        return None
+
     def run(self):
         connected = self.connect()
         self._buffer.send(connected)
         if not connected:
             return
 
+        if self._decode is not None:
+            from melee.console import _run_decoder  # avoid circular import
+            _run_decoder(self, self._buffer, self._shutdown, self._decode)
+            return
+
         while not self._shutdown.is_set():
             event = self._host.service(1000)
 
@@ -121,8 +175,9 @@ class SlippstreamWorker:
                 self._buffer.close()
                 return
 
-def _run_worker(**kwargs):
+def _run_worker(cpu_affinity=None, nice=None, **kwargs):
     try:
+        affinity.apply_to_current_process(cpu_affinity, nice)
         SlippstreamWorker(**kwargs).run()
     except KeyboardInterrupt:
         pass  # don't spam the console with stack traces
@@ -137,10 +192,28 @@ class SlippstreamClient:
         self,
         address="127.0.0.1",
         port=51441,
+        profiler: Optional[Profiler] = None,
+        connect_timeout: float = 10.,
+        cpu_affinity: Optional[Iterable[int]] = None,
+        nice: Optional[int] = None,
+        decode: Optional[dict] = None,
     ):
+        """
+        Args:
+            address (str): IP address of the Dolphin / Wii to connect to
+            port (int): Port of its Slippi server
+            profiler (profiling.Profiler): Instrumentation for dispatch(), if enabled
+            connect_timeout (float): Seconds to wait for the server to accept us
+            cpu_affinity (iterable of int): CPUs to pin the worker process to
+            nice (int): Niceness of the worker process
+            decode (dict): Decode the events in the worker process, with a Console
+                made from these arguments, and send back the gamestates. Read
+                them with dispatch_decoded() instead of dispatch().
+        """
         self.address = address
         self.port = port
         self.running = False
+        self.profiler = profiler
 
         # set up worker process
         self._buffer, worker_buffer = mp.Pipe(False)
@@ -152,9 +225,17 @@ class SlippstreamClient:
                 port=port,
                 buffer=worker_buffer,
                 shutdown=self._shutdown,
+                connect_timeout=connect_timeout,
+                cpu_affinity=None if cpu_affinity is None else set(cpu_affinity),
+                nice=nice,
+                decode=decode,
             )
         )
 
+        # What dispatch_decoded() has received from a decoding worker so far
+        self._decoder = GameStateDecoder()
+        self._decoded_state: Optional[dict] = None
+
         # Not yet supported
         self.playedOn = "dolphin"
         self.timestamp = ""
@@ -164,8 +245,18 @@ class SlippstreamClient:
     def shutdown(self):
         """ Close down the socket and connection to the console """
         if self._worker:
-            self._shutdown.set()
-            self._worker.join()
+            # The worker only exists once connect() has been called
+            if self._worker.pid is not None:
+                self._shutdown.set()
+                # Drain the pipe while waiting, the worker can be stuck sending into a full one
+                self._worker.join(timeout=0.05)
+                while self._worker.is_alive():
+                    try:
+                        while self._buffer.poll():
+                            self._buffer.recv_bytes()
+                    except EOFError:
+                        pass
+                    self._worker.join(timeout=0.05)
             self._buffer.close()
             self._worker = None
         self.running = False
@@ -174,15 +265,88 @@ class SlippstreamClient:
         """Dispatch messages with the peer (read and write packets)"""
         assert self.running, "Can only dispatch while running."
 
+        profiler = self.profiler
+        if profiler is not None:
+            timestamp = time.perf_counter_ns()
+
         try:
             if polling_mode and not self._buffer.poll(timeout=timeout):
+                if profiler is not None:
+                    profiler.add(Phase.RECV, time.perf_counter_ns() - timestamp)
                 return None
             message_bytes = self._buffer.recv_bytes()
         except EOFError:
             raise EnetDisconnected()
 
+        if profiler is not None:
+            now = time.perf_counter_ns()
+            profiler.add(Phase.RECV, now - timestamp)
+            message = json.loads(message_bytes)
+            profiler.add(Phase.DECODE, time.perf_counter_ns() - now)
+            return message
+
         return json.loads(message_bytes)
 
+    def dispatch_decoded(self, polling_mode: bool, timeout: float = 0, latest_only: bool = False):
+        """Receive the next gamestate decoded by the worker
+
+        The worker sends each gamestate as a delta from the one before, so
+        rebuilding it here is cheap. It also says right away when it skips a
+        rollback frame, so that the controllers can be flushed for it. This
+        returns as soon as there's a gamestate or a rollback to act on.
+
+        Args:
+            latest_only (bool): Skip to the newest gamestate that is already waiting
+
+        Returns:
+            (console state, gamestate, number of gamestates skipped, number of
+            rollback frames skipped), or None when polling and nothing arrives in
+            time. The gamestate is None if only rollback frames were skipped.
+        """
+        assert self.running, "Can only dispatch while running."
+
+        profiler = self.profiler
+        if profiler is not None:
+            timestamp = time.perf_counter_ns()
+        decode_time = 0
+
+        gamestate = None
+        skipped = 0
+        rollbacks = 0
+        try:
+            if polling_mode and not self._buffer.poll(timeout=timeout):
+                if profiler is not None:
+                    profiler.add(Phase.RECV, time.perf_counter_ns() - timestamp)
+                return None
+            while True:
+                message = self._buffer.recv_bytes()
+                tag = message[:1]
+                if tag == DECODED_GAMESTATE:
+                    if gamestate is not None:
+                        skipped += 1
+                    # Every delta has to be applied, even of gamestates that are skipped
+                    if profiler is not None:
+                        now = time.perf_counter_ns()
+                        gamestate = self._decoder.decode(message[1:])
+                        decode_time += time.perf_counter_ns() - now
+                    else:
+                        gamestate = self._decoder.decode(message[1:])
+                elif tag == DECODED_ROLLBACK:
+                    rollbacks += 1
+                elif tag == DECODED_STATE:
+                    # Always followed by a gamestate
+                    self._decoded_state = pickle.loads(message[1:])
+                    continue
+                if not (latest_only and self._buffer.poll()):
+                    break
+        except EOFError:
+            raise EnetDisconnected()
+
+        if profiler is not None:
+            profiler.add(Phase.RECV, time.perf_counter_ns() - timestamp - decode_time)
+            profiler.add(Phase.DECODE, decode_time)
+        return self._decoded_state, gamestate, skipped, rollbacks
+
     def connect(self) -> bool:
         self._worker.start()
         connected = self._buffer.recv()
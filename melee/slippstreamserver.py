@@ -0,0 +1,260 @@
+"""A local stand-in for Dolphin's Slippstream (SlippiComm) server
+
+Replays recorded SLP files over enet using the same messages that Slippi
+Dolphin sends to spectators, so that the live client stack (SlippstreamClient
+and Console in dolphin mode) can be tested and load-tested without an emulator.
+
+Run it from the command line with
+
+    python3 -m melee.slippstreamserver replay.slp --port 51441 --fps 60
+
+and point a `Console(is_dolphin=True, is_remote=True)` at it.
+"""
+
+import argparse
+import base64
+import json
+import logging
+import threading
+import time
+from typing import Optional
+
+import enet
+import ubjson
+
+from melee.slippstream import EventType
+from melee.slpfilestreamer import open_replay
+
+def split_events(raw: bytes) -> list[bytes]:
+    """Split a raw SLP event stream into its individual events"""
+    if raw[0] != EventType.PAYLOADS.value:
+        raise ValueError("Event stream must start with an event payloads event")
+    payload_size = raw[1]
+    eventsize = {}
+    for cursor in range(2, payload_size, 3):
+        eventsize[raw[cursor]] = int.from_bytes(raw[cursor+1:cursor+3], "big") + 1
+
+    events = [raw[:payload_size+1]]
+    index = payload_size + 1
+    while index < len(raw):
+        size = eventsize[raw[index]]
+        events.append(raw[index:index+size])
+        index += size
+    return events
+
+def _game_event(payload: bytes) -> dict:
+    return {"type": "game_event", "payload": base64.b64encode(payload).decode()}
+
+def replay_messages(path: str) -> list[dict]:
+    """Group the events of an SLP file into the messages Dolphin would send
+
+    Dolphin sends all the events of a frame together, ending with the frame
+    bookend. Replays older than 3.0.0 have no bookends, so a separate
+    'frame_end' message is inserted whenever a new frame begins, the same
+    way SLPFileStreamer does.
+    """
+    with open_replay(path) as file:
+        events = split_events(ubjson.load(file)["raw"])
+
+    messages = []
+    current = []
+    has_bookends = any(event[0] == EventType.FRAME_BOOKEND.value for event in events)
+    last_frame = -9999
+    for event in events:
+        event_type = event[0]
+        if not has_bookends and event_type in (EventType.PRE_FRAME.value, EventType.POST_FRAME.value):
+            frame = int.from_bytes(event[1:5], "big", signed=True)
+            if frame > last_frame and current:
+                messages.append(_game_event(b"".join(current)))
+                messages.append({"type": "frame_end", "payload": ""})
+                current = []
+            last_frame = frame
+
+        current.append(event)
+        if event_type in (EventType.FRAME_BOOKEND.value, EventType.GAME_END.value):
+            messages.append(_game_event(b"".join(current)))
+            current = []
+
+    if current:
+        messages.append(_game_event(b"".join(current)))
+    return messages
+
+class SlippstreamServer:
+    """Serves SLP files to a single Slippstream client at a configurable pace
+
+    Pacing is controlled by `fps` and `burst`: frames are sent `burst` at a
+    time, and each burst is followed by a pause of `burst / fps` seconds.
+    Set `fps` to 0 (or None) to send as fast as enet allows.
+
+    The time each message was sent is kept in `send_times`, which is useful
+    for measuring end-to-end latency when the client runs in the same process.
+    """
+    def __init__(
+        self,
+        paths: list[str],
+        address: str = "127.0.0.1",
+        port: int = 51441,
+        fps: Optional[float] = 60.,
+        burst: int = 1,
+        loop: bool = False,
+        nick: str = "libmelee",
+        version: str = "3.18.0",
+        max_in_transit: int = 1 << 16,
+    ):
+        """Create the server and bind the port
+
+        Args:
+            paths (list of str): SLP files to replay, in order
+            address (str): Address to listen on
+            port (int): Port to listen on. Use 0 to pick any free port, see `port`.
+            fps (float): Frames per second to send at. 0 or None for unlimited speed.
+            burst (int): Number of frames to send back to back before pausing
+            loop (bool): Start over from the first file after the last one
+            nick (str): Console nickname sent in the connect reply
+            version (str): Slippi version sent in the connect reply
+            max_in_transit (int): Bytes of unacknowledged data after which sending
+                waits for the client to catch up
+        """
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.paths = list(paths)
+        self.fps = fps
+        self.burst = burst
+        self.loop = loop
+        self.nick = nick
+        self.version = version
+        self.max_in_transit = max_in_transit
+
+        self._host = enet.Host(enet.Address(bytes(address, 'utf-8'), port), 1, 0, 0, 0)
+        self.port = self._host.address.port
+        """(int): The port the server is listening on"""
+        self._peer = None
+        self._handshake_done = False
+        self._shutdown = threading.Event()
+        self._thread = None
+
+        self.messages_sent = 0
+        """(int): Number of game event messages sent so far"""
+        self.send_times: list[float] = []
+        """(list of float): time.perf_counter() at which each message was sent"""
+        self.finished = threading.Event()
+        """(threading.Event): Set once every file has been sent"""
+
+    def _send(self, message: dict):
+        message = dict(message, cursor=self.messages_sent, next_cursor=self.messages_sent + 1)
+        packet = enet.Packet(json.dumps(message).encode(), enet.PACKET_FLAG_RELIABLE)
+        self._peer.send(0, packet)
+        self.messages_sent += 1
+        self.send_times.append(time.perf_counter())
+
+    def _service(self, timeout_ms: int):
+        """Service enet events. Returns False if the client disconnected."""
+        event = self._host.service(timeout_ms)
+        while event is not None and event.type != enet.EVENT_TYPE_NONE:
+            if event.type == enet.EVENT_TYPE_CONNECT:
+                self._peer = event.peer
+            elif event.type == enet.EVENT_TYPE_RECEIVE:
+                request = json.loads(event.packet.data)
+                if request.get("type") == "connect_request":
+                    reply = {
+                        "type": "connect_reply",
+                        "nick": self.nick,
+                        "version": self.version,
+                        "cursor": request.get("cursor", 0),
+                    }
+                    event.peer.send(0, enet.Packet(json.dumps(reply).encode(), enet.PACKET_FLAG_RELIABLE))
+                    self._handshake_done = True
+            elif event.type == enet.EVENT_TYPE_DISCONNECT:
+                self._peer = None
+                self._handshake_done = False
+                return False
+            event = self._host.check_events()
+        return True
+
+    def _wait_for_client(self) -> bool:
+        while not self._shutdown.is_set():
+            self._service(10)
+            if self._handshake_done:
+                return True
+        return False
+
+    def serve(self):
+        """Wait for a client and stream the files to it. Blocks until done."""
+        if not self._wait_for_client():
+            return
+
+        interval = self.burst / self.fps if self.fps else 0.
+        next_burst = time.perf_counter()
+        while not self._shutdown.is_set():
+            for path in self.paths:
+                messages = replay_messages(path)
+                for start in range(0, len(messages), self.burst):
+                    if self._shutdown.is_set():
+                        return
+                    # Don't let unacknowledged data pile up, or enet starts dropping
+                    # packets and stalls on resends.
+                    while self._peer is not None and self._peer.reliableDataInTransit > self.max_in_transit:
+                        if not self._service(1):
+                            logging.warning("Slippstream client disconnected")
+                            return
+                    for message in messages[start:start+self.burst]:
+                        self._send(message)
+                    self._host.flush()
+
+                    # Keep servicing enet (acks, resends) while we wait for the next burst
+                    next_burst += interval
+                    while True:
+                        remaining = next_burst - time.perf_counter()
+                        if not self._service(max(0, int(remaining * 1000))):
+                            logging.warning("Slippstream client disconnected")
+                            return
+                        if remaining <= 0:
+                            break
+                    if not interval:
+                        next_burst = time.perf_counter()
+            if not self.loop:
+                break
+
+        self.finished.set()
+        # Keep the connection alive until we're told to stop. enet only sends
+        # queued packets when it is serviced, so keep the timeout short.
+        while not self._shutdown.is_set() and self._service(1):
+            pass
+
+    def start(self):
+        """Run the server in a background thread"""
+        self._thread = threading.Thread(target=self.serve, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving and disconnect the client"""
+        self._shutdown.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._peer is not None:
+            self._peer.disconnect_now(0)
+            self._peer = None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("paths", nargs="+", help="SLP files to replay")
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=51441)
+    parser.add_argument("--fps", type=float, default=60., help="0 for unlimited speed")
+    parser.add_argument("--burst", type=int, default=1, help="Frames sent back to back")
+    parser.add_argument("--loop", action="store_true")
+    args = parser.parse_args()
+
+    server = SlippstreamServer(
+        args.paths, address=args.address, port=args.port,
+        fps=args.fps, burst=args.burst, loop=args.loop)
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
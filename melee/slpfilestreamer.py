@@ -3,14 +3,241 @@
 Reads Slippi game events from SLP file rather than over network
 """
 
+import dataclasses
+import gzip
+import time
+
 import ubjson
 import numpy as np
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
 
 from melee.slippstream import EventType
+from melee.profiling import Phase
+
+_GZIP_MAGIC = b'\x1f\x8b'
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+_LZ4_MAGIC = b'\x04\x22\x4d\x18'
+
+def _load_dictionary(compression_dict):
+    """Accept either the raw bytes of a zstd dictionary or a path to one"""
+    if compression_dict is None or isinstance(compression_dict, bytes):
+        return compression_dict
+    with open(compression_dict, mode='rb') as file:
+        return file.read()
+
+def open_replay(path, compression_dict=None):
+    """Open an SLP file for reading, transparently decompressing it if needed
+
+    Compression is detected from the magic bytes at the start of the file, so
+    the extension doesn't matter. gzip, zstd and lz4 (frame format) are supported.
+    Decompression is streamed chunk by chunk, nothing is written to disk.
+
+    Args:
+        path (str): Path to the (possibly compressed) SLP file
+        compression_dict (bytes or str): Optional zstd dictionary the file was
+            compressed with. Either the raw dictionary or a path to it.
+
+    Returns:
+        A binary file object yielding the uncompressed SLP contents
+    """
+    with open(path, mode='rb') as file:
+        magic = file.read(4)
+
+    if magic.startswith(_GZIP_MAGIC):
+        return gzip.open(path, mode='rb')
+
+    if magic == _ZSTD_MAGIC:
+        if zstandard is None:
+            raise ImportError("Reading zstd compressed replays requires the 'zstandard' package.")
+        dict_data = _load_dictionary(compression_dict)
+        if dict_data is not None:
+            decompressor = zstandard.ZstdDecompressor(
+                dict_data=zstandard.ZstdCompressionDict(dict_data))
+        else:
+            decompressor = zstandard.ZstdDecompressor()
+        return decompressor.stream_reader(open(path, mode='rb'), closefd=True)
+
+    if magic == _LZ4_MAGIC:
+        if lz4 is None:
+            raise ImportError("Reading lz4 compressed replays requires the 'lz4' package.")
+        return lz4.frame.open(path, mode='rb')
+
+    return open(path, mode='rb')
+
+# Dictionary training samples end at frame bookends, or at this size in replays without them
+_MAX_SAMPLE_SIZE = 4096
+# Below this many samples zstd either fails to train or makes a useless dictionary
+_MIN_TRAINING_SAMPLES = 100
+
+def _split_frames(raw):
+    """Split a replay's event stream into chunks of one frame each, the first one
+    being everything before the first frame"""
+    eventsize = [0] * 0x100
+    payload_size = raw[1]
+    for cursor in range(0x2, payload_size, 3):
+        eventsize[raw[cursor]] = int.from_bytes(raw[cursor + 0x1:cursor + 0x3], "big") + 1
+
+    chunks = []
+    start = 0
+    index = payload_size + 1
+    while index < len(raw):
+        command = raw[index]
+        size = eventsize[command]
+        if size == 0:
+            break
+        index += size
+        if command == EventType.FRAME_BOOKEND.value or index - start >= _MAX_SAMPLE_SIZE:
+            chunks.append(raw[start:index])
+            start = index
+    if start < index:
+        chunks.append(raw[start:index])
+    return chunks
+
+def train_zstd_dictionary(paths, dict_size=112640):
+    """Train a zstd dictionary on a set of SLP files
+
+    Per-frame game events are very repetitive between replays, so a shared
+    dictionary noticeably improves the compression ratio of individual files.
+    The samples are the events of single frames rather than whole files,
+    since that's the scale at which they repeat.
+
+    Args:
+        paths (list of str): SLP files to sample from, possibly compressed
+        dict_size (int): Maximum size of the dictionary, in bytes
+
+    Returns:
+        (bytes): The trained dictionary, to be passed as `compression_dict`
+
+    Raises:
+        ValueError: If the files are too short to train on
+    """
+    if zstandard is None:
+        raise ImportError("Training zstd dictionaries requires the 'zstandard' package.")
+    samples = []
+    for path in paths:
+        with open_replay(path) as file:
+            samples.extend(_split_frames(ubjson.load(file)["raw"]))
+    if len(samples) < _MIN_TRAINING_SAMPLES:
+        raise ValueError(
+            f"Only {len(samples)} frames to train on, need at least {_MIN_TRAINING_SAMPLES}")
+    return zstandard.train_dictionary(dict_size, samples).as_bytes()
+
+def compress_replay(path, output_path, level=19, compression_dict=None):
+    """Compress an SLP file with zstd so that it can be read back by SLPFileStreamer
+
+    Args:
+        path (str): Uncompressed SLP file
+        output_path (str): Where to write the compressed file. Conventionally ends in .slp.zst
+        level (int): zstd compression level
+        compression_dict (bytes or str): Optional zstd dictionary, or a path to one
+    """
+    if zstandard is None:
+        raise ImportError("Compressing replays requires the 'zstandard' package.")
+    dict_data = _load_dictionary(compression_dict)
+    if dict_data is not None:
+        compressor = zstandard.ZstdCompressor(
+            level=level, dict_data=zstandard.ZstdCompressionDict(dict_data))
+    else:
+        compressor = zstandard.ZstdCompressor(level=level)
+    with open(path, mode='rb') as src, open(output_path, mode='wb') as dst:
+        compressor.copy_stream(src, dst)
+
+@dataclasses.dataclass
+class RollbackStats:
+    """How much a replay rolled back, from SLPFileStreamer's scan of its frames"""
+    rollbacks: int = 0
+    """(int): Times the game went back to an earlier frame"""
+    frames_superseded: int = 0
+    """(int): Versions of frames that were replaced by a later version"""
+    depths: dict[int, int] = dataclasses.field(default_factory=dict)
+    """(dict of int to int): Number of rollbacks by how many frames they went back"""
+
+    @property
+    def max_depth(self) -> int:
+        """(int): The deepest rollback, in frames. 0 if there were none."""
+        return max(self.depths, default=0)
+
+def scan_rollbacks(raw: bytes) -> tuple[dict[int, int], RollbackStats]:
+    """Find the frames of a replay's event stream that a rollback replaced
+
+    Only the frame numbers of the FRAME_BOOKEND events are read. The last
+    version of each frame is the final one. Replays older than 3.0.0 have no
+    bookends, and no rollbacks.
+
+    Args:
+        raw (bytes): The "raw" event stream of an SLP file
+
+    Returns:
+        (dict of int to int): The start and end index in `raw` of each superseded
+            version of a frame
+        (RollbackStats): How much the replay rolled back
+    """
+    eventsize = [0] * 0x100
+    payload_size = raw[1]
+    for cursor in range(0x2, payload_size, 3):
+        eventsize[raw[cursor]] = int.from_bytes(raw[cursor + 0x1:cursor + 0x3], "big") + 1
+
+    # Start and end index of each version of each frame, in order
+    versions = []
+    start = None
+    index = payload_size + 1
+    while index < len(raw):
+        command = raw[index]
+        size = eventsize[command]
+        if size == 0:
+            break
+        if start is None and command in (EventType.FRAME_START.value, EventType.PRE_FRAME.value):
+            start = index
+        elif command == EventType.FRAME_BOOKEND.value:
+            frame = int.from_bytes(raw[index + 0x1:index + 0x5], "big", signed=True)
+            versions.append((frame, index if start is None else start, index + size))
+            start = None
+        index += size
+
+    stats = RollbackStats()
+    last_version = {frame: i for i, (frame, _, _) in enumerate(versions)}
+    superseded = {}
+    previous = None
+    for i, (frame, start, end) in enumerate(versions):
+        if last_version[frame] != i:
+            superseded[start] = end
+            stats.frames_superseded += 1
+        if previous is not None and frame <= previous:
+            depth = previous - frame + 1
+            stats.rollbacks += 1
+            stats.depths[depth] = stats.depths.get(depth, 0) + 1
+        previous = frame
+    return superseded, stats
 
 class SLPFileStreamer:
-    def __init__(self, path):
+    def __init__(self, path, compression_dict=None, profiler=None, skip_events=frozenset(),
+                 final_frames_only=False):
+        """
+        Args:
+            path (str): The SLP file, possibly compressed
+            compression_dict (bytes or str): zstd dictionary the file was compressed with
+            profiler (profiling.Profiler): Records how long reading events takes
+            skip_events (set of int): Command bytes of events to step over without
+                returning them, because nothing will decode them
+            final_frames_only (bool): Scan the file for rollbacks when connecting,
+                and step over the versions of frames that a rollback replaced
+        """
         self._path = path
+        self._skip_events = skip_events
+        self._final_frames_only = final_frames_only
+        # Start index to end index of the events to step over, see scan_rollbacks()
+        self._superseded = {}
+        self.rollback_stats = None
+        """(RollbackStats): How much the file rolled back, if final_frames_only is set"""
+        self._compression_dict = compression_dict
+        self.profiler = profiler
         self._contents = None
         self.eventsize = [0] * 0x100
         self._index = 0
@@ -41,6 +268,14 @@ class SLPFileStreamer:
         """
         del args, kwargs
 
+        if self.profiler is not None:
+            timestamp = time.perf_counter_ns()
+            message = self._next_event()
+            self.profiler.add(Phase.RECV, time.perf_counter_ns() - timestamp)
+            return message
+        return self._next_event()
+
+    def _next_event(self):
         if self._index >= len(self._contents):
             return None
 
@@ -61,7 +296,19 @@ class SLPFileStreamer:
             self._index += payload_size + 1
             return wrapper
 
-        event_size = self.eventsize[self._contents[self._index]]
+        while self._index in self._superseded:
+            self._index = self._superseded[self._index]
+            if self._index >= len(self._contents):
+                return None
+
+        command = self._contents[self._index]
+        while command in self._skip_events:
+            self._index += self.eventsize[command]
+            if self._index >= len(self._contents):
+                return None
+            command = self._contents[self._index]
+
+        event_size = self.eventsize[command]
 
         # Check to see if a new frame has happened for an old file type
         if self._is_new_frame(self._contents[self._index : self._index+event_size]):
@@ -78,10 +325,12 @@ class SLPFileStreamer:
         return wrapper
 
     def connect(self):
-        with open(self._path, mode='rb') as file:
-            full = ubjson.loadb(file.read())
+        with open_replay(self._path, self._compression_dict) as file:
+            full = ubjson.load(file)
             raw = full["raw"]
             self._contents = raw
+            if self._final_frames_only:
+                self._superseded, self.rollback_stats = scan_rollbacks(raw)
             try:
                 self.playedOn = full["metadata"]["playedOn"]
             except KeyError:
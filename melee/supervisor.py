@@ -0,0 +1,254 @@
+"""Keep a Dolphin instance alive through crashes and hangs
+
+A Console on its own has no way to notice that Dolphin died or froze: step()
+either blocks forever waiting for the next frame or raises. A
+ConsoleSupervisor owns the Console, steps it in polling mode and watches for
+
+* the Dolphin process exiting,
+* no new frame arriving within `frame_timeout` seconds,
+* the Slippstream connection dropping, and
+* the controller pipes breaking.
+
+When any of these happens it restarts the instance with the same
+configuration and reports a SupervisorEvent, so one bad instance never stalls
+a whole set of environments.
+"""
+
+import dataclasses
+import enum
+import logging
+import time
+from typing import Callable, Optional
+
+from melee import enums, launcher
+from melee.console import Console
+from melee.controller import Controller
+from melee.gamestate import GameState
+from melee.slippstream import EnetDisconnected
+
+class FailureKind(enum.Enum):
+    """The ways a supervised instance can fail"""
+    PROCESS_EXITED = "process_exited"
+    """The Dolphin process is no longer running"""
+    FRAME_TIMEOUT = "frame_timeout"
+    """No new frame arrived within the frame timeout"""
+    DISCONNECTED = "disconnected"
+    """The Slippstream connection was closed"""
+    PIPE_BROKEN = "pipe_broken"
+    """Writing to a controller pipe failed"""
+    LAUNCH_FAILED = "launch_failed"
+    """A restarted instance didn't come up"""
+
+@dataclasses.dataclass
+class SupervisorEvent:
+    """A failure of a supervised instance, and what was done about it"""
+    kind: FailureKind
+    """(FailureKind): What went wrong"""
+    detail: str
+    """(str): Human readable description"""
+    frame: Optional[int]
+    """(int): The last frame received before the failure, if any"""
+    restarted: bool
+    """(bool): Whether the instance was brought back up"""
+
+@dataclasses.dataclass
+class SupervisorStats:
+    """Running totals for a ConsoleSupervisor"""
+    restarts: int = 0
+    """(int): Successful restarts"""
+    restart_attempts: int = 0
+    """(int): Relaunches tried, whether they came up or not"""
+    failures: dict[FailureKind, int] = dataclasses.field(default_factory=dict)
+    """(dict of FailureKind to int): Failures seen, by kind"""
+    time_lost: float = 0.
+    """(float): Seconds between the last good frame before a failure and the restarted instance being ready"""
+
+class ConsoleSupervisor:
+    """Runs a Console and restarts it whenever it crashes, hangs or disconnects
+
+    Use step() instead of Console.step(). It returns the next gamestate, restarting
+    the instance as often as needed to get one. After a restart the game is back
+    at the main menu, so check `events` (or pass `on_event`) to find out when
+    an episode was cut short.
+    """
+    def __init__(
+        self,
+        iso_path: str,
+        console_kwargs: Optional[dict] = None,
+        run_kwargs: Optional[dict] = None,
+        ports: tuple[int, ...] = (1, 2),
+        controller_type: enums.ControllerType = enums.ControllerType.STANDARD,
+        slippi_port: Optional[int] = None,
+        frame_timeout: float = 10.,
+        poll_interval: float = 0.05,
+        max_restarts: Optional[int] = None,
+        restart_backoff: float = 1.,
+        max_restart_backoff: float = 60.,
+        on_event: Optional[Callable[[SupervisorEvent], None]] = None,
+    ):
+        """Launch the instance
+
+        Args:
+            iso_path (str): Path to the Melee ISO
+            console_kwargs (dict): Arguments for the Console, such as `path`.
+                polling_mode and polling_timeout are set by the supervisor.
+            run_kwargs (dict): Extra arguments for Console.run, such as `platform`
+            ports (tuple of int): Controller ports to plug a controller into
+            controller_type (enums.ControllerType): Type of those controllers
+            slippi_port (int): Slippstream port. Allocated with launcher.allocate_ports
+                if not given.
+            frame_timeout (float): Seconds without a new frame before the instance
+                is considered hung
+            poll_interval (float): How often, in seconds, to check on the process
+                while waiting for a frame
+            max_restarts (int): Give up and raise after this many relaunch attempts,
+                including ones that failed to come up. None for no limit.
+            restart_backoff (float): Seconds to wait before trying again after a
+                relaunch fails to come up. Doubles with every further failure.
+            max_restart_backoff (float): The most to wait between relaunch attempts
+            on_event (callable): Called with a SupervisorEvent for every failure
+        """
+        self.iso_path = iso_path
+        self.console_kwargs = dict(
+            console_kwargs or {}, polling_mode=True, polling_timeout=poll_interval)
+        self.run_kwargs = dict(run_kwargs or {})
+        self.ports = tuple(ports)
+        self.controller_type = controller_type
+        self.frame_timeout = frame_timeout
+        self.max_restarts = max_restarts
+        self.restart_backoff = restart_backoff
+        self.max_restart_backoff = max_restart_backoff
+        self._on_event = on_event
+
+        self._owns_port = slippi_port is None
+        if slippi_port is None:
+            slippi_port = launcher.allocate_ports(
+                1, self.console_kwargs.get("slippi_address", "127.0.0.1"))[0]
+        self.slippi_port = slippi_port
+        """(int): The Slippstream port of the instance"""
+
+        self.stats = SupervisorStats()
+        """(SupervisorStats): Restart and downtime metrics"""
+        self.events: list[SupervisorEvent] = []
+        """(list of SupervisorEvent): Failures since the last pop_events()"""
+
+        self.console: Optional[Console] = None
+        """(console.Console): The currently running console"""
+        self.controllers: dict[int, Controller] = {}
+        """(dict of int to controller.Controller): Its connected controllers, by port"""
+        self._last_frame: Optional[int] = None
+        self._last_frame_time = time.perf_counter()
+
+        if not self._launch():
+            if self._owns_port:
+                launcher.release_ports([self.slippi_port])
+            raise RuntimeError(f"Failed to launch Dolphin on port {self.slippi_port}") from self._launch_error
+
+    def _launch(self) -> bool:
+        result = launcher._launch_one(
+            0, self.slippi_port, self.iso_path, self.console_kwargs,
+            self.run_kwargs, self.ports, self.controller_type)
+        self._launch_error = result.error
+        if not result.ready:
+            return False
+        self.console = result.console
+        self.controllers = result.controllers
+        self._last_frame_time = time.perf_counter()
+        return True
+
+    def _shutdown_instance(self):
+        for controller in self.controllers.values():
+            controller.disconnect()
+        if self.console is not None:
+            try:
+                self.console.stop()
+            except OSError as e:
+                logging.debug("Error stopping console: %s", e)
+        self.console = None
+        self.controllers = {}
+
+    def _fail(self, kind: FailureKind, detail: str):
+        """Record a failure and restart the instance, retrying with backoff until it comes up"""
+        failed_at = self._last_frame_time
+        failed_launches = 0
+        while True:
+            logging.warning("Dolphin on port %d failed (%s): %s", self.slippi_port, kind.value, detail)
+            self.stats.failures[kind] = self.stats.failures.get(kind, 0) + 1
+
+            if self.max_restarts is not None and self.stats.restart_attempts >= self.max_restarts:
+                self._emit(SupervisorEvent(kind, detail, self._last_frame, restarted=False))
+                self._shutdown_instance()
+                raise RuntimeError(f"Gave up after {self.stats.restart_attempts} restart attempts: {detail}")
+
+            self._shutdown_instance()
+            if failed_launches:
+                time.sleep(min(self.restart_backoff * 2 ** (failed_launches - 1), self.max_restart_backoff))
+            self.stats.restart_attempts += 1
+            restarted = self._launch()
+            self._emit(SupervisorEvent(kind, detail, self._last_frame, restarted))
+            if restarted:
+                self.stats.restarts += 1
+                self.stats.time_lost += time.perf_counter() - failed_at
+                self._last_frame = None
+                return
+            failed_launches += 1
+            kind = FailureKind.LAUNCH_FAILED
+            detail = str(self._launch_error)
+
+    def _emit(self, event: SupervisorEvent):
+        self.events.append(event)
+        if self._on_event is not None:
+            self._on_event(event)
+
+    def pop_events(self) -> list[SupervisorEvent]:
+        """Return the failures since the last call, and forget them"""
+        events, self.events = self.events, []
+        return events
+
+    def _check_process(self) -> Optional[str]:
+        process = self.console._process
+        if process is not None and process.poll() is not None:
+            return f"exit code {process.returncode}"
+        return None
+
+    def step(self) -> GameState:
+        """Return the next gamestate, restarting the instance if it fails
+
+        Raises:
+            RuntimeError: If the instance is still down after max_restarts relaunch attempts
+        """
+        while True:
+            exit_status = self._check_process()
+            if exit_status is not None:
+                self._fail(FailureKind.PROCESS_EXITED, exit_status)
+                continue
+            try:
+                gamestate = self.console.step()
+            except EnetDisconnected:
+                self._fail(FailureKind.DISCONNECTED, "Slippstream connection closed")
+                continue
+            except BrokenPipeError as e:
+                self._fail(FailureKind.PIPE_BROKEN, str(e))
+                continue
+
+            now = time.perf_counter()
+            if gamestate is not None:
+                self._last_frame = gamestate.frame
+                self._last_frame_time = now
+                return gamestate
+            if now - self._last_frame_time > self.frame_timeout:
+                self._fail(FailureKind.FRAME_TIMEOUT,
+                           f"no frame for {now - self._last_frame_time:.1f}s")
+
+    def close(self):
+        """Stop the instance"""
+        self._shutdown_instance()
+        if self._owns_port:
+            launcher.release_ports([self.slippi_port])
+            self._owns_port = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -14,6 +14,11 @@ setup(
         'pywin32; platform_system=="Windows"',
         'packaging'
     ],
+    extras_require={
+        'zstd': ['zstandard'],
+        'lz4': ['lz4'],
+        'bench': ['pytest', 'pytest-benchmark'],
+    },
     python_requires='>=3.10',
     version = version['__version__'],
     description = 'Open API written in Python 3 for making your own Smash Bros: Melee AI that works with Slippi Online',
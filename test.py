@@ -1,7 +1,27 @@
 #!/usr/bin/python3
+import dataclasses
+import gzip
+import io
+import os
+import shutil
+import sys
+import time
+import tempfile
+import threading
+import types
 import unittest
+import unittest.mock
+
+import numpy as np
+import ubjson
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 import melee
+from melee.slippstreamserver import SlippstreamServer, split_events
+from melee.slpfilestreamer import compress_replay, train_zstd_dictionary
 
 class SLPFile(unittest.TestCase):
     """
@@ -59,6 +79,649 @@ class SLPFile(unittest.TestCase):
                 self.assertEqual(int(gamestate.players[2].percent), 25)
                 self.assertEqual(gamestate.players[3].percent, 0)
 
+    def test_read_compressed_file(self):
+        """
+        Load and parse a gzip compressed SLP file
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "test_game_1.slp.gz")
+            with open("test_artifacts/test_game_1.slp", "rb") as src, gzip.open(path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+
+            console = melee.Console(is_dolphin=False,
+                                    allow_old_version=False,
+                                    path=path)
+            self.assertTrue(console.connect())
+            framecount = 0
+            while True:
+                gamestate = console.step()
+                framecount += 1
+                if gamestate is None:
+                    self.assertEqual(framecount, 1039)
+                    break
+                if gamestate.frame == 297:
+                    self.assertEqual(gamestate.players[2].action.value, 27)
+                    self.assertEqual(int(gamestate.players[1].percent), 17)
+
+    @unittest.skipUnless(zstandard, "Needs the zstandard package")
+    def test_zstd_dictionary(self):
+        """
+        Train a zstd dictionary on a couple of replays and read one back compressed with it
+        """
+        paths = ["test_artifacts/test_game_1.slp", "test_artifacts/test_game_2.slp"]
+        dictionary = train_zstd_dictionary(paths, dict_size=16384)
+        self.assertLessEqual(len(dictionary), 16384)
+        with self.assertRaises(ValueError):
+            train_zstd_dictionary([], dict_size=16384)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "test_game_1.slp.zst")
+            compress_replay(paths[0], path, compression_dict=dictionary)
+            console = melee.Console(is_dolphin=False, path=path, compression_dict=dictionary)
+            self.assertTrue(console.connect())
+            framecount = 0
+            while console.step() is not None:
+                framecount += 1
+            self.assertEqual(framecount, 1038)
+
+    def test_profiler(self):
+        """
+        Profile parsing an SLP file
+        """
+        profiler = melee.Profiler()
+        profiles = []
+        profiler.add_callback(profiles.append)
+        console = melee.Console(is_dolphin=False,
+                                allow_old_version=False,
+                                path="test_artifacts/test_game_1.slp",
+                                profiler=profiler)
+        self.assertTrue(console.connect())
+        while console.step() is not None:
+            pass
+        self.assertEqual(len(profiles), 1039)
+        self.assertEqual(profiler.histograms[melee.Phase.FRAME].count, 1039)
+        self.assertEqual(profiler.counters["rollback_frames_skipped"], 12)
+        self.assertIsNone(profiles[-1].frame)
+
+    def test_lockstep(self):
+        """
+        Check the frame sequence of an SLP file in lockstep mode
+        """
+        console = melee.Console(is_dolphin=False,
+                                path="test_artifacts/test_game_1.slp",
+                                lockstep=True)
+        self.assertTrue(console.connect())
+        while console.step() is not None:
+            pass
+        stats = console.lockstep_stats
+        self.assertEqual(stats.frames, 1038)
+        self.assertEqual((stats.dropped, stats.duplicated, stats.resyncs), (0, 0, 1))
+        self.assertEqual(stats.rollbacks, 12)
+        self.assertEqual(stats.rtt.count, 1038)
+
+        console = melee.Console(is_dolphin=False,
+                                path="test_artifacts/test_game_1.slp",
+                                lockstep=True,
+                                lockstep_strict=True)
+        self.assertTrue(console.connect())
+        for _ in range(200):
+            console.step()
+        # Pretend three frames went missing
+        console._lockstep_expected -= 3
+        with self.assertRaises(melee.FrameDesync):
+            console.step()
+        self.assertEqual(console.lockstep_stats.dropped, 3)
+
+    def test_session(self):
+        """
+        Split SLP files into games with their results and columns
+        """
+        console = melee.Console(is_dolphin=False,
+                                allow_old_version=True,
+                                path="test_artifacts/test_game_2.slp")
+        self.assertTrue(console.connect())
+        games = list(melee.Session(console, columns=True, columns_capacity=1024))
+        self.assertEqual(len(games), 1)
+        game = games[0]
+        self.assertEqual(game.slp_version, (2, 0, 1))
+        self.assertEqual(game.players, {2: melee.Character.DK, 3: melee.Character.MARTH})
+        self.assertEqual(game.end_method, melee.GameEndMethod.NO_CONTEST)
+        self.assertEqual(game.lras_initiator, 2)
+        self.assertIsNone(game.winner)
+        self.assertEqual(game.final_stocks, {2: 4, 3: 4})
+        self.assertEqual(game.frames, 3839)
+        self.assertEqual(game.columns["percent"].shape, (3839, 4))
+        self.assertEqual(game.columns.frame[-1], game.last_frame)
+        self.assertTrue(game.columns.present[:, 1:3].all())
+        self.assertFalse(game.columns.present[:, 0].any())
+        self.assertEqual(game.columns["character"][0, 2], melee.Character.MARTH.value)
+
+        # A replay without a GAME_END event is finished when the file runs out
+        console = melee.Console(is_dolphin=False, path="test_artifacts/test_game_1.slp")
+        self.assertTrue(console.connect())
+        games = list(melee.Session(console))
+        self.assertEqual(len(games), 1)
+        self.assertIsNone(games[0].end_method)
+        self.assertEqual(games[0].frames, 1038)
+        self.assertIsNone(games[0].columns)
+
+    def test_features(self):
+        """
+        Live and batch feature extraction give identical results
+        """
+        console = melee.Console(is_dolphin=False, path="test_artifacts/test_game_1.slp")
+        self.assertTrue(console.connect())
+        extractor = melee.FeatureExtractor(ports=(1, 2))
+        self.assertEqual(len(extractor.names), extractor.size)
+        columns = melee.GameColumns()
+        live = []
+        while True:
+            gamestate = console.step()
+            if gamestate is None:
+                break
+            columns.append(gamestate)
+            out = extractor.extract(gamestate)
+            self.assertIs(out, extractor.extract(gamestate))
+            live.append(out.copy())
+        batch = extractor.extract_batch(columns, console._current_stage)
+        self.assertEqual(batch.shape, (1038, extractor.size))
+        self.assertTrue(np.array_equal(np.stack(live), batch))
+        self.assertEqual(batch[:, extractor.names.index("p1_stock")].max(), 1.)
+        onehot = batch[:, extractor.names.index("p1_action_0"):extractor.names.index("p1_x")]
+        self.assertTrue((onehot.sum(axis=1) == 1).all())
+
+    def test_button_bitmasks(self):
+        """
+        Buttons are stored as bitmasks and decoded on access
+        """
+        state = melee.ControllerState()
+        self.assertEqual(dict(state.button), {button: False for button in melee.BUTTON_MASKS})
+        state.button[melee.Button.BUTTON_A] = True
+        state.button[melee.Button.BUTTON_D_UP] = True
+        self.assertEqual(state.buttons, 0x0108)
+        state.button[melee.Button.BUTTON_A] = False
+        self.assertEqual(state.buttons, 0x0008)
+        with self.assertRaises(KeyError):
+            state.button[melee.Button.BUTTON_MAIN]
+        with self.assertRaises(TypeError):
+            del state.button[melee.Button.BUTTON_A]
+        state.processed_button = {melee.Button.BUTTON_L: True}
+        self.assertEqual(state.processed_buttons, 0x0040)
+        # The old dict keyword arguments still work
+        state = melee.ControllerState(button={melee.Button.BUTTON_A: True, melee.Button.BUTTON_B: False},
+                                      processed_button={melee.Button.BUTTON_L: True}, l_shoulder=1)
+        self.assertEqual((state.buttons, state.processed_buttons, state.l_shoulder), (0x0100, 0x0040, 1))
+
+        console = melee.Console(is_dolphin=False, path="test_artifacts/test_game_1.slp")
+        self.assertTrue(console.connect())
+        columns = melee.GameColumns()
+        pressed = []
+        while True:
+            gamestate = console.step()
+            if gamestate is None:
+                break
+            columns.append(gamestate)
+            pressed.append([list(gamestate.players[port].controller_state.button.values())
+                            for port in (1, 2)])
+        unpacked = melee.unpack_buttons(columns["buttons"][:, :2])
+        self.assertEqual(unpacked.shape, (1038, 2, 12))
+        self.assertTrue(np.array_equal(unpacked, np.array(pressed)))
+        self.assertTrue(unpacked.any())
+
+    def test_field_projection(self):
+        """
+        Decoding only some fields gives the same values for them
+        """
+        def read(**kwargs):
+            console = melee.Console(is_dolphin=False,
+                                    path="test_artifacts/test_game_1.slp",
+                                    **kwargs)
+            self.assertTrue(console.connect())
+            gamestates = []
+            while True:
+                gamestate = console.step()
+                if gamestate is None:
+                    return gamestates
+                gamestates.append(gamestate)
+
+        full = read()
+        projected = read(fields=["position", "stock", "percent", "on_ground"])
+        self.assertEqual(len(full), len(projected))
+        self.assertTrue(any(gamestate.projectiles for gamestate in full))
+        for a, b in zip(full, projected):
+            self.assertEqual(a.frame, b.frame)
+            self.assertEqual(b.projectiles, [])
+            for port, player in a.players.items():
+                other = b.players[port]
+                self.assertEqual((player.position, player.stock, player.percent, player.action),
+                                 (other.position, other.stock, other.percent, other.action))
+                self.assertEqual(player.on_ground, other.on_ground)
+                self.assertEqual(other.ecb_top, (0, 0))
+                self.assertEqual(other.controller_state, melee.ControllerState())
+
+        with self.assertRaises(ValueError):
+            melee.Console(is_dolphin=False, path="test_artifacts/test_game_1.slp", fields=["positon"])
+
+    def test_final_frames_only(self):
+        """
+        Skip the versions of frames that rollbacks replaced, and keep the final ones
+        """
+        def read(**kwargs):
+            console = melee.Console(is_dolphin=False, path="test_artifacts/test_game_1.slp", **kwargs)
+            self.assertTrue(console.connect())
+            gamestates = []
+            while (gamestate := console.step()) is not None:
+                gamestates.append(gamestate)
+            return gamestates, console
+
+        final, console = read(final_frames_only=True)
+        stats = console.rollback_stats
+        self.assertEqual(stats.frames_superseded, 12)
+        self.assertEqual(sum(stats.depths.values()), stats.rollbacks)
+        self.assertEqual(stats.max_depth, 2)
+
+        every, _ = read(skip_rollback_frames=False)
+        self.assertEqual(len(every), len(final) + stats.frames_superseded)
+        last_versions = {gamestate.frame: gamestate for gamestate in every}
+        self.assertEqual([gamestate.frame for gamestate in final], sorted(last_versions))
+        for gamestate in final:
+            expected = last_versions[gamestate.frame]
+            for port, player in gamestate.players.items():
+                other = expected.players[port]
+                self.assertEqual((player.position, player.action, player.percent, player.controller_state),
+                                 (other.position, other.action, other.percent, other.controller_state))
+
+        self.assertIsNone(read()[1].rollback_stats)
+
+    def test_lazy_gamestates(self):
+        """
+        Lazily decoded gamestates read the same as eagerly decoded ones
+        """
+        def read(path, **kwargs):
+            console = melee.Console(is_dolphin=False, path=path, allow_old_version=True, **kwargs)
+            self.assertTrue(console.connect())
+            gamestates = []
+            while True:
+                gamestate = console.step()
+                if gamestate is None:
+                    return gamestates
+                gamestates.append(gamestate)
+
+        for path in ["test_artifacts/test_game_1.slp", "test_artifacts/test_game_2.slp"]:
+            eager = read(path)
+            lazy = read(path, lazy=True)
+            self.assertEqual(len(eager), len(lazy))
+            for a, b in zip(eager, lazy):
+                self.assertIsInstance(b, melee.LazyGameState)
+                self.assertEqual(dataclasses.asdict(a), dataclasses.asdict(b))
+
+        # Only what's read gets decoded
+        expected = read("test_artifacts/test_game_1.slp")[500].players[1]
+        player = read("test_artifacts/test_game_1.slp", lazy=True)[500].players[1]
+        self.assertIsInstance(player, melee.LazyPlayerState)
+        with self.assertRaises(AttributeError):
+            object.__getattribute__(player, "ecb_top")
+        self.assertEqual(player.stock, expected.stock)
+        with self.assertRaises(AttributeError):
+            object.__getattribute__(player, "ecb_top")
+        self.assertEqual(player.ecb_top, expected.ecb_top)
+
+    def test_game_info(self):
+        """
+        Every frame of a game shares one GameInfo, built from its metadata
+        """
+        console = melee.Console(is_dolphin=False, path="test_artifacts/test_game_1.slp")
+        self.assertTrue(console.connect())
+        gamestates = []
+        while True:
+            gamestate = console.step()
+            if gamestate is None:
+                break
+            gamestates.append(gamestate)
+
+        info = console.game_info
+        self.assertEqual(info.startAt, "2020-07-06T04:06:33Z")
+        self.assertEqual(info.playedOn, "dolphin")
+        self.assertEqual(info.players[0].nickName, "SmashBot (test)")
+        self.assertEqual(info.players[1].connectCode, "RUG#810")
+        for gamestate in gamestates:
+            self.assertIs(gamestate.info, info)
+            for port, player in gamestate.players.items():
+                self.assertIs(player.info, info.players[port-1])
+        self.assertEqual(gamestates[-1].players[2].nickName, "Rug")
+
+        # Writing through a frame replaces only that frame's info
+        gamestates[0].players[1].costume = 3
+        self.assertEqual(gamestates[0].players[1].costume, 3)
+        self.assertEqual(gamestates[1].players[1].costume, 0)
+        self.assertEqual(gamestates[0].players[1].nickName, "SmashBot (test)")
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            info.startAt = ""
+
+        # The info fields are still accepted by the constructors
+        gamestate = melee.GameState(frame=5, startAt="2020-07-06T04:06:33Z")
+        self.assertEqual((gamestate.frame, gamestate.info.startAt), (5, "2020-07-06T04:06:33Z"))
+        player = melee.PlayerState(percent=10, costume=2, nickName="Rug")
+        self.assertEqual(player.info, melee.PlayerInfo(costume=2, nickName="Rug"))
+        self.assertEqual(player.percent, 10)
+
+    def test_serialize(self):
+        """
+        Gamestates survive encoding, whole and as deltas
+        """
+        def values(gamestate):
+            state = dataclasses.asdict(gamestate)
+            del state["custom"]
+            return state
+
+        for path in ["test_artifacts/test_game_1.slp", "test_artifacts/test_game_2.slp"]:
+            console = melee.Console(is_dolphin=False, path=path, allow_old_version=True)
+            self.assertTrue(console.connect())
+            encoder = melee.GameStateEncoder(keyframe_interval=100)
+            decoder = melee.GameStateDecoder()
+            whole_size, stream_size = 0, 0
+            while True:
+                gamestate = console.step()
+                if gamestate is None:
+                    break
+                whole = gamestate.to_bytes()
+                self.assertEqual(values(melee.GameState.from_bytes(whole)), values(gamestate))
+                data = encoder.encode(gamestate)
+                self.assertEqual(values(decoder.decode(data)), values(gamestate))
+                whole_size += len(whole)
+                stream_size += len(data)
+                last = gamestate
+            self.assertLess(stream_size * 3, whole_size)
+
+        with self.assertRaises(ValueError):
+            melee.GameStateDecoder().decode(melee.serialize.delta(last, last))
+        with self.assertRaises(ValueError):
+            melee.GameState.from_bytes(b"\xff" + whole[1:])
+
+    def test_frame_history(self):
+        """
+        The history ring buffer holds the latest frames, in order, without copying
+        """
+        console = melee.Console(is_dolphin=False, path="test_artifacts/test_game_1.slp", history=30)
+        self.assertTrue(console.connect())
+        gamestates = []
+        while True:
+            gamestate = console.step()
+            if gamestate is None:
+                break
+            gamestates.append(gamestate)
+            history = console.history
+            self.assertEqual(len(history), min(len(gamestates), 30))
+            if len(gamestates) in (10, 500):
+                frames = history.window("frame", 5)
+                self.assertEqual(list(frames), [state.frame for state in gamestates[-5:]])
+
+        history = console.history
+        positions = history.window("position")
+        self.assertEqual(positions.shape, (30, 4, 2))
+        self.assertTrue(np.shares_memory(positions, history.window("x", 2)))
+        for k in range(1, 31):
+            player = gamestates[-k].players[2]
+            self.assertEqual(history[-k]["percent"][1], player.percent)
+            self.assertEqual(history[-k]["action"][1], player.action.value)
+            self.assertEqual(tuple(positions[-k, 1]), (player.position.x, player.position.y))
+        self.assertTrue(history[-1]["present"][:2].all())
+        self.assertFalse(history[-1]["present"][2:].any())
+        self.assertEqual(history[0]["stock"][0], history.window("stock")[0, 0])
+        with self.assertRaises(IndexError):
+            history[-31]
+        with self.assertRaises(ValueError):
+            history.window("percent", 31)
+
+    def test_projectile_tracker(self):
+        """
+        Projectiles are followed across frames by spawn ID, even when they aren't decoded
+        """
+        for fields in [None, ["position"]]:
+            console = melee.Console(is_dolphin=False, path="test_artifacts/test_game_1.slp",
+                                    track_projectiles=True, fields=fields)
+            self.assertTrue(console.connect())
+            tracker = console.projectile_tracker
+            while True:
+                gamestate = console.step()
+                if gamestate is None:
+                    break
+                if fields is not None:
+                    self.assertEqual(gamestate.projectiles, [])
+                    continue
+                self.assertEqual(len(tracker), len(gamestate.projectiles))
+                for projectile in gamestate.projectiles:
+                    slot = list(tracker.spawn_ids).index(projectile.spawn_id)
+                    self.assertEqual(tuple(tracker.positions[slot]),
+                                     (projectile.position.x, projectile.position.y))
+                    self.assertEqual(tuple(tracker.speeds[slot]), (projectile.speed.x, projectile.speed.y))
+                    record = tracker.records[tracker.live_records[slot]]
+                    self.assertEqual(record["owner"], projectile.owner)
+
+            # The two Shy Guys of Yoshi's Story
+            records = tracker.records
+            self.assertEqual(list(records["spawn_id"]), [0, 1])
+            self.assertEqual(list(records["type"]), [melee.ProjectileType.SHY_GUY.value] * 2)
+            self.assertEqual(list(records["spawn_frame"]), [-3, 786])
+            self.assertEqual(list(records["despawn_frame"]), [665, -1])
+            trajectory = tracker.trajectory(1)
+            self.assertEqual(list(trajectory["frame"]), list(range(786, 915)))
+            self.assertEqual(len(tracker.trajectories), 668 + 129)
+            with self.assertRaises(KeyError):
+                tracker.trajectory(2)
+
+        with self.assertRaises(melee.SlippiVersionTooLow):
+            console = melee.Console(is_dolphin=False, path="test_artifacts/test_game_2.slp",
+                                    allow_old_version=True, track_projectiles=True)
+            console.connect()
+            console.step()
+
+    def test_state_load(self):
+        """
+        Frames after a save state load are returned, even if their numbers go back
+        """
+        with open("test_artifacts/test_game_1.slp", "rb") as f:
+            replay = ubjson.load(f)
+        events = split_events(replay["raw"])
+        first = next(i for i, event in enumerate(events) if event[0] == melee.EventType.FRAME_START.value)
+        header = b"".join(events[:first])
+        # The final version of each frame
+        frames = {}
+        current = []
+        for event in events[first:]:
+            current.append(event)
+            if event[0] == melee.EventType.FRAME_BOOKEND.value:
+                frames[int.from_bytes(event[1:5], "big", signed=True)] = b"".join(current)
+                current = []
+
+        def returned_frames(restored_from, expect_load, hotkeys=False):
+            raw = header + b"".join(frames[frame] for frame in range(-123, 403))
+            raw += b"".join(frames[frame] for frame in range(restored_from, 915))
+            with tempfile.TemporaryDirectory() as tmpdir:
+                path = os.path.join(tmpdir, "state_load.slp")
+                with open(path, "wb") as f:
+                    f.write(ubjson.dumpb({"raw": raw, "metadata": replay["metadata"]}))
+                console = melee.Console(is_dolphin=False, path=path)
+                # As if SaveStateHotkeys were connected
+                console._save_state_hotkeys = hotkeys
+                self.assertTrue(console.connect())
+                returned = []
+                while (gamestate := console.step()) is not None:
+                    returned.append(gamestate.frame)
+                    # Dolphin keeps going for a couple of frames before loading the state
+                    if gamestate.frame == 400 and expect_load:
+                        console.expect_state_load()
+                return returned
+
+        before = list(range(-123, 403))
+        self.assertEqual(returned_frames(396, True), before + list(range(396, 915)))
+        # Without a pending load, a jump this short is a rollback
+        self.assertEqual(returned_frames(396, False), before + list(range(403, 915)))
+        # No rollback goes back this far, so with save state hotkeys it's a state load
+        self.assertEqual(returned_frames(100, False, hotkeys=True), before + list(range(100, 915)))
+        # But without them nothing can load a state, and the frames are old ones
+        self.assertEqual(returned_frames(100, False), before + list(range(403, 915)))
+
+    def test_slippstream_server(self):
+        """
+        Stream an SLP file to a remote console over a local Slippstream server
+        """
+        server = SlippstreamServer(["test_artifacts/test_game_1.slp"], port=0, fps=0)
+        server.start()
+        console = melee.Console(is_dolphin=True,
+                                is_remote=True,
+                                slippi_port=server.port,
+                                polling_mode=True,
+                                polling_timeout=2)
+        try:
+            self.assertTrue(console.connect())
+            frames = 0
+            while True:
+                gamestate = console.step()
+                if gamestate is None:
+                    break
+                frames += 1
+                if gamestate.frame == 297:
+                    self.assertEqual(gamestate.players[2].action.value, 27)
+            self.assertEqual(frames, 1038)
+            self.assertEqual(console.nick, "libmelee")
+
+            # Remote consoles have no path, but their worker process is still shut down
+            worker = console._slippstream._worker
+            console.stop()
+            self.assertFalse(worker.is_alive())
+            self.assertFalse(console.connected)
+        finally:
+            console.stop()
+            server.stop()
+
+    def test_latest_only(self):
+        """
+        A console that falls behind skips to the newest frame, and counts the ones it dropped
+        """
+        server = SlippstreamServer(["test_artifacts/test_game_1.slp"], port=0, fps=0)
+        server.start()
+        console = melee.Console(is_dolphin=True,
+                                is_remote=True,
+                                slippi_port=server.port,
+                                polling_mode=True,
+                                polling_timeout=2,
+                                latest_only=True)
+        try:
+            self.assertTrue(console.connect())
+            frames = []
+            while True:
+                gamestate = console.step()
+                if gamestate is None:
+                    break
+                frames.append(gamestate.frame)
+                # A slow bot
+                time.sleep(0.01)
+            self.assertGreater(console.frames_dropped, 0)
+            self.assertEqual(len(frames) + console.frames_dropped, 1038)
+            self.assertEqual(frames, sorted(set(frames)))
+            self.assertEqual(frames[-1], 914)
+        finally:
+            console.stop()
+            server.stop()
+
+        with self.assertRaises(ValueError):
+            melee.Console(is_dolphin=False, path="test_artifacts/test_game_1.slp", latest_only=True)
+
+    def test_decode_in_worker(self):
+        """
+        Gamestates decoded in the Slippstream worker process match the SLP file
+        """
+        console = melee.Console(is_dolphin=False, path="test_artifacts/test_game_1.slp")
+        self.assertTrue(console.connect())
+        expected = []
+        while (gamestate := console.step()) is not None:
+            expected.append(gamestate)
+
+        server = SlippstreamServer(["test_artifacts/test_game_1.slp"], port=0, fps=0)
+        server.start()
+        console = melee.Console(is_dolphin=True,
+                                is_remote=True,
+                                slippi_port=server.port,
+                                polling_mode=True,
+                                polling_timeout=2,
+                                decode_in_worker=True)
+        try:
+            self.assertTrue(console.connect())
+            gamestates = []
+            while (gamestate := console.step()) is not None:
+                gamestates.append(gamestate)
+            self.assertEqual(len(gamestates), len(expected))
+            for a, b in zip(expected, gamestates):
+                self.assertEqual(a.frame, b.frame)
+                self.assertEqual(a.projectiles, b.projectiles)
+                for port, player in a.players.items():
+                    other = b.players[port]
+                    self.assertEqual((player.position, player.action, player.action_frame, player.percent),
+                                     (other.position, other.action, other.action_frame, other.percent))
+                    self.assertEqual(player.controller_state.buttons, other.controller_state.buttons)
+            self.assertEqual(console.nick, "libmelee")
+            self.assertEqual(console.slp_version_tuple, (3, 6, 1))
+            self.assertEqual(console.games_started, 1)
+        finally:
+            console.stop()
+            server.stop()
+
+        with self.assertRaises(ValueError):
+            melee.Console(is_dolphin=True, is_remote=True, decode_in_worker=True, lazy=True)
+
+    def test_decode_in_worker_rollbacks(self):
+        """
+        In blocking input mode, rollback frames skipped by the worker still flush the controllers
+        """
+        class CountingController:
+            def __init__(self):
+                self.flushes = 0
+            def flush(self):
+                self.flushes += 1
+            def release_all(self):
+                pass
+
+        flushes = {}
+        for decode_in_worker in (False, True):
+            server = SlippstreamServer(["test_artifacts/test_game_1.slp"], port=0, fps=0)
+            server.start()
+            profiler = melee.Profiler()
+            console = melee.Console(is_dolphin=True,
+                                    is_remote=True,
+                                    slippi_port=server.port,
+                                    polling_mode=True,
+                                    polling_timeout=2,
+                                    blocking_input=True,
+                                    decode_in_worker=decode_in_worker,
+                                    profiler=profiler)
+            controller = CountingController()
+            console.controllers.append(controller)
+            try:
+                self.assertTrue(console.connect())
+                while console.step() is not None:
+                    pass
+                flushes[decode_in_worker] = controller.flushes
+                self.assertEqual(profiler.counters["rollback_frames_skipped"], 12)
+            finally:
+                console.stop()
+                server.stop()
+        self.assertEqual(flushes[True], flushes[False])
+
+    def test_lazy_import(self):
+        """
+        Package attributes resolve to their submodules and data tables are shared
+        """
+        self.assertIn("Console", dir(melee))
+        self.assertIs(melee.GameState, melee.gamestate.GameState)
+        self.assertIs(melee.EDGE_POSITION, melee.stages.EDGE_POSITION)
+        with self.assertRaises(AttributeError):
+            melee.not_a_name
+        first = melee.Console(is_dolphin=False, path="test_artifacts/test_game_1.slp")
+        second = melee.Console(is_dolphin=False, path="test_artifacts/test_game_1.slp")
+        self.assertIs(first.characterdata, second.characterdata)
+        self.assertIs(first.zero_indices, melee.load_zero_indices())
+
     def test_framedata(self):
         """
         Test that frame and stage data retreive correctly
@@ -67,5 +730,407 @@ class SLPFile(unittest.TestCase):
         self.assertTrue(framedata.is_attack(melee.Character.FALCO, melee.Action.DAIR))
         self.assertFalse(framedata.is_attack(melee.Character.FALCO, melee.Action.STANDING))
 
+@unittest.skipIf(sys.platform == "win32", "Uses a shell script as a stand-in for dolphin")
+class DolphinSetup(unittest.TestCase):
+    """
+    Console setup that doesn't need to actually run dolphin
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.probes = os.path.join(self.temp_dir, "probes")
+        self.exe_path = os.path.join(self.temp_dir, "dolphin-emu")
+        with open(self.exe_path, "w") as f:
+            f.write(f"#!/bin/sh\necho probe >> {self.probes}\n"
+                    "echo 'Faster Melee - Slippi (3.4.0)' >&2\nexit 1\n")
+        os.chmod(self.exe_path, 0o755)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_version_cache(self):
+        """
+        The dolphin executable is only run once to get its version
+        """
+        first = melee.get_dolphin_version(self.exe_path)
+        second = melee.get_dolphin_version(self.exe_path)
+        self.assertEqual(first.version, "3.4.0")
+        self.assertEqual(first, second)
+        with open(self.probes) as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+    def test_template_home(self):
+        """
+        Homes made from a template share read-only files but not ones dolphin writes to
+        """
+        source_home = os.path.join(self.temp_dir, "User")
+        os.makedirs(os.path.join(source_home, "Sys"))
+        with open(os.path.join(source_home, "Sys", "data.bin"), "wb") as f:
+            f.write(b"\0" * 1024)
+        os.makedirs(os.path.join(source_home, "StateSaves"))
+        with open(os.path.join(source_home, "StateSaves", "GALE01.s01"), "wb") as f:
+            f.write(b"state")
+
+        consoles = [melee.Console(path=self.exe_path,
+                                  dolphin_home_path=source_home,
+                                  copy_home_directory=True,
+                                  template_home=True,
+                                  slippi_port=port) for port in (51441, 51442)]
+        try:
+            self.assertEqual(consoles[0].template_home_path, consoles[1].template_home_path)
+            inodes = {os.stat(os.path.join(console.dolphin_home_path, "Sys", "data.bin")).st_ino
+                      for console in consoles}
+            self.assertEqual(len(inodes), 1)
+            inodes = {os.stat(os.path.join(console.dolphin_home_path, "StateSaves", "GALE01.s01")).st_ino
+                      for console in consoles}
+            self.assertEqual(len(inodes), 2)
+            for console in consoles:
+                with open(os.path.join(console.dolphin_home_path, "Config", "Dolphin.ini")) as f:
+                    self.assertIn(f"slippispectatorlocalport = {console.slippi_port}", f.read())
+                self.assertTrue(os.path.isfile(
+                    os.path.join(console.dolphin_home_path, "GameSettings", "GALE01r2.ini")))
+        finally:
+            shutil.rmtree(consoles[0].template_home_path)
+            for console in consoles:
+                console.stop()
+
+    def test_allocate_ports(self):
+        """
+        Allocated ports are unique until released
+        """
+        first = melee.allocate_ports(3)
+        second = melee.allocate_ports(3)
+        try:
+            self.assertEqual(len(set(first) | set(second)), 6)
+        finally:
+            melee.release_ports(first + second)
+        self.assertEqual(melee.allocate_ports(3), first)
+        melee.release_ports(first)
+
+    def test_pool_restart_failure(self):
+        """
+        An instance that fails to restart stays in the pool and is retried by acquire
+        """
+        class Died:
+            def poll(self):
+                return 1
+        consoles = [types.SimpleNamespace(_process=None, stop=lambda: None) for _ in range(2)]
+        launched = [melee.LaunchResult(index, 51441 + index, console) for index, console in enumerate(consoles)]
+        with unittest.mock.patch.object(melee.launcher, "launch", return_value=launched):
+            pool = melee.DolphinPool(2, "melee.iso", slippi_ports=[51441, 51442])
+
+        starts = []
+        def start(index):
+            starts.append(index)
+            if len(starts) < 3:
+                raise RuntimeError(f"Failed to restart Dolphin instance {index}")
+            return melee.ConsoleLease(index, types.SimpleNamespace(_process=None, stop=lambda: None), {})
+        pool._start = start
+
+        first = pool.acquire(timeout=0)
+        first.console._process = Died()
+        pool.release(first, reset=False)
+        self.assertEqual((pool.restarts, pool.restart_failures), (1, 1))
+        self.assertIs(pool.acquire(timeout=0).console, consoles[1])
+        with self.assertRaises(RuntimeError):
+            pool.acquire(timeout=0)
+        lease = pool.acquire(timeout=0)
+        self.assertEqual(lease.index, 0)
+        self.assertEqual(starts, [0, 0, 0])
+        self.assertEqual(pool.restart_failures, 2)
+        pool.close()
+
+    def test_pool_reset_postgame(self):
+        """
+        Releasing an instance after a game ended normally skips the postgame screens
+        """
+        controller_console = types.SimpleNamespace(
+            is_dolphin=False, logger=None, setup_dolphin_controller=lambda port, type: None)
+        controller = melee.Controller(controller_console, 1)
+
+        # The console reports the results screens as UNKNOWN_MENU. Each one is left with Start.
+        screens = [melee.Menu.UNKNOWN_MENU, melee.Menu.UNKNOWN_MENU]
+        def step():
+            if screens and controller.current.button[melee.Button.BUTTON_START] \
+                    and not controller.prev.button[melee.Button.BUTTON_START]:
+                screens.pop(0)
+            controller.flush()
+            gamestate = melee.GameState()
+            gamestate.menu_state = screens[0] if screens else melee.Menu.CHARACTER_SELECT
+            return gamestate
+
+        console = types.SimpleNamespace(_process=None, stop=lambda: None, step=step)
+        launched = [melee.LaunchResult(0, 51441, console, {1: controller})]
+        with unittest.mock.patch.object(melee.launcher, "launch", return_value=launched):
+            pool = melee.DolphinPool(1, "melee.iso", slippi_ports=[51441], reset_frame_limit=20)
+
+        lease = pool.acquire(timeout=0)
+        self.assertTrue(pool.reset(lease))
+        self.assertEqual(screens, [])
+        self.assertFalse(controller.current.button[melee.Button.BUTTON_START])
+        pool.release(lease)
+        self.assertEqual(pool.restarts, 0)
+        pool.close()
+
+    def test_launch_failure(self):
+        """
+        Instances that never connect are reported without blocking the others
+        """
+        ready = []
+        results = melee.launch(
+            2, "melee.iso",
+            console_kwargs=dict(path=self.exe_path, connect_timeout=0.5),
+            ports=(), on_ready=ready.append)
+        self.assertEqual(len(ready), 2)
+        self.assertEqual([result.index for result in results], [0, 1])
+        for result in results:
+            self.assertFalse(result.ready)
+            self.assertIsInstance(result.error, RuntimeError)
+
+    def test_launch_ownership(self):
+        """
+        Instances are connected from the calling thread, and stopping them releases their ports
+        """
+        threads = []
+        def connect(console):
+            threads.append(threading.current_thread())
+            return True
+        with unittest.mock.patch.object(melee.Console, "connect", connect):
+            results = melee.launch(2, "melee.iso", console_kwargs=dict(path=self.exe_path), ports=())
+        try:
+            self.assertEqual(threads, [threading.current_thread()] * 2)
+            self.assertTrue(all(result.ready and result.owns_port for result in results))
+        finally:
+            for result in results:
+                result.stop()
+        ports = melee.allocate_ports(2)
+        self.assertEqual(ports, [result.port for result in results])
+        melee.release_ports(ports)
+
+    def test_supervisor_restart(self):
+        """
+        A stand-in dolphin that stops sending frames is restarted
+        """
+        fake_dolphin = os.path.join(self.temp_dir, "fake-dolphin")
+        with open(fake_dolphin, "w") as f:
+            f.write(f"""#!{sys.executable}
+import configparser, os, sys
+if "--version" in sys.argv:
+    print("Faster Melee - Slippi (3.4.0)", file=sys.stderr)
+    sys.exit(1)
+home = sys.argv[sys.argv.index("-u") + 1]
+config = configparser.ConfigParser()
+config.read(os.path.join(home, "Config", "Dolphin.ini"))
+from melee.slippstreamserver import SlippstreamServer
+# Sends the replay, then goes quiet
+SlippstreamServer([{os.path.abspath("test_artifacts/test_game_1.slp")!r}],
+                  port=int(config["Core"]["SlippiSpectatorLocalPort"]), fps=0).serve()
+""")
+        os.chmod(fake_dolphin, 0o755)
+
+        events = []
+        supervisor = melee.ConsoleSupervisor(
+            "melee.iso",
+            console_kwargs=dict(path=fake_dolphin),
+            run_kwargs=dict(environment_vars={"PYTHONPATH": os.getcwd()}),
+            ports=(),
+            frame_timeout=1,
+            on_event=events.append)
+        try:
+            first_process = supervisor.console._process
+            frames = 0
+            while not events:
+                gamestate = supervisor.step()
+                frames += 1
+            # The last gamestate is the first one from the restarted instance
+            self.assertEqual(frames, 1039)
+            self.assertEqual(gamestate.frame, -123)
+            self.assertEqual(events[0].kind, melee.FailureKind.FRAME_TIMEOUT)
+            self.assertTrue(events[0].restarted)
+            self.assertEqual(supervisor.stats.restarts, 1)
+            self.assertGreater(supervisor.stats.time_lost, 1)
+            self.assertIsNot(supervisor.console._process, first_process)
+
+            supervisor.console._process.kill()
+            supervisor.console._process.wait()
+            supervisor.step()
+            self.assertEqual(events[1].kind, melee.FailureKind.PROCESS_EXITED)
+            self.assertEqual(supervisor.pop_events(), events)
+        finally:
+            supervisor.close()
+
+    def test_supervisor_launch_failure(self):
+        """
+        A dolphin that keeps failing to come back up is retried with backoff, then given up on
+        """
+        launched = os.path.join(self.temp_dir, "launched")
+        fake_dolphin = os.path.join(self.temp_dir, "fake-dolphin")
+        with open(fake_dolphin, "w") as f:
+            f.write(f"""#!{sys.executable}
+import configparser, os, sys
+if "--version" in sys.argv:
+    print("Faster Melee - Slippi (3.4.0)", file=sys.stderr)
+    sys.exit(1)
+# Only the first launch comes up
+if os.path.exists({launched!r}):
+    sys.exit(1)
+open({launched!r}, "w").close()
+home = sys.argv[sys.argv.index("-u") + 1]
+config = configparser.ConfigParser()
+config.read(os.path.join(home, "Config", "Dolphin.ini"))
+from melee.slippstreamserver import SlippstreamServer
+SlippstreamServer([{os.path.abspath("test_artifacts/test_game_1.slp")!r}],
+                  port=int(config["Core"]["SlippiSpectatorLocalPort"]), fps=0).serve()
+""")
+        os.chmod(fake_dolphin, 0o755)
+
+        events = []
+        supervisor = melee.ConsoleSupervisor(
+            "melee.iso",
+            console_kwargs=dict(path=fake_dolphin, connect_timeout=2),
+            run_kwargs=dict(environment_vars={"PYTHONPATH": os.getcwd()}),
+            ports=(),
+            frame_timeout=1,
+            max_restarts=3,
+            restart_backoff=0.5,
+            on_event=events.append)
+        try:
+            with self.assertRaises(RuntimeError):
+                while True:
+                    supervisor.step()
+            self.assertEqual(supervisor.stats.restart_attempts, 3)
+            self.assertEqual(supervisor.stats.restarts, 0)
+            self.assertEqual(supervisor.stats.failures[melee.FailureKind.LAUNCH_FAILED], 3)
+            self.assertEqual([event.kind for event in events],
+                             [melee.FailureKind.FRAME_TIMEOUT] + [melee.FailureKind.LAUNCH_FAILED] * 3)
+            self.assertFalse(any(event.restarted for event in events))
+            self.assertIsNone(supervisor.console)
+        finally:
+            supervisor.close()
+
+    def test_layout_instances(self):
+        """
+        Instances alternate between NUMA nodes and get whole physical cores
+        """
+        topology = {0: [(0, 4), (1, 5)], 1: [(2, 6), (3, 7)]}
+        placements = melee.layout_instances(5, topology)
+        self.assertEqual([placement.node for placement in placements], [0, 1, 0, 1, 0])
+        self.assertEqual(placements[1].cpus, {2, 6})
+        self.assertEqual(placements[4].cpus, placements[0].cpus)
+        self.assertEqual(melee.parse_cpu_list("0-2,5,7-8"), [0, 1, 2, 5, 7, 8])
+        self.assertEqual(melee.format_cpu_list([8, 7, 5, 0, 1, 2]), "0-2,5,7-8")
+
+    @unittest.skipUnless(hasattr(os, "sched_getaffinity"), "Needs Linux scheduling APIs")
+    def test_run_affinity(self):
+        """
+        Dolphin is started pinned and niced
+        """
+        with open(self.exe_path, "w") as f:
+            f.write("#!/bin/sh\nif [ \"$1\" = --version ]; then\n"
+                    "echo 'Faster Melee - Slippi (3.4.0)' >&2; exit 1\nfi\nexec sleep 30\n")
+        console = melee.Console(path=self.exe_path)
+        cpu = min(os.sched_getaffinity(0))
+        try:
+            console.run(cpu_affinity=[cpu], nice=3)
+            pid = console._process.pid
+            # Wait for the wrapper commands to exec into the "dolphin"
+            for _ in range(100):
+                with open(f"/proc/{pid}/comm") as f:
+                    if f.read().strip() == "sleep":
+                        break
+                time.sleep(0.01)
+            self.assertEqual(os.sched_getaffinity(pid), {cpu})
+            self.assertEqual(os.getpriority(os.PRIO_PROCESS, pid),
+                             min(os.getpriority(os.PRIO_PROCESS, 0) + 3, 19))
+        finally:
+            console.stop()
+
+    def test_action_table(self):
+        """
+        Precompiled actions send the same inputs as the individual press functions
+        """
+        def inputs(command):
+            """Last value set for each input by a series of pipe commands"""
+            values = {}
+            for line in command.splitlines():
+                verb, name, *args = line.split()
+                values[name] = args if verb == "SET" else verb
+            return values
+
+        neutral = melee.ControllerState()
+        jump_right = melee.ControllerState(main_stick=(1., .5))
+        jump_right.button[melee.Button.BUTTON_X] = True
+        shield = melee.ControllerState(l_shoulder=1.)
+        shield.button[melee.Button.BUTTON_L] = True
+        table = melee.ActionTable([neutral, jump_right, shield])
+        self.assertEqual(len(table), 3)
+
+        console = melee.Console(path=self.exe_path)
+        try:
+            manual = melee.Controller(console, port=1)
+            compiled = melee.Controller(console, port=2, action_table=table)
+            for controller in (manual, compiled):
+                controller.pipe = io.StringIO()
+
+            for button in neutral.button:
+                manual.release_button(button)
+            manual.press_shoulder(melee.Button.BUTTON_L, 0)
+            manual.press_shoulder(melee.Button.BUTTON_R, 0)
+            manual.tilt_analog(melee.Button.BUTTON_C, .5, .5)
+            manual.tilt_analog(melee.Button.BUTTON_MAIN, 1., .5)
+            manual.press_button(melee.Button.BUTTON_X)
+            compiled.apply_action(2)
+            compiled.apply_action(1)
+            self.assertEqual(inputs(manual.pipe.getvalue()), inputs(compiled.pipe.getvalue()))
+            self.assertEqual(manual.current, compiled.current)
+
+            manual.action_table = table
+            melee.apply_actions([manual, compiled], np.array([2, 2]))
+            self.assertEqual(manual.current, compiled.current)
+            self.assertTrue(compiled.current.button[melee.Button.BUTTON_L])
+            self.assertFalse(compiled.current.button[melee.Button.BUTTON_X])
+            with self.assertRaises(ValueError):
+                melee.apply_actions([manual], [0, 1])
+        finally:
+            console.stop()
+
+    def test_save_state_hotkeys(self):
+        """
+        Loading a save state presses its hotkey and waits for the jump to reset the frame tracking
+        """
+        console = melee.Console(path=self.exe_path)
+        try:
+            state = os.path.join(self.temp_dir, "start.sav")
+            with open(state, "wb") as f:
+                f.write(b"state")
+            console.install_state(state, slot=1)
+            with open(os.path.join(console.dolphin_home_path, "StateSaves", "GALE01.s01"), "rb") as f:
+                self.assertEqual(f.read(), b"state")
+
+            hotkeys = melee.SaveStateHotkeys(console)
+            with open(os.path.join(console.dolphin_home_path, "Config", "Hotkeys.ini")) as f:
+                self.assertIn("Load State/Load State Slot 1 = Button A", f.read())
+
+            received = []
+            def drain():
+                with open(hotkeys.pipe_path) as pipe:
+                    received.append(pipe.read())
+            reader = threading.Thread(target=drain)
+            reader.start()
+            hotkeys.connect()
+            self.assertEqual(console.controllers, [])
+
+            console._frame = 500
+            hotkeys.load_state(1)
+            self.assertEqual(console._frame, 500)
+            self.assertTrue(console._state_load_pending)
+            for _ in range(3):
+                console._flush_controllers()
+            hotkeys.disconnect()
+            self.assertEqual(console._flush_hooks, [])
+            reader.join()
+            self.assertEqual(received[0], "PRESS A\nFLUSH\nFLUSH\nRELEASE A\nFLUSH\n")
+        finally:
+            console.stop()
+
 if __name__ == '__main__':
     unittest.main()
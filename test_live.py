@@ -12,7 +12,7 @@ parser.add_argument('--iso', type=str, required=True)
 parser.add_argument('--headless', action='store_true')
 parser.add_argument('--ffw', action='store_true')
 
-def build_console() -> melee.Console:
+def console_kwargs() -> dict:
     kwargs = dict(
         path=ARGS.dolphin,
         copy_home_directory=False,
@@ -31,7 +31,10 @@ def build_console() -> melee.Console:
             use_exi_inputs=True,
             enable_ffw=True,
         )
-    return melee.Console(**kwargs)
+    return kwargs
+
+def build_console() -> melee.Console:
+    return melee.Console(**console_kwargs())
 
 def run_console(console: melee.Console):
     platform = None
@@ -195,6 +198,33 @@ class DolphinTest(unittest.TestCase):
             controller_one.disconnect()
             controller_two.disconnect()
 
+    def test_pool_reuse(self):
+        """
+        Get into a game on a pooled console, then reuse it for a second game
+        """
+        with melee.DolphinPool(1, ARGS.iso, console_kwargs=console_kwargs(), ports=(1,)) as pool:
+            for game in range(2):
+                menu_helper = melee.MenuHelper()
+                with pool.lease() as lease:
+                    self.assertEqual(lease.games, game + 1)
+                    controller = lease.controllers[1]
+                    while True:
+                        gamestate = lease.console.step()
+                        self.assertIsNotNone(gamestate)
+                        assert gamestate is not None  # For pylance
+                        if gamestate.menu_state == melee.Menu.IN_GAME:
+                            if gamestate.frame == 10:
+                                break
+                        else:
+                            menu_helper.menu_helper_simple(
+                                gamestate,
+                                controller,
+                                melee.Character.FOX,
+                                melee.Stage.FINAL_DESTINATION,
+                                "",
+                                autostart=True)
+            self.assertEqual(pool.restarts, 0)
+
 if __name__ == '__main__':
     parser.add_argument('unittest_args', nargs='*')
     ARGS = parser.parse_args()